@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""Merge Shards recipe script"""
+
+import dataiku
+from dataiku.customrecipe import get_recipe_config, get_input_names_for_role, get_output_names_for_role
+
+from plugin_io_utils import IMAGE_PATH_COLUMN
+from dku_io_utils import merge_schemas, generate_stacked_chunks, write_chunks_with_schema
+
+
+# ==============================================================================
+# SETUP
+# ==============================================================================
+
+input_datasets = [dataiku.Dataset(name) for name in get_input_names_for_role("shard_datasets")]
+output_dataset = dataiku.Dataset(get_output_names_for_role("output_dataset")[0])
+check_duplicates = bool(get_recipe_config().get("check_duplicates", True))
+
+
+# ==============================================================================
+# RUN
+# ==============================================================================
+
+# Output schema with the columns of all shards, which can differ e.g. with one column per label
+schema = merge_schemas([input_dataset.read_schema() for input_dataset in input_datasets])
+df_iterator = generate_stacked_chunks(
+    input_datasets=input_datasets,
+    columns=[column["name"] for column in schema],
+    key_column=IMAGE_PATH_COLUMN if check_duplicates else None,
+)
+write_chunks_with_schema(output_dataset, df_iterator, schema=schema)
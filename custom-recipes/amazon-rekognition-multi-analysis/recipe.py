@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Multi-Analysis recipe script"""
+
+from typing import Dict, AnyStr
+from concurrent.futures import ThreadPoolExecutor
+from retry import retry
+
+from plugin_params_loader import PluginParamsLoader
+from amazon_rekognition_api_client import API_EXCEPTIONS, call_api_multi, is_throttling_exception, get_retry_attempts
+from dku_io_utils import write_chunks_with_schema
+from api_parallelizer import api_parallelizer_streaming
+from amazon_rekognition_api_formatting import (
+    AnalysisEnum,
+    MultiAnalysisAPIFormatter,
+    ObjectDetectionLabelingAPIFormatter,
+    TextDetectionAPIFormatter,
+    UnsafeContentAPIFormatter,
+)
+
+
+# ==============================================================================
+# SETUP
+# ==============================================================================
+
+plugin_params = PluginParamsLoader().validate_load_params()
+column_prefix = "multi_api"
+
+# Arguments of each API call other than the image, as in the recipe of each analysis
+api_client_method_kwargs = {}
+if AnalysisEnum.OBJECT_DETECTION in plugin_params.analyses:
+    api_client_method_kwargs[AnalysisEnum.OBJECT_DETECTION.value] = {"MaxLabels": plugin_params.num_objects}
+    if plugin_params.minimum_score:
+        api_client_method_kwargs[AnalysisEnum.OBJECT_DETECTION.value]["MinConfidence"] = plugin_params.minimum_score
+if AnalysisEnum.TEXT_DETECTION in plugin_params.analyses:
+    api_client_method_kwargs[AnalysisEnum.TEXT_DETECTION.value] = {}
+if AnalysisEnum.UNSAFE_CONTENT in plugin_params.analyses:
+    api_client_method_kwargs[AnalysisEnum.UNSAFE_CONTENT.value] = {}
+    if plugin_params.minimum_score:
+        api_client_method_kwargs[AnalysisEnum.UNSAFE_CONTENT.value]["MinConfidence"] = plugin_params.minimum_score
+
+# Threads to make the other API calls on each image while the worker thread makes the first one
+analysis_executor = ThreadPoolExecutor(
+    max_workers=max(plugin_params.parallel_workers * (len(plugin_params.analyses) - 1), 1)
+)
+
+
+@retry(OSError, delay=plugin_params.api_quota_period, tries=5)
+def call_api_multi_analysis(row: Dict) -> AnyStr:
+    response_json = call_api_multi(
+        row=row,
+        api_client=plugin_params.api_client,
+        api_client_method_kwargs=api_client_method_kwargs,
+        input_folder=plugin_params.input_folder,
+        input_folder_is_s3=plugin_params.input_folder_is_s3,
+        input_folder_bucket=plugin_params.input_folder_bucket,
+        input_folder_root_path=plugin_params.input_folder_root_path,
+        response_cache=plugin_params.response_cache,
+        s3_client=plugin_params.s3_client,
+        rate_limiter=plugin_params.rate_limiter,
+        image_preprocessor=plugin_params.image_preprocessor,
+        metrics=plugin_params.metrics,
+        executor=analysis_executor,
+    )
+    return response_json
+
+
+# ==============================================================================
+# RUN
+# ==============================================================================
+
+# Initialize API results formatters of each analysis, combined into one
+api_formatters = {}
+if AnalysisEnum.OBJECT_DETECTION in plugin_params.analyses:
+    api_formatters[AnalysisEnum.OBJECT_DETECTION.value] = ObjectDetectionLabelingAPIFormatter(
+        input_df=plugin_params.input_df,
+        num_objects=plugin_params.num_objects,
+        orientation_correction=False,
+        error_handling=plugin_params.error_handling,
+    )
+if AnalysisEnum.TEXT_DETECTION in plugin_params.analyses:
+    api_formatters[AnalysisEnum.TEXT_DETECTION.value] = TextDetectionAPIFormatter(
+        input_df=plugin_params.input_df,
+        minimum_score=plugin_params.minimum_score,
+        orientation_correction=False,
+        error_handling=plugin_params.error_handling,
+    )
+if AnalysisEnum.UNSAFE_CONTENT in plugin_params.analyses:
+    api_formatters[AnalysisEnum.UNSAFE_CONTENT.value] = UnsafeContentAPIFormatter(
+        input_df=plugin_params.input_df,
+        category_level=plugin_params.unsafe_content_category_level,
+        content_categories_top_level=plugin_params.unsafe_content_categories_top_level,
+        content_categories_second_level=plugin_params.unsafe_content_categories_second_level,
+        error_handling=plugin_params.error_handling,
+    )
+api_formatter = MultiAnalysisAPIFormatter(
+    input_df=plugin_params.input_df,
+    api_formatters=api_formatters,
+    error_handling=plugin_params.error_handling,
+    keep_raw_response=plugin_params.keep_raw_response,
+    metrics=plugin_params.metrics,
+    column_prefix=column_prefix,
+)
+
+# Call APIs in parallel and format results by chunks as they arrive
+df_iterator = api_parallelizer_streaming(
+    input_df=plugin_params.input_df,
+    api_call_function=call_api_multi_analysis,
+    api_exceptions=API_EXCEPTIONS,
+    parallel_workers=plugin_params.parallel_workers,
+    adaptive_concurrency=plugin_params.adaptive_concurrency,
+    throttling_exception_predicate=is_throttling_exception,
+    retry_attempts_function=get_retry_attempts,
+    error_handling=plugin_params.error_handling,
+    column_prefix=column_prefix,
+)
+if plugin_params.checkpoint is not None:
+    df_iterator = plugin_params.checkpoint.checkpoint_stream(
+        df_iterator=df_iterator,
+        input_df=plugin_params.input_df,
+        api_column_names=api_formatter.api_column_names,
+        error_handling=plugin_params.error_handling,
+    )
+output_df_iterator = api_formatter.format_df_chunks(df_iterator)
+
+# Write back results by chunks
+write_chunks_with_schema(plugin_params.output_dataset, output_df_iterator, schema=api_formatter.get_output_schema())
+analysis_executor.shutdown(wait=True)
+plugin_params.finalize_run(api_formatter)
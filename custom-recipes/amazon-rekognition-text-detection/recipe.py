@@ -2,14 +2,13 @@
 """Text Detection recipe script"""
 
 from typing import Dict, AnyStr
-from ratelimit import limits, RateLimitException
 from retry import retry
 
 from plugin_params_loader import PluginParamsLoader
-from amazon_rekognition_api_client import API_EXCEPTIONS, call_api_generic
-from dku_io_utils import set_column_description
-from api_parallelizer import api_parallelizer
-from amazon_rekognition_api_formatting import TextDetectionAPIFormatter
+from amazon_rekognition_api_client import API_EXCEPTIONS, call_api_generic, is_throttling_exception, get_retry_attempts
+from dku_io_utils import write_chunks_with_schema
+from api_parallelizer import api_parallelizer_streaming
+from amazon_rekognition_api_formatting import TextDetectionAPIFormatter, ImageRenderingPipeline
 
 
 # ==============================================================================
@@ -20,9 +19,10 @@ plugin_params = PluginParamsLoader().validate_load_params()
 column_prefix = "text_api"
 
 
-@retry((RateLimitException, OSError), delay=plugin_params.api_quota_period, tries=5)
-@limits(calls=plugin_params.api_quota_rate_limit, period=plugin_params.api_quota_period)
-def call_api_text_detection(row: Dict, orientation_correction: bool) -> AnyStr:
+@retry(OSError, delay=plugin_params.api_quota_period, tries=5)
+def call_api_text_detection(
+    row: Dict, orientation_correction: bool, image_pipeline: ImageRenderingPipeline = None
+) -> AnyStr:
     response_json = call_api_generic(
         row=row,
         orientation_correction=orientation_correction,
@@ -32,6 +32,13 @@ def call_api_text_detection(row: Dict, orientation_correction: bool) -> AnyStr:
         input_folder_is_s3=plugin_params.input_folder_is_s3,
         input_folder_bucket=plugin_params.input_folder_bucket,
         input_folder_root_path=plugin_params.input_folder_root_path,
+        response_cache=plugin_params.response_cache,
+        s3_client=plugin_params.s3_client,
+        rate_limiter=plugin_params.rate_limiter,
+        image_pipeline=image_pipeline,
+        orientation_estimator=plugin_params.orientation_estimator,
+        image_preprocessor=plugin_params.image_preprocessor,
+        metrics=plugin_params.metrics,
     )
     return response_json
 
@@ -40,33 +47,53 @@ def call_api_text_detection(row: Dict, orientation_correction: bool) -> AnyStr:
 # RUN
 # ==============================================================================
 
-# Call API in parallel
-df = api_parallelizer(
-    input_df=plugin_params.input_df,
-    api_call_function=call_api_text_detection,
-    api_exceptions=API_EXCEPTIONS,
-    parallel_workers=plugin_params.parallel_workers,
-    error_handling=plugin_params.error_handling,
-    orientation_correction=plugin_params.orientation_correction,
-    column_prefix=column_prefix,
-)
-
-# Format API results
+# Initialize API results formatter
 api_formatter = TextDetectionAPIFormatter(
     input_df=plugin_params.input_df,
     minimum_score=plugin_params.minimum_score,
     orientation_correction=plugin_params.orientation_correction,
     input_folder=plugin_params.input_folder,
     error_handling=plugin_params.error_handling,
+    keep_raw_response=plugin_params.keep_raw_response,
+    metrics=plugin_params.metrics,
     parallel_workers=plugin_params.parallel_workers,
+    rendering_engine=plugin_params.rendering_engine,
     column_prefix=column_prefix,
 )
-output_df = api_formatter.format_df(df)
 
-# Write back results
-plugin_params.output_dataset.write_with_schema(output_df)
-set_column_description(
-    output_dataset=plugin_params.output_dataset, column_description_dict=api_formatter.column_description_dict
-)
+# Draw bounding boxes on images as API results arrive (optional)
+image_pipeline = None
 if plugin_params.output_folder is not None:
-    api_formatter.format_save_images(plugin_params.output_folder)
+    image_pipeline = ImageRenderingPipeline(
+        api_formatter=api_formatter,
+        output_folder=plugin_params.output_folder,
+        clear_output=plugin_params.clear_output_folder,
+        rendered_paths=plugin_params.rendered_paths,
+    )
+
+# Call API in parallel and format results by chunks as they arrive
+df_iterator = api_parallelizer_streaming(
+    input_df=plugin_params.input_df,
+    api_call_function=call_api_text_detection,
+    api_exceptions=API_EXCEPTIONS,
+    parallel_workers=plugin_params.parallel_workers,
+    adaptive_concurrency=plugin_params.adaptive_concurrency,
+    throttling_exception_predicate=is_throttling_exception,
+    retry_attempts_function=get_retry_attempts,
+    error_handling=plugin_params.error_handling,
+    orientation_correction=plugin_params.orientation_correction,
+    image_pipeline=image_pipeline,
+    column_prefix=column_prefix,
+)
+if plugin_params.checkpoint is not None:
+    df_iterator = plugin_params.checkpoint.checkpoint_stream(
+        df_iterator=df_iterator,
+        input_df=plugin_params.input_df,
+        api_column_names=api_formatter.api_column_names,
+        error_handling=plugin_params.error_handling,
+    )
+output_df_iterator = api_formatter.format_df_chunks(df_iterator, image_pipeline=image_pipeline)
+
+# Write back results by chunks
+write_chunks_with_schema(plugin_params.output_dataset, output_df_iterator, schema=api_formatter.get_output_schema())
+plugin_params.finalize_run(api_formatter, image_pipeline=image_pipeline)
@@ -2,13 +2,12 @@
 """Unsafe Content Moderation recipe script"""
 
 from typing import Dict, AnyStr
-from ratelimit import limits, RateLimitException
 from retry import retry
 
 from plugin_params_loader import PluginParamsLoader
-from amazon_rekognition_api_client import API_EXCEPTIONS, call_api_generic
-from dku_io_utils import set_column_description
-from api_parallelizer import api_parallelizer
+from amazon_rekognition_api_client import API_EXCEPTIONS, call_api_generic, is_throttling_exception, get_retry_attempts
+from dku_io_utils import write_chunks_with_schema
+from api_parallelizer import api_parallelizer_streaming
 from amazon_rekognition_api_formatting import UnsafeContentAPIFormatter
 
 
@@ -20,8 +19,7 @@ plugin_params = PluginParamsLoader().validate_load_params()
 column_prefix = "moderation_api"
 
 
-@retry((RateLimitException, OSError), delay=plugin_params.api_quota_period, tries=5)
-@limits(calls=plugin_params.api_quota_rate_limit, period=plugin_params.api_quota_period)
+@retry(OSError, delay=plugin_params.api_quota_period, tries=5)
 def call_api_moderation(row: Dict, minimum_score: int) -> AnyStr:
     response_json = call_api_generic(
         row=row,
@@ -32,6 +30,11 @@ def call_api_moderation(row: Dict, minimum_score: int) -> AnyStr:
         input_folder_is_s3=plugin_params.input_folder_is_s3,
         input_folder_bucket=plugin_params.input_folder_bucket,
         input_folder_root_path=plugin_params.input_folder_root_path,
+        response_cache=plugin_params.response_cache,
+        s3_client=plugin_params.s3_client,
+        rate_limiter=plugin_params.rate_limiter,
+        image_preprocessor=plugin_params.image_preprocessor,
+        metrics=plugin_params.metrics,
     )
     return response_json
 
@@ -40,30 +43,40 @@ def call_api_moderation(row: Dict, minimum_score: int) -> AnyStr:
 # RUN
 # ==============================================================================
 
-# Call API in parallel
-df = api_parallelizer(
-    input_df=plugin_params.input_df,
-    api_call_function=call_api_moderation,
-    api_exceptions=API_EXCEPTIONS,
-    parallel_workers=plugin_params.parallel_workers,
-    error_handling=plugin_params.error_handling,
-    minimum_score=plugin_params.minimum_score,
-    column_prefix=column_prefix,
-)
-
-# Format API results
+# Initialize API results formatter
 api_formatter = UnsafeContentAPIFormatter(
     input_df=plugin_params.input_df,
     category_level=plugin_params.unsafe_content_category_level,
     content_categories_top_level=plugin_params.unsafe_content_categories_top_level,
     content_categories_second_level=plugin_params.unsafe_content_categories_second_level,
     error_handling=plugin_params.error_handling,
+    keep_raw_response=plugin_params.keep_raw_response,
+    metrics=plugin_params.metrics,
     column_prefix=column_prefix,
 )
-output_df = api_formatter.format_df(df)
 
-# Write back results
-plugin_params.output_dataset.write_with_schema(output_df)
-set_column_description(
-    output_dataset=plugin_params.output_dataset, column_description_dict=api_formatter.column_description_dict
+# Call API in parallel and format results by chunks as they arrive
+df_iterator = api_parallelizer_streaming(
+    input_df=plugin_params.input_df,
+    api_call_function=call_api_moderation,
+    api_exceptions=API_EXCEPTIONS,
+    parallel_workers=plugin_params.parallel_workers,
+    adaptive_concurrency=plugin_params.adaptive_concurrency,
+    throttling_exception_predicate=is_throttling_exception,
+    retry_attempts_function=get_retry_attempts,
+    error_handling=plugin_params.error_handling,
+    minimum_score=plugin_params.minimum_score,
+    column_prefix=column_prefix,
 )
+if plugin_params.checkpoint is not None:
+    df_iterator = plugin_params.checkpoint.checkpoint_stream(
+        df_iterator=df_iterator,
+        input_df=plugin_params.input_df,
+        api_column_names=api_formatter.api_column_names,
+        error_handling=plugin_params.error_handling,
+    )
+output_df_iterator = api_formatter.format_df_chunks(df_iterator)
+
+# Write back results by chunks
+write_chunks_with_schema(plugin_params.output_dataset, output_df_iterator, schema=api_formatter.get_output_schema())
+plugin_params.finalize_run(api_formatter)
@@ -2,18 +2,28 @@
 """Module with utility functions to call the Amazon Rekognition API"""
 
 import logging
-import json
-from typing import AnyStr, Dict
+from enum import Enum
+from time import monotonic
+from typing import AnyStr, Dict, Optional, Tuple
 from io import BytesIO
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 
 import dataiku
 import boto3
 from boto3.exceptions import Boto3Error
+from botocore.config import Config
 from botocore.exceptions import BotoCoreError, ClientError
 from PIL import Image, UnidentifiedImageError
 
-from plugin_io_utils import IMAGE_PATH_COLUMN
-from plugin_image_utils import save_image_bytes, auto_rotate_image
+from plugin_io_utils import IMAGE_PATH_COLUMN, JSONResponse, json_dumps, json_loads
+from plugin_image_utils import save_image_bytes, auto_rotate_image, ImageOrientationEstimator
+from api_response_cache import APIResponseCache, hash_bytes
+from api_rate_limiter import TokenBucketRateLimiter
+from plugin_image_preprocessing import ImagePreprocessor
+from plugin_s3_folder import S3Folder
+from plugin_metrics import PipelineMetrics, time_stage
+from amazon_rekognition_api_formatting import ImageRenderingPipeline
 
 
 # ==============================================================================
@@ -21,6 +31,12 @@ from plugin_image_utils import save_image_bytes, auto_rotate_image
 # ==============================================================================
 
 API_EXCEPTIONS = (Boto3Error, BotoCoreError, ClientError, UnidentifiedImageError)
+THROTTLING_ERROR_CODES = {"ThrottlingException", "ProvisionedThroughputExceededException"}
+DEFAULT_MAX_POOL_CONNECTIONS = 10  # botocore default, which is too low for more than 10 parallel workers
+DEFAULT_CONNECT_TIMEOUT = 10  # in seconds
+DEFAULT_READ_TIMEOUT = 60  # in seconds
+MAX_RETRY_ATTEMPTS = 5  # including the initial call
+CACHE_KEY_API_PARAM_NAMES = ("MaxLabels", "MinConfidence")
 
 
 # ==============================================================================
@@ -28,17 +44,180 @@ API_EXCEPTIONS = (Boto3Error, BotoCoreError, ClientError, UnidentifiedImageError
 # ==============================================================================
 
 
-def get_client(aws_access_key_id: AnyStr, aws_secret_access_key: AnyStr, aws_region_name: AnyStr) -> boto3.client:
+class RetryModeEnum(Enum):
+    STANDARD = "standard"
+    ADAPTIVE = "adaptive"
+
+
+def get_client_config(
+    max_pool_connections: int = DEFAULT_MAX_POOL_CONNECTIONS,
+    connect_timeout: int = DEFAULT_CONNECT_TIMEOUT,
+    read_timeout: int = DEFAULT_READ_TIMEOUT,
+    retry_mode: RetryModeEnum = RetryModeEnum.ADAPTIVE,
+) -> Config:
+    """
+    Build the configuration of API clients:
+    - the connection pool is sized to the number of parallel workers so that connections are reused across calls
+    - the adaptive retry mode slows down calls on the client side when AWS throttles them,
+      so it should not be combined with adaptive concurrency which would not see throttling errors
+    - TCP keepalive prevents idle connections from being dropped, if supported by the installed botocore version
+    """
+    config_kwargs = {
+        "max_pool_connections": max(max_pool_connections, DEFAULT_MAX_POOL_CONNECTIONS),
+        "connect_timeout": connect_timeout,
+        "read_timeout": read_timeout,
+        "retries": {"mode": retry_mode.value, "max_attempts": MAX_RETRY_ATTEMPTS},
+    }
+    if "tcp_keepalive" in Config.OPTION_DEFAULTS:
+        config_kwargs["tcp_keepalive"] = True
+    else:
+        logging.warning("TCP keepalive is not supported by the installed botocore version")
+    return Config(**config_kwargs)
+
+
+def get_client(
+    aws_access_key_id: AnyStr,
+    aws_secret_access_key: AnyStr,
+    aws_region_name: AnyStr,
+    service_name: AnyStr = "rekognition",
+    config: Config = None,
+) -> boto3.client:
     client = boto3.client(
-        service_name="rekognition",
+        service_name=service_name,
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         region_name=aws_region_name,
+        config=config or get_client_config(),
     )
     logging.info("Credentials loaded")
     return client
 
 
+def get_connection_stats(client: boto3.client) -> Dict:
+    """
+    Count HTTP connections opened by a client and requests sent on them, from its urllib3 connection pools.
+    More connections than 'max_pool_connections' means that the pool was full and connections were discarded.
+    """
+    stats = {
+        "max_pool_connections": client.meta.config.max_pool_connections,
+        "num_connections": 0,
+        "num_requests": 0,
+    }
+    try:  # botocore does not expose its HTTP session publicly
+        http_session = client._endpoint.http_session
+        pool_managers = [http_session._manager] + list(http_session._proxy_managers.values())
+    except AttributeError:
+        return stats
+    for pool_manager in pool_managers:
+        for pool_key in list(pool_manager.pools.keys()):
+            pool = pool_manager.pools.get(pool_key)
+            if pool is not None:
+                stats["num_connections"] += getattr(pool, "num_connections", 0)
+                stats["num_requests"] += getattr(pool, "num_requests", 0)
+    stats["num_reused_connections"] = max(stats["num_requests"] - stats["num_connections"], 0)
+    return stats
+
+
+def log_connection_stats(client: boto3.client) -> None:
+    logging.info(
+        "{} client connections: {num_requests} requests sent on {num_connections} connections "
+        "({num_reused_connections} reused, pool size {max_pool_connections})".format(
+            client.meta.service_model.service_name, **get_connection_stats(client)
+        )
+    )
+
+
+def is_throttling_exception(exception: Exception) -> bool:
+    """Check if an exception raised by the API client is due to throttling by AWS"""
+    if isinstance(exception, ClientError):
+        return exception.response.get("Error", {}).get("Code", "") in THROTTLING_ERROR_CODES
+    return False
+
+
+def get_retry_attempts(response: AnyStr) -> int:
+    """
+    Count the retries made by the API client before the responses of an API calling function,
+    from the response metadata of each API response, or of each method for `call_api_multi`
+    """
+    decoded = getattr(response, "decoded", None) or {}
+    responses = [decoded] if "ResponseMetadata" in decoded else [r for r in decoded.values() if isinstance(r, dict)]
+    return sum([r.get("ResponseMetadata", {}).get("RetryAttempts", 0) for r in responses])
+
+
+def call_api_method(
+    api_client: boto3.client,
+    api_client_method_name: AnyStr,
+    rate_limiter: TokenBucketRateLimiter = None,
+    metrics: PipelineMetrics = None,
+    **kwargs
+) -> Dict:
+    """Call a method of the API client, once the rate limiter (optional) allows it"""
+    api_client_method = getattr(api_client, api_client_method_name)
+    if rate_limiter is None:
+        with time_stage(metrics, "api_call"):
+            return api_client_method(**kwargs)
+    start = monotonic()
+
+    def timed_api_client_method(**method_kwargs):
+        if metrics is not None:
+            metrics.record("rate_limit_wait", monotonic() - start)
+        with time_stage(metrics, "api_call"):
+            return api_client_method(**method_kwargs)
+
+    return rate_limiter.call(timed_api_client_method, **kwargs)
+
+
+def load_image_request(
+    image_path: AnyStr,
+    input_folder: dataiku.Folder,
+    input_folder_is_s3: bool,
+    input_folder_bucket: AnyStr,
+    input_folder_root_path: AnyStr,
+    image_preprocessor: ImagePreprocessor = None,
+    metrics: PipelineMetrics = None,
+) -> Tuple[Dict, Optional[bytes]]:
+    """
+    Build the 'Image' argument of API calls for an image of the input folder:
+    - images on Amazon S3 are referenced by bucket and key, without downloading them
+    - other images are downloaded and preprocessed (optional), also returning the original image bytes
+    """
+    if input_folder_is_s3:
+        return ({"S3Object": {"Bucket": input_folder_bucket, "Name": input_folder_root_path + image_path}}, None)
+    with time_stage(metrics, "download"), input_folder.get_download_stream(image_path) as stream:
+        image_bytes = stream.read()
+    image_request = {"Bytes": image_bytes}
+    if image_preprocessor is not None:
+        with time_stage(metrics, "preprocessing"):
+            image_request["Bytes"] = image_preprocessor.preprocess(image_bytes)
+    return (image_request, image_bytes)
+
+
+def compute_image_fingerprint(
+    image_path: AnyStr,
+    image_request: Dict,
+    image_bytes: Optional[bytes],
+    input_folder: dataiku.Folder,
+    s3_client: boto3.client = None,
+) -> AnyStr:
+    """Identify the content of an image for the response cache, by its S3 ETag or the hash of its bytes"""
+    if isinstance(input_folder, S3Folder):
+        return "s3_etag:" + input_folder.get_etag(image_path)
+    if "S3Object" in image_request:
+        s3_object = s3_client.head_object(
+            Bucket=image_request["S3Object"]["Bucket"], Key=image_request["S3Object"]["Name"]
+        )
+        return "s3_etag:" + s3_object.get("ETag", "")
+    return "sha256:" + hash_bytes(image_bytes)
+
+
+def get_cache_key_api_params(method_kwargs: Dict) -> Dict:
+    """
+    Arguments of an API call other than the image which change its response, as sent to the API.
+    Arguments which are not sent are None, e.g. a minimum score of 0 for which the API applies its own default.
+    """
+    return {name: method_kwargs.get(name) for name in CACHE_KEY_API_PARAM_NAMES}
+
+
 def call_api_generic(
     row: Dict,
     api_client: boto3.client,
@@ -50,32 +229,172 @@ def call_api_generic(
     orientation_correction: bool = False,
     num_objects: int = None,
     minimum_score: int = None,
+    response_cache: APIResponseCache = None,
+    s3_client: boto3.client = None,
+    rate_limiter: TokenBucketRateLimiter = None,
+    image_pipeline: ImageRenderingPipeline = None,
+    orientation_estimator: ImageOrientationEstimator = None,
+    image_preprocessor: ImagePreprocessor = None,
+    metrics: PipelineMetrics = None,
 ) -> AnyStr:
     image_path = row.get(IMAGE_PATH_COLUMN)
-    pil_image = None
-    if input_folder_is_s3:
-        image_request = {"S3Object": {"Bucket": input_folder_bucket, "Name": input_folder_root_path + image_path}}
-    else:
-        with input_folder.get_download_stream(image_path) as stream:
-            image_request = {"Bytes": stream.read()}
-            pil_image = Image.open(BytesIO(image_request["Bytes"]))
+    (image_request, image_bytes) = load_image_request(
+        image_path,
+        input_folder,
+        input_folder_is_s3,
+        input_folder_bucket,
+        input_folder_root_path,
+        image_preprocessor=image_preprocessor,
+        metrics=metrics,
+    )
+    pil_image = Image.open(BytesIO(image_bytes)) if image_bytes is not None else None
+    api_orientation = None
+    method_kwargs = {}
+    if num_objects:
+        method_kwargs["MaxLabels"] = num_objects
+    if minimum_score:
+        method_kwargs["MinConfidence"] = minimum_score
+    if response_cache is not None:
+        image_fingerprint = compute_image_fingerprint(image_path, image_request, image_bytes, input_folder, s3_client)
+        cache_key = response_cache.build_key(
+            image_fingerprint,
+            api_client_method_name,
+            orientation_correction=orientation_correction,
+            orientation_estimation=orientation_estimator.method.name if orientation_estimator is not None else None,
+            image_preprocessing=image_preprocessor.cache_key if image_preprocessor is not None else None,
+            **get_cache_key_api_params(method_kwargs)
+        )
+        cached_response = response_cache.get(cache_key)
+        if cached_response is not None:
+            if image_pipeline is not None:
+                cached_response = JSONResponse(cached_response, json_loads(cached_response), from_cache=True)
+                image_pipeline.submit(image_path, image_bytes, cached_response.decoded)
+                return cached_response
+            return JSONResponse(cached_response, from_cache=True)
     if orientation_correction:
-        # Need to use another API endpoint to retrieve the estimated orientation
-        orientation_response = api_client.recognize_celebrities(Image=image_request)
-        detected_orientation = orientation_response.get("OrientationCorrection", "")
         if pil_image is None:
-            with input_folder.get_download_stream(image_path) as stream:
-                pil_image = Image.open(stream)
+            with time_stage(metrics, "download"), input_folder.get_download_stream(image_path) as stream:
+                image_bytes = stream.read()
+            pil_image = Image.open(BytesIO(image_bytes))
+        detected_orientation = None
+        if orientation_estimator is not None:
+            detected_orientation = orientation_estimator.estimate(pil_image)
+        if detected_orientation is None:
+            # Need to use another API endpoint to retrieve the estimated orientation
+            orientation_response = call_api_method(
+                api_client, "recognize_celebrities", rate_limiter=rate_limiter, metrics=metrics, Image=image_request
+            )
+            detected_orientation = orientation_response.get("OrientationCorrection", "")
+            api_orientation = detected_orientation
         (rotated_image, rotated) = auto_rotate_image(pil_image, detected_orientation)
         if rotated:
             logging.info("Corrected image orientation: {}".format(image_path))
             image_request = {"Bytes": save_image_bytes(rotated_image, image_path).getvalue()}
-    request_dict = {"Image": image_request}
-    if num_objects:
-        request_dict["MaxLabels"] = num_objects
-    if minimum_score:
-        request_dict["MinConfidence"] = minimum_score
-    response = getattr(api_client, api_client_method_name)(**request_dict)
-    if orientation_correction:
-        response["OrientationCorrection"] = detected_orientation
-    return json.dumps(response)
+            if image_preprocessor is not None:
+                with time_stage(metrics, "preprocessing"):
+                    image_request["Bytes"] = image_preprocessor.preprocess(image_request["Bytes"])
+    response = call_api_method(
+        api_client,
+        api_client_method_name,
+        rate_limiter=rate_limiter,
+        metrics=metrics,
+        Image=image_request,
+        **method_kwargs
+    )
+    if api_orientation is not None:
+        # Orientations estimated locally are not API results: images are rotated by their EXIF tag when rendered
+        response["OrientationCorrection"] = api_orientation
+    response_json = JSONResponse.from_decoded(response)
+    if response_cache is not None:
+        response_cache.set(cache_key, str(response_json))
+    if image_pipeline is not None:
+        # Reuse the downloaded image to draw bounding boxes while the next API calls are made
+        # Rows which failed are not submitted and are rendered without bounding boxes after formatting
+        image_pipeline.submit(image_path, image_bytes, response)
+    return response_json
+
+
+def call_api_multi(
+    row: Dict,
+    api_client: boto3.client,
+    api_client_method_kwargs: Dict[AnyStr, Dict],
+    input_folder: dataiku.Folder,
+    input_folder_is_s3: bool,
+    input_folder_bucket: AnyStr,
+    input_folder_root_path: AnyStr,
+    response_cache: APIResponseCache = None,
+    s3_client: boto3.client = None,
+    rate_limiter: TokenBucketRateLimiter = None,
+    image_preprocessor: ImagePreprocessor = None,
+    metrics: PipelineMetrics = None,
+    executor: ThreadPoolExecutor = None,
+) -> AnyStr:
+    """
+    Call several methods of the API client on the same image, which is downloaded only once:
+    - 'api_client_method_kwargs' maps API client method names to their arguments other than 'Image'
+    - methods are called concurrently on the executor (optional), sharing the same rate limiter
+    - responses are cached with the same keys as `call_api_generic`, so that caches are shared across recipes
+    - if a method fails, the responses of the other methods are still cached before the error is raised
+    Returns a JSON object with the response of each method, indexed by method name.
+    """
+    image_path = row.get(IMAGE_PATH_COLUMN)
+    (image_request, image_bytes) = load_image_request(
+        image_path,
+        input_folder,
+        input_folder_is_s3,
+        input_folder_bucket,
+        input_folder_root_path,
+        image_preprocessor=image_preprocessor,
+        metrics=metrics,
+    )
+    (responses, cache_keys) = ({}, {})
+    if response_cache is not None:
+        image_fingerprint = compute_image_fingerprint(image_path, image_request, image_bytes, input_folder, s3_client)
+        for (api_client_method_name, method_kwargs) in api_client_method_kwargs.items():
+            cache_keys[api_client_method_name] = response_cache.build_key(
+                image_fingerprint,
+                api_client_method_name,
+                orientation_correction=False,
+                orientation_estimation=None,
+                image_preprocessing=image_preprocessor.cache_key if image_preprocessor is not None else None,
+                **get_cache_key_api_params(method_kwargs)
+            )
+            cached_response = response_cache.get(cache_keys[api_client_method_name])
+            if cached_response is not None:
+                responses[api_client_method_name] = json_loads(cached_response)
+    pending_method_names = [name for name in api_client_method_kwargs.keys() if name not in responses]
+    api_calls = {
+        api_client_method_name: partial(
+            call_api_method,
+            api_client,
+            api_client_method_name,
+            rate_limiter=rate_limiter,
+            metrics=metrics,
+            Image=image_request,
+            **api_client_method_kwargs[api_client_method_name]
+        )
+        for api_client_method_name in pending_method_names
+    }
+    futures = {}
+    if executor is not None and len(api_calls) > 1:
+        # The calling thread makes the first call while other threads make the others
+        futures = {name: executor.submit(api_calls[name]) for name in pending_method_names[1:]}
+    first_exception = None
+    for api_client_method_name in pending_method_names:
+        future = futures.get(api_client_method_name)
+        try:
+            response = future.result() if future is not None else api_calls[api_client_method_name]()
+        except Exception as e:
+            if response_cache is None:
+                raise e
+            # Cache the responses of the other methods, so that retrying the row only repeats the failed calls
+            first_exception = first_exception or e
+            continue
+        responses[api_client_method_name] = response
+        if response_cache is not None:
+            response_cache.set(cache_keys[api_client_method_name], json_dumps(response))
+    if first_exception is not None:
+        raise first_exception
+    json_response = JSONResponse.from_decoded({name: responses[name] for name in api_client_method_kwargs.keys()})
+    json_response.from_cache = len(pending_method_names) == 0
+    return json_response
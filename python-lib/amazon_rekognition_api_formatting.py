@@ -2,9 +2,14 @@
 """Module with classes to format Amazon Rekognition API results"""
 
 import logging
-from typing import AnyStr, Dict, List
+import os
+import multiprocessing
+import threading
+import queue
+from io import BytesIO
+from typing import AnyStr, Dict, List, Iterator, Set, Tuple, Optional
 from enum import Enum
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 import dataiku
 from tqdm.auto import tqdm as tqdm_auto
@@ -20,15 +25,38 @@ from plugin_io_utils import (
     generate_unique,
     safe_json_loads,
     move_api_columns_to_end,
+    release_decoded_responses,
 )
-from api_parallelizer import DEFAULT_PARALLEL_WORKERS
+from api_parallelizer import DEFAULT_PARALLEL_WORKERS, get_output_api_column_list
 from plugin_image_utils import save_image_bytes, auto_rotate_image, draw_bounding_box_pil_image
+from plugin_image_preprocessing import PROCESS_START_METHOD
+from plugin_metrics import PipelineMetrics, time_stage
 
 
 # ==============================================================================
 # CONSTANT DEFINITION
 # ==============================================================================
 
+DTYPE_KIND_TO_STORAGE_TYPE = {"b": "boolean", "i": "bigint", "u": "bigint", "f": "double", "M": "date"}
+
+
+class RenderingEngineEnum(Enum):
+    THREADS = "Thread pool"
+    PROCESSES = "Process pool"
+
+
+class OutputFormatEnum(Enum):
+    WIDE = "One row per image"
+    LONG = "One row per label instance"
+
+
+class AnalysisEnum(Enum):
+    """Analyses which can be combined in a single pass over images, with the API client method of each"""
+
+    OBJECT_DETECTION = "detect_labels"
+    TEXT_DETECTION = "detect_text"
+    UNSAFE_CONTENT = "detect_moderation_labels"
+
 
 class UnsafeContentCategoryLevelEnum(Enum):
     TOP = "Top-level (simple)"
@@ -72,9 +100,14 @@ class GenericAPIFormatter:
     """
     Generic Formatter class for API responses:
     - initialize with generic parameters
-    - compute generic column descriptions
-    - apply 'format_row' function to dataframe
+    - compute generic column descriptions and declare the output schema
+    - parse all API responses once and apply 'format_columns' function to compute new columns at once
+    - optionally drop the raw API response column from the output
     - use 'format_image' function on all images and save them to folder
+    - optionally do both on chunks of results streamed from the API
+    With the 'PROCESSES' rendering engine, images are still downloaded and uploaded by threads,
+    but decoded, drawn and encoded in a pool of processes sized to the number of CPU cores.
+    These processes are spawned rather than forked, and receive a copy of the formatter without its dataframes.
     """
 
     def __init__(
@@ -84,68 +117,158 @@ class GenericAPIFormatter:
         column_prefix: AnyStr = "api",
         error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
         parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+        rendering_engine: RenderingEngineEnum = RenderingEngineEnum.THREADS,
+        keep_raw_response: bool = True,
+        metrics: PipelineMetrics = None,
     ):
         self.input_df = input_df
         self.input_folder = input_folder
         self.output_df = None  # initialization before calling format_df
+        self.output_image_responses = []  # image paths and parsed API responses of the output dataframe
+        self.keep_raw_response = keep_raw_response
         self.column_prefix = column_prefix
         self.error_handling = error_handling
         self.parallel_workers = parallel_workers
+        self.rendering_engine = rendering_engine
+        self.metrics = metrics
+        self.rendering_workers = parallel_workers
+        self._process_pool = None
+        if rendering_engine == RenderingEngineEnum.PROCESSES:
+            num_processes = os.cpu_count() or 1
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=num_processes, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+            )
+            self.rendering_workers = max(parallel_workers, num_processes)  # enough threads to keep processes busy
         self.api_column_names = build_unique_column_names(input_df.keys(), column_prefix)
         self.column_description_dict = {
             v: API_COLUMN_NAMES_DESCRIPTION_DICT[k] for k, v in self.api_column_names._asdict().items()
         }
-
-    def format_row(self, row: Dict) -> Dict:
-        return row
+        self.column_type_dict = {}  # storage types of formatted columns which are not strings
+        if not keep_raw_response:
+            self.column_description_dict.pop(self.api_column_names.response)
+
+    def __getstate__(self) -> Dict:
+        """Drop attributes which are not needed to render images when sending the formatter to another process"""
+        state = self.__dict__.copy()
+        for key in ("input_df", "input_folder", "output_df", "output_image_responses", "metrics", "_process_pool"):
+            state[key] = None
+        return state
+
+    def format_columns(self, responses: List[Dict]) -> Dict[AnyStr, List]:
+        """Compute new columns from parsed API responses, as a dictionary of column names to lists of values"""
+        return {}
+
+    def format_output_columns(self, responses: List[Dict]) -> Tuple[Optional[List[int]], Dict[AnyStr, List]]:
+        """
+        Compute new columns from parsed API responses, with the positions of the input rows for each output row,
+        or None to keep one output row per input row
+        """
+        return (None, self.format_columns(responses))
+
+    def format_responses_df(self, df: pd.DataFrame, responses: List[Dict]) -> pd.DataFrame:
+        """Add the columns computed from parsed API responses to a dataframe of API results"""
+        (row_positions, formatted_columns) = self.format_output_columns(responses)
+        if row_positions is not None:
+            df = df.iloc[row_positions]
+        if len(formatted_columns) != 0:
+            formatted_df = pd.DataFrame(formatted_columns, index=df.index, columns=list(formatted_columns.keys()))
+            df = pd.concat([df.drop(columns=formatted_df.columns, errors="ignore"), formatted_df], axis=1)
+        df = move_api_columns_to_end(df, self.api_column_names, self.error_handling)
+        if not self.keep_raw_response:
+            df = df.drop(columns=[self.api_column_names.response])
+        if row_positions is not None:
+            df = df.reset_index(drop=True)
+        return df
 
     def format_df(self, df: pd.DataFrame) -> pd.DataFrame:
         logging.info("Formatting API results...")
-        df = df.apply(func=self.format_row, axis=1)
-        df = move_api_columns_to_end(df, self.api_column_names, self.error_handling)
+        with time_stage(self.metrics, "formatting"):
+            responses = [safe_json_loads(r, self.error_handling) for r in df[self.api_column_names.response]]
+            self.output_image_responses = list(zip(df[IMAGE_PATH_COLUMN], responses))
+            df = self.format_responses_df(df, responses)
         logging.info("Formatting API results: Done.")
         self.output_df = df
         return df
 
+    def get_output_schema(self) -> List[Dict]:
+        """
+        Declare the schema of the output dataset from the input columns and the columns computed by the formatter,
+        so that it does not depend on the values of the first chunk of results, and exists even without results
+        """
+        df = self.input_df.iloc[:0].copy()
+        for column in get_output_api_column_list(self.api_column_names, self.error_handling):
+            df[column] = pd.Series([], dtype=object)
+        output_df = self.format_responses_df(df, [])
+        return [
+            {
+                "name": column,
+                "type": self.column_type_dict.get(column, DTYPE_KIND_TO_STORAGE_TYPE.get(dtype.kind, "string")),
+            }
+            for (column, dtype) in output_df.dtypes.items()
+        ]
+
     def format_image(self, image: Image, response: Dict) -> Image:
         return image
 
-    def format_save_image(self, output_folder: dataiku.Folder, image_path: AnyStr, response: Dict) -> bool:
+    def render_image_bytes(self, image_bytes: bytes, image_path: AnyStr, response: Dict) -> bytes:
+        """Draw API results on an image, with bytes as input and output so that it can run in another process"""
+        pil_image = Image.open(BytesIO(image_bytes))
+        if len(response) != 0:
+            formatted_image = self.format_image(pil_image, response)
+        else:
+            formatted_image = pil_image.copy()
+        return save_image_bytes(formatted_image, image_path).getvalue()
+
+    def format_save_image(
+        self, output_folder: dataiku.Folder, image_path: AnyStr, response: Dict, image_bytes: bytes = None
+    ) -> bool:
         result = False
-        with self.input_folder.get_download_stream(image_path) as stream:
-            try:
-                pil_image = Image.open(stream)
-                if len(response) != 0:
-                    formatted_image = self.format_image(pil_image, response)
+        try:
+            if image_bytes is None:
+                with time_stage(self.metrics, "download"), self.input_folder.get_download_stream(image_path) as stream:
+                    image_bytes = stream.read()
+            with time_stage(self.metrics, "rendering"):
+                if self._process_pool is not None:
+                    formatted_image_bytes = self._process_pool.submit(
+                        self.render_image_bytes, image_bytes, image_path, response
+                    ).result()
                 else:
-                    formatted_image = pil_image.copy()
-                image_bytes = save_image_bytes(formatted_image, image_path)
-                output_folder.upload_stream(image_path, image_bytes.getvalue())
-                result = True
-            except (UnidentifiedImageError, TypeError, OSError) as e:
-                logging.warning("Could not load image on path: " + image_path)
-                if self.error_handling == ErrorHandlingEnum.FAIL:
-                    raise e
+                    formatted_image_bytes = self.render_image_bytes(image_bytes, image_path, response)
+            with time_stage(self.metrics, "upload"):
+                output_folder.upload_stream(image_path, formatted_image_bytes)
+            result = True
+        except (UnidentifiedImageError, TypeError, OSError) as e:
+            logging.warning("Could not load image on path: " + image_path)
+            if self.error_handling == ErrorHandlingEnum.FAIL:
+                raise e
         return result
 
-    def format_save_images(self, output_folder: dataiku.Folder):
+    def clear_output_folder(self, output_folder: dataiku.Folder):
         partition = output_folder.writePartition if output_folder.writePartition else ""
         output_folder.clear_partition(partition)
-        df_iterator = (i[1].to_dict() for i in self.output_df.iterrows())
-        len_iterator = len(self.output_df.index)
+
+    def format_save_images(self, output_folder: dataiku.Folder, df: pd.DataFrame = None, clear_output: bool = True):
+        if df is None:
+            df = self.output_df
+        if df is self.output_df:
+            image_responses = self.output_image_responses
+        else:
+            image_responses = [
+                (image_path, safe_json_loads(r))
+                for (image_path, r) in zip(df[IMAGE_PATH_COLUMN], df[self.api_column_names.response])
+            ]
+        if clear_output:
+            self.clear_output_folder(output_folder)
         logging.info("Saving bounding boxes to output folder...")
         api_results = []
-        with ThreadPoolExecutor(max_workers=self.parallel_workers) as pool:
+        with ThreadPoolExecutor(max_workers=self.rendering_workers) as pool:
             futures = [
                 pool.submit(
-                    self.format_save_image,
-                    output_folder=output_folder,
-                    image_path=row[IMAGE_PATH_COLUMN],
-                    response=safe_json_loads(row[self.api_column_names.response]),
+                    self.format_save_image, output_folder=output_folder, image_path=image_path, response=response,
                 )
-                for row in df_iterator
+                for (image_path, response) in image_responses
             ]
-            for f in tqdm_auto(as_completed(futures), total=len_iterator):
+            for f in tqdm_auto(as_completed(futures), total=len(futures)):
                 api_results.append(f.result())
         num_success = sum(api_results)
         num_error = len(api_results) - num_success
@@ -153,12 +276,129 @@ class GenericAPIFormatter:
             "Saving bounding boxes to output folder: {} images succeeded, {} failed".format(num_success, num_error)
         )
 
+    def format_df_chunks(
+        self,
+        df_iterator: Iterator[pd.DataFrame],
+        output_folder: dataiku.Folder = None,
+        image_pipeline: "ImageRenderingPipeline" = None,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Format chunks of API results as they arrive and save their images to the output folder (optional).
+        If images are rendered by an image pipeline, only images which were not submitted to the pipeline
+        by the API calling function (e.g. results resumed from a checkpoint) are submitted here,
+        except images already rendered by a previous run.
+        Decoded API responses are dropped once each chunk is formatted, so that only serialized ones are kept.
+        """
+        if output_folder is not None:
+            self.clear_output_folder(output_folder)
+        for df in df_iterator:
+            output_df = self.format_df(df)
+            if output_folder is not None:
+                self.format_save_images(output_folder, df=output_df, clear_output=False)
+            if image_pipeline is not None:
+                for (image_path, response) in self.output_image_responses:
+                    if image_path not in image_pipeline.submitted_paths and not image_pipeline.is_rendered(image_path):
+                        image_pipeline.submit(image_path=image_path, image_bytes=None, response=response)
+            release_decoded_responses(df[self.api_column_names.response])
+            self.output_image_responses = []
+            yield output_df
+
+    def close(self) -> None:
+        """Shut down the pool of rendering processes, if any"""
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=True)
+            self._process_pool = None
+
+
+class ImageRenderingPipeline:
+    """
+    Pipeline stage to draw bounding boxes and save images to the output folder as soon as API responses arrive:
+    - the API calling function submits the image bytes it already downloaded, with the decoded API response
+    - images are rendered and uploaded by background threads, in parallel with API calls
+    - a bounded queue blocks the API calling stage if rendering falls behind, to keep memory usage flat
+    - images already rendered in the output folder by a previous run (optional) are not rendered again
+    """
+
+    def __init__(
+        self,
+        api_formatter: GenericAPIFormatter,
+        output_folder: dataiku.Folder,
+        parallel_workers: int = None,
+        max_queue_size: int = None,
+        clear_output: bool = True,
+        rendered_paths: Set[AnyStr] = None,
+    ):
+        if parallel_workers is None:
+            parallel_workers = api_formatter.rendering_workers
+        self.api_formatter = api_formatter
+        self.output_folder = output_folder
+        self.submitted_paths = set()  # type: Set[AnyStr]
+        self.rendered_paths = set(rendered_paths or [])
+        self.num_success = 0
+        self.num_error = 0
+        self._exception = None
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=max_queue_size or 2 * parallel_workers)
+        if clear_output:
+            self.api_formatter.clear_output_folder(output_folder)
+        elif len(self.rendered_paths) != 0:
+            logging.info("Keeping {} images rendered by a previous run".format(len(self.rendered_paths)))
+        logging.info("Saving bounding boxes to output folder as API results arrive...")
+        self._threads = [threading.Thread(target=self._render_images, daemon=True) for _ in range(parallel_workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def is_rendered(self, image_path: AnyStr) -> bool:
+        """Check if an image was rendered in the output folder by a previous run"""
+        return image_path in self.rendered_paths
+
+    def submit(self, image_path: AnyStr, image_bytes: bytes, response: Dict) -> None:
+        """Add an image to the queue of images to render, blocking if the queue is full"""
+        if self._exception is not None:
+            raise self._exception
+        with self._lock:
+            self.submitted_paths.add(image_path)
+        self._queue.put((image_path, image_bytes, response))
+
+    def _render_images(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            (image_path, image_bytes, response) = item
+            try:
+                result = self.api_formatter.format_save_image(
+                    output_folder=self.output_folder, image_path=image_path, response=response, image_bytes=image_bytes
+                )
+            except Exception as e:
+                (result, self._exception) = (False, e)
+            with self._lock:
+                if result:
+                    self.num_success += 1
+                else:
+                    self.num_error += 1
+
+    def close(self) -> None:
+        """Wait for all submitted images to be rendered"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        logging.info(
+            "Saving bounding boxes to output folder: {} images succeeded, {} failed".format(
+                self.num_success, self.num_error
+            )
+        )
+        if self._exception is not None:
+            raise self._exception
+
 
 class ObjectDetectionLabelingAPIFormatter(GenericAPIFormatter):
     """
     Formatter class for Object Detection & Labeling API responses:
     - make sure response is valid JSON
-    - extract object labels in a dataset
+    - extract object labels in a dataset, with one column per label ('WIDE' output format)
+      or one row per label instance with typed score and bounding box columns ('LONG' output format)
     - compute column descriptions
     - draw bounding boxes around objects with text containing label name and confidence score
     """
@@ -172,6 +412,10 @@ class ObjectDetectionLabelingAPIFormatter(GenericAPIFormatter):
         column_prefix: AnyStr = "object_api",
         error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
         parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+        rendering_engine: RenderingEngineEnum = RenderingEngineEnum.THREADS,
+        keep_raw_response: bool = True,
+        output_format: OutputFormatEnum = OutputFormatEnum.WIDE,
+        metrics: PipelineMetrics = None,
     ):
         super().__init__(
             input_df=input_df,
@@ -179,7 +423,11 @@ class ObjectDetectionLabelingAPIFormatter(GenericAPIFormatter):
             column_prefix=column_prefix,
             error_handling=error_handling,
             parallel_workers=parallel_workers,
+            rendering_engine=rendering_engine,
+            keep_raw_response=keep_raw_response,
+            metrics=metrics,
         )
+        self.output_format = output_format
         self.num_objects = int(num_objects)
         self.orientation_correction = bool(orientation_correction)
         self.orientation_column = generate_unique("orientation_correction", input_df.keys(), column_prefix)
@@ -191,34 +439,96 @@ class ObjectDetectionLabelingAPIFormatter(GenericAPIFormatter):
             generate_unique("label_" + str(n + 1) + "_score", input_df.keys(), column_prefix)
             for n in range(num_objects)
         ]
+        self.label_name_column = generate_unique("label_name", input_df.keys(), column_prefix)
+        self.label_score_column = generate_unique("label_score", input_df.keys(), column_prefix)
+        self.instance_score_column = generate_unique("instance_score", input_df.keys(), column_prefix)
+        self.bbox_columns = {
+            k: generate_unique("bbox_" + k.lower(), input_df.keys(), column_prefix)
+            for k in ["Left", "Top", "Width", "Height"]
+        }
         self._compute_column_description()
 
     def _compute_column_description(self):
-        self.column_description_dict[self.label_list_column] = "List of object labels from the API"
         self.column_description_dict[self.orientation_column] = "Orientation correction detected by the API"
+        if self.output_format == OutputFormatEnum.LONG:
+            self.column_description_dict[self.label_name_column] = "Object label extracted by the API"
+            self.column_description_dict[self.label_score_column] = "Confidence score in the label from the API"
+            self.column_description_dict[self.instance_score_column] = "Confidence score in the bounding box"
+            for k, bbox_column in self.bbox_columns.items():
+                self.column_description_dict[bbox_column] = "{} of the bounding box, relative to the image".format(k)
+            for column in [self.label_score_column, self.instance_score_column] + list(self.bbox_columns.values()):
+                self.column_type_dict[column] = "double"
+            return
+        self.column_description_dict[self.label_list_column] = "List of object labels from the API"
         for n in range(self.num_objects):
             label_column = self.label_name_columns[n]
             score_column = self.label_score_columns[n]
             self.column_description_dict[label_column] = "Object label {} extracted by the API".format(n + 1)
             self.column_description_dict[score_column] = "Confidence score in label {} from 0 to 1".format(n + 1)
-
-    def format_row(self, row: Dict) -> Dict:
-        raw_response = row[self.api_column_names.response]
-        response = safe_json_loads(raw_response, self.error_handling)
-        row[self.label_list_column] = ""
-        labels = sorted(response.get("Labels", []), key=lambda x: x.get("Confidence"), reverse=True)
-        if len(labels) != 0:
-            row[self.label_list_column] = [l.get("Name") for l in labels]
+            self.column_type_dict[score_column] = "double"
+
+    def format_output_columns(self, responses: List[Dict]) -> Tuple[Optional[List[int]], Dict[AnyStr, List]]:
+        if self.output_format == OutputFormatEnum.LONG:
+            return self.format_long_columns(responses)
+        return (None, self.format_columns(responses))
+
+    def format_long_columns(self, responses: List[Dict]) -> Tuple[List[int], Dict[AnyStr, List]]:
+        """
+        Compute columns with one row per label instance, or per label if it has no instance.
+        Images without labels are kept as one row with empty label columns.
+        """
+        row_positions = []
+        (label_names, label_scores, instance_scores) = ([], [], [])
+        bbox_values = {k: [] for k in self.bbox_columns.keys()}
+        orientations = []
+        for position, response in enumerate(responses):
+            labels = sorted(response.get("Labels", []), key=lambda x: x.get("Confidence"), reverse=True)
+            label_instances = [
+                (label, instance)
+                for label in labels[: self.num_objects]
+                for instance in (label.get("Instances") or [{}])
+            ]
+            for (label, instance) in label_instances or [({}, {})]:
+                row_positions.append(position)
+                label_names.append(label.get("Name", ""))
+                label_scores.append(label.get("Confidence"))
+                instance_scores.append(instance.get("Confidence"))
+                bbox_dict = instance.get("BoundingBox", {})
+                for k in bbox_values.keys():
+                    bbox_values[k].append(bbox_dict.get(k))
+                orientations.append(response.get("OrientationCorrection", ""))
+        columns = {
+            self.label_name_column: label_names,
+            self.label_score_column: pd.Series(label_scores, dtype=float).values,
+            self.instance_score_column: pd.Series(instance_scores, dtype=float).values,
+        }
+        for k, bbox_column in self.bbox_columns.items():
+            columns[bbox_column] = pd.Series(bbox_values[k], dtype=float).values
+        if self.orientation_correction:
+            columns[self.orientation_column] = orientations
+        return (row_positions, columns)
+
+    def format_columns(self, responses: List[Dict]) -> Dict[AnyStr, List]:
+        label_list = []
+        label_names = [[] for _ in range(self.num_objects)]
+        label_scores = [[] for _ in range(self.num_objects)]
+        for response in responses:
+            labels = sorted(response.get("Labels", []), key=lambda x: x.get("Confidence"), reverse=True)
+            label_list.append([l.get("Name") for l in labels] if len(labels) != 0 else "")
+            for n in range(self.num_objects):
+                if len(labels) > n:
+                    label_names[n].append(labels[n].get("Name", ""))
+                    label_scores[n].append(labels[n].get("Confidence"))
+                else:
+                    label_names[n].append("")
+                    label_scores[n].append(None)
+        columns = {self.label_list_column: label_list}
         for n in range(self.num_objects):
-            if len(labels) > n:
-                row[self.label_name_columns[n]] = labels[n].get("Name", "")
-                row[self.label_score_columns[n]] = labels[n].get("Confidence", "")
-            else:
-                row[self.label_name_columns[n]] = ""
-                row[self.label_score_columns[n]] = None
+            columns[self.label_name_columns[n]] = label_names[n]
+            columns[self.label_score_columns[n]] = pd.Series(label_scores[n], dtype=float).values
         if self.orientation_correction:
-            row[self.orientation_column] = response.get("OrientationCorrection", "")
-        return row
+            columns[self.orientation_column] = [r.get("OrientationCorrection", "") for r in responses]
+        return columns
 
     def format_image(self, image: Image, response: Dict) -> Image:
         bounding_box_list_dict = [
@@ -262,6 +572,9 @@ class TextDetectionAPIFormatter(GenericAPIFormatter):
         column_prefix: AnyStr = "text_api",
         error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
         parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+        rendering_engine: RenderingEngineEnum = RenderingEngineEnum.THREADS,
+        keep_raw_response: bool = True,
+        metrics: PipelineMetrics = None,
     ):
         super().__init__(
             input_df=input_df,
@@ -269,6 +582,9 @@ class TextDetectionAPIFormatter(GenericAPIFormatter):
             column_prefix=column_prefix,
             error_handling=error_handling,
             parallel_workers=parallel_workers,
+            rendering_engine=rendering_engine,
+            keep_raw_response=keep_raw_response,
+            metrics=metrics,
         )
         self.minimum_score = float(minimum_score)
         self.orientation_correction = bool(orientation_correction)
@@ -282,21 +598,20 @@ class TextDetectionAPIFormatter(GenericAPIFormatter):
         self.column_description_dict[self.text_column_concat] = "Concatenated text detections from the API"
         self.column_description_dict[self.orientation_column] = "Orientation correction detected by the API"
 
-    def format_row(self, row: Dict) -> Dict:
-        raw_response = row[self.api_column_names.response]
-        response = safe_json_loads(raw_response, self.error_handling)
-        text_detections = response.get("TextDetections", [])
-        text_detections_filtered = [
-            t for t in text_detections if t.get("Confidence") >= self.minimum_score and t.get("ParentId") is None
-        ]
-        row[self.text_column_list] = ""
-        row[self.text_column_concat] = ""
-        if len(text_detections_filtered) != 0:
-            row[self.text_column_list] = [t.get("DetectedText", "") for t in text_detections_filtered]
-            row[self.text_column_concat] = " ".join(row[self.text_column_list])
+    def format_columns(self, responses: List[Dict]) -> Dict[AnyStr, List]:
+        (text_list, text_concat) = ([], [])
+        for response in responses:
+            text_detections_filtered = [
+                t.get("DetectedText", "")
+                for t in response.get("TextDetections", [])
+                if t.get("Confidence") >= self.minimum_score and t.get("ParentId") is None
+            ]
+            text_list.append(text_detections_filtered if len(text_detections_filtered) != 0 else "")
+            text_concat.append(" ".join(text_detections_filtered))
+        columns = {self.text_column_list: text_list, self.text_column_concat: text_concat}
         if self.orientation_correction:
-            row[self.orientation_column] = response.get("OrientationCorrection", "")
-        return row
+            columns[self.orientation_column] = [r.get("OrientationCorrection", "") for r in responses]
+        return columns
 
     def format_image(self, image: Image, response: Dict) -> Image:
         text_detections = response.get("TextDetections", [])
@@ -333,9 +648,15 @@ class UnsafeContentAPIFormatter(GenericAPIFormatter):
         content_categories_second_level: List[UnsafeContentCategorySecondLevelEnum] = [],
         column_prefix: AnyStr = "moderation_api",
         error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+        keep_raw_response: bool = True,
+        metrics: PipelineMetrics = None,
     ):
         super().__init__(
-            input_df=input_df, column_prefix=column_prefix, error_handling=error_handling,
+            input_df=input_df,
+            column_prefix=column_prefix,
+            error_handling=error_handling,
+            keep_raw_response=keep_raw_response,
+            metrics=metrics,
         )
         self.category_level = category_level
         if self.category_level == UnsafeContentCategoryLevelEnum.TOP:
@@ -346,37 +667,86 @@ class UnsafeContentAPIFormatter(GenericAPIFormatter):
             self.content_categories = content_categories_second_level
         self.is_unsafe_column = generate_unique("unsafe_content", self.input_df.keys(), self.column_prefix)
         self.unsafe_list_column = generate_unique("unsafe_categories", self.input_df.keys(), self.column_prefix)
+        self.confidence_columns = [
+            generate_unique(category.name.lower() + "_score", self.input_df.keys(), self.column_prefix)
+            for category in self.content_categories
+        ]
         self._compute_column_description()
 
     def _compute_column_description(self):
         self.column_description_dict[self.is_unsafe_column] = "Unsafe content detected by the API"
+        self.column_type_dict[self.is_unsafe_column] = "boolean"
         self.column_description_dict[self.unsafe_list_column] = "List of unsafe content categories detected by the API"
         for n, m in self.content_category_enum.__members__.items():
             confidence_column = generate_unique(n.lower() + "_score", self.input_df.keys(), self.column_prefix)
             self.column_description_dict[confidence_column] = "Confidence score in category '{}' from 0 to 1".format(
                 m.value
             )
+            self.column_type_dict[confidence_column] = "double"
+
+    def format_columns(self, responses: List[Dict]) -> Dict[AnyStr, List]:
+        label_key = "ParentName" if self.category_level == UnsafeContentCategoryLevelEnum.TOP else "Name"
+        (is_unsafe, unsafe_list) = ([], [])
+        confidence_scores = [[] for _ in self.content_categories]
+        for response in responses:
+            moderation_labels = response.get("ModerationLabels", [])
+            unsafe_categories = []
+            for (category, scores) in zip(self.content_categories, confidence_scores):
+                category_scores = [
+                    l.get("Confidence") for l in moderation_labels if l.get(label_key, "") == category.value
+                ]
+                if len(category_scores) != 0:
+                    unsafe_categories.append(str(category.value))
+                    scores.append(category_scores[0])
+                else:
+                    scores.append("")
+            is_unsafe.append(len(unsafe_categories) != 0)
+            unsafe_list.append(unsafe_categories if len(unsafe_categories) != 0 else "")
+        columns = {self.is_unsafe_column: is_unsafe, self.unsafe_list_column: unsafe_list}
+        for (confidence_column, scores) in zip(self.confidence_columns, confidence_scores):
+            columns[confidence_column] = scores
+        return columns
 
-    def format_row(self, row: Dict) -> Dict:
-        raw_response = row[self.api_column_names.response]
-        response = safe_json_loads(raw_response, self.error_handling)
-        moderation_labels = response.get("ModerationLabels", [])
-        row[self.is_unsafe_column] = False
-        row[self.unsafe_list_column] = ""
-        unsafe_list = []
-        for category in self.content_categories:
-            confidence_column = generate_unique(
-                category.name.lower() + "_score", self.input_df.keys(), self.column_prefix
-            )
-            row[confidence_column] = ""
-            if self.category_level == UnsafeContentCategoryLevelEnum.TOP:
-                scores = [l.get("Confidence") for l in moderation_labels if l.get("ParentName", "") == category.value]
-            else:
-                scores = [l.get("Confidence") for l in moderation_labels if l.get("Name", "") == category.value]
-            if len(scores) != 0:
-                unsafe_list.append(str(category.value))
-                row[confidence_column] = scores[0]
-        if len(unsafe_list) != 0:
-            row[self.is_unsafe_column] = True
-            row[self.unsafe_list_column] = unsafe_list
-        return row
+
+class MultiAnalysisAPIFormatter(GenericAPIFormatter):
+    """
+    Formatter class for combined API responses of several analyses on the same images:
+    - make sure response is valid JSON, with one API response per API client method name
+    - extract the columns of each analysis with its own formatter, each with its own column prefix
+    - compute column descriptions
+    """
+
+    def __init__(
+        self,
+        input_df: pd.DataFrame,
+        api_formatters: Dict[AnyStr, GenericAPIFormatter],
+        column_prefix: AnyStr = "multi_api",
+        error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+        keep_raw_response: bool = True,
+        metrics: PipelineMetrics = None,
+    ):
+        super().__init__(
+            input_df=input_df,
+            column_prefix=column_prefix,
+            error_handling=error_handling,
+            keep_raw_response=keep_raw_response,
+            metrics=metrics,
+        )
+        self.api_formatters = api_formatters
+        self._compute_column_description()
+
+    def _compute_column_description(self):
+        for api_formatter in self.api_formatters.values():
+            api_column_names = set(api_formatter.api_column_names)
+            for (column, description) in api_formatter.column_description_dict.items():
+                if column not in api_column_names:
+                    self.column_description_dict[column] = description
+            for (column, column_type) in api_formatter.column_type_dict.items():
+                if column not in api_column_names:
+                    self.column_type_dict[column] = column_type
+
+    def format_columns(self, responses: List[Dict]) -> Dict[AnyStr, List]:
+        columns = {}
+        for (api_client_method_name, api_formatter) in self.api_formatters.items():
+            columns.update(api_formatter.format_columns([r.get(api_client_method_name, {}) for r in responses]))
+        return columns
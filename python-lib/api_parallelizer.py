@@ -4,11 +4,18 @@
 import logging
 import inspect
 import math
-from typing import Callable, AnyStr, List, Tuple, NamedTuple, Dict, Union
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+import asyncio
+import queue
+from enum import Enum
+from functools import partial
+from time import monotonic
+from typing import Callable, AnyStr, List, Tuple, NamedTuple, Dict, Union, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
+import numpy as np
 import pandas as pd
-from more_itertools import chunked, flatten
+from more_itertools import chunked
 from tqdm.auto import tqdm as tqdm_auto
 
 from plugin_io_utils import ErrorHandlingEnum, build_unique_column_names
@@ -22,6 +29,19 @@ DEFAULT_PARALLEL_WORKERS = 4
 DEFAULT_BATCH_SIZE = 10
 DEFAULT_API_SUPPORT_BATCH = False
 DEFAULT_VERBOSE = False
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_PENDING_TASKS_PER_WORKER = 2
+DEFAULT_CONCURRENCY_INCREASE_STEP = 1
+DEFAULT_CONCURRENCY_DECREASE_FACTOR = 0.5
+DEFAULT_LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING_FACTOR = 0.2
+BASELINE_LATENCY_SMOOTHING_FACTOR = 0.01
+QUEUE_POLL_INTERVAL = 0.1  # in seconds
+
+
+class ExecutionEngineEnum(Enum):
+    THREADS = "Thread pool"
+    ASYNCIO = "Asyncio event loop"
 
 
 # ==============================================================================
@@ -29,6 +49,176 @@ DEFAULT_VERBOSE = False
 # ==============================================================================
 
 
+class AdaptiveConcurrencyController:
+    """
+    Thread-safe controller of the number of API calls in flight, using Additive Increase Multiplicative Decrease:
+    - increase concurrency by 'increase_step' after each window of successful calls with healthy latency
+    - decrease concurrency by 'decrease_factor' on throttling errors or calls retried by the API client,
+      at most once per smoothed latency period
+    - decrease it as well on a sustained latency rise: when the smoothed latency stays above 'latency_tolerance'
+      times a slow moving average of latency for a full window of successful calls.
+      A spread of latencies alone, e.g. log-normal, does not shrink concurrency: only throttling does.
+    - responses served from a cache are counted apart, as their latency says nothing about the API
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        initial_concurrency: int = DEFAULT_PARALLEL_WORKERS,
+        increase_step: int = DEFAULT_CONCURRENCY_INCREASE_STEP,
+        decrease_factor: float = DEFAULT_CONCURRENCY_DECREASE_FACTOR,
+        latency_tolerance: float = DEFAULT_LATENCY_TOLERANCE,
+    ):
+        self.max_concurrency = int(max_concurrency)
+        self.min_concurrency = min(int(min_concurrency), self.max_concurrency)
+        self.concurrency = max(min(int(initial_concurrency), self.max_concurrency), self.min_concurrency)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.smoothed_latency = None
+        self.baseline_latency = None
+        self.num_successes = 0
+        self.num_throttles = 0
+        self.num_retried = 0
+        self.num_errors = 0
+        self.num_cache_hits = 0
+        self.peak_concurrency = self.concurrency
+        self._successes_in_window = 0
+        self._slow_successes_in_window = 0
+        self._last_decrease_time = None
+        self._lock = threading.Lock()
+
+    def _decrease(self) -> None:
+        """Multiplicative decrease, skipped if the last decrease is more recent than one smoothed latency period"""
+        now = monotonic()
+        cooldown = self.smoothed_latency or 0.0
+        if self._last_decrease_time is not None and now - self._last_decrease_time < cooldown:
+            return
+        self.concurrency = max(int(self.concurrency * self.decrease_factor), self.min_concurrency)
+        self._last_decrease_time = now
+        self._successes_in_window = 0
+        self._slow_successes_in_window = 0
+        logging.debug("Decreased API concurrency to {}".format(self.concurrency))
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            self.num_successes += 1
+            if self.smoothed_latency is None:
+                (self.smoothed_latency, self.baseline_latency) = (latency, latency)
+            self.smoothed_latency += LATENCY_SMOOTHING_FACTOR * (latency - self.smoothed_latency)
+            self.baseline_latency += BASELINE_LATENCY_SMOOTHING_FACTOR * (latency - self.baseline_latency)
+            if self.smoothed_latency > self.latency_tolerance * self.baseline_latency:
+                self._slow_successes_in_window += 1
+                if self._slow_successes_in_window >= self.concurrency:
+                    self._decrease()
+                return
+            self._slow_successes_in_window = 0
+            self._successes_in_window += 1
+            if self._successes_in_window >= self.concurrency:
+                self.concurrency = min(self.concurrency + self.increase_step, self.max_concurrency)
+                self.peak_concurrency = max(self.peak_concurrency, self.concurrency)
+                self._successes_in_window = 0
+
+    def on_throttle(self) -> None:
+        with self._lock:
+            self.num_throttles += 1
+            self._decrease()
+
+    def on_retried_success(self) -> None:
+        """Successful call after retries by the API client, whose latency includes the backoff between retries"""
+        with self._lock:
+            self.num_successes += 1
+            self.num_retried += 1
+            self._decrease()
+
+    def on_cache_hit(self) -> None:
+        with self._lock:
+            self.num_cache_hits += 1
+
+    def on_error(self) -> None:
+        with self._lock:
+            self.num_errors += 1
+
+    def wrap(
+        self,
+        api_call_function: Callable,
+        throttling_exception_predicate: Callable = None,
+        retry_attempts_function: Callable = None,
+    ) -> Callable:
+        """
+        Wrap an API calling function to feed its latency and errors to the controller:
+        - 'throttling_exception_predicate' returns True for exceptions due to throttling
+        - 'retry_attempts_function' returns the number of retries made by the API client before a response
+        - responses marked as 'from_cache' (see `plugin_io_utils.JSONResponse`) are not latency samples
+        """
+
+        def on_exception(exception: Exception) -> None:
+            if throttling_exception_predicate is not None and throttling_exception_predicate(exception):
+                self.on_throttle()
+            else:
+                self.on_error()
+
+        def on_response(response, latency: float) -> None:
+            if getattr(response, "from_cache", False):
+                self.on_cache_hit()
+            elif retry_attempts_function is not None and retry_attempts_function(response) > 0:
+                self.on_retried_success()
+            else:
+                self.on_success(latency)
+
+        def api_call_function_with_control(**kwargs):
+            start = monotonic()
+            try:
+                response = api_call_function(**kwargs)
+            except Exception as e:
+                on_exception(e)
+                raise e
+            on_response(response, monotonic() - start)
+            return response
+
+        async def api_call_function_with_control_async(**kwargs):
+            start = monotonic()
+            try:
+                response = await api_call_function(**kwargs)
+            except Exception as e:
+                on_exception(e)
+                raise e
+            on_response(response, monotonic() - start)
+            return response
+
+        if asyncio.iscoroutinefunction(api_call_function):
+            return api_call_function_with_control_async
+        return api_call_function_with_control
+
+    def log_summary(self) -> None:
+        logging.info(
+            "Adaptive concurrency: final {}, peak {}, {} throttling errors, {} retried calls, {} cache hits, "
+            "smoothed latency {:.3f}s".format(
+                self.concurrency,
+                self.peak_concurrency,
+                self.num_throttles,
+                self.num_retried,
+                self.num_cache_hits,
+                self.smoothed_latency or 0.0,
+            )
+        )
+
+
+def set_api_error_columns(row: Dict, exception: Exception, api_column_names: NamedTuple) -> None:
+    """
+    Helper function to the "api_call" functions.
+    Fill the error keys of a row dict from an exception raised by the API calling function.
+    """
+    error_type = str(type(exception).__qualname__)
+    module = inspect.getmodule(exception)
+    if module is not None:
+        error_type = str(module.__name__) + "." + error_type
+    row[api_column_names.error_message] = str(exception)
+    row[api_column_names.error_type] = error_type
+    row[api_column_names.error_raw] = str(exception.args)
+
+
 def api_call_single_row(
     api_call_function: Callable,
     api_column_names: NamedTuple,
@@ -59,13 +249,35 @@ def api_call_single_row(
             row[api_column_names.response] = response
         except api_exceptions as e:
             logging.warning(str(e))
-            error_type = str(type(e).__qualname__)
-            module = inspect.getmodule(e)
-            if module is not None:
-                error_type = str(module.__name__) + "." + error_type
-            row[api_column_names.error_message] = str(e)
-            row[api_column_names.error_type] = error_type
-            row[api_column_names.error_raw] = str(e.args)
+            set_api_error_columns(row, e, api_column_names)
+    return row
+
+
+async def api_call_single_row_async(
+    api_call_function: Callable,
+    api_column_names: NamedTuple,
+    row: Dict,
+    api_exceptions: Union[Exception, Tuple[Exception]],
+    error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+    verbose: bool = DEFAULT_VERBOSE,
+    **api_call_function_kwargs
+) -> Dict:
+    """
+    Asynchronous variant of the "api_call_single_row" function for coroutine API calling functions,
+    with the same handling of errors
+    """
+    if error_handling == ErrorHandlingEnum.FAIL:
+        response = await api_call_function(row=row, **api_call_function_kwargs)
+        row[api_column_names.response] = response
+    else:
+        for k in api_column_names:
+            row[k] = ""
+        try:
+            response = await api_call_function(row=row, **api_call_function_kwargs)
+            row[api_column_names.response] = response
+        except api_exceptions as e:
+            logging.warning(str(e))
+            set_api_error_columns(row, e, api_column_names)
     return row
 
 
@@ -101,44 +313,125 @@ def api_call_batch(
             batch = batch_api_response_parser(batch=batch, response=response, api_column_names=api_column_names)
         except api_exceptions as e:
             logging.warning(str(e))
-            error_type = str(type(e).__qualname__)
-            module = inspect.getmodule(e)
-            if module is not None:
-                error_type = str(module.__name__) + "." + error_type
             for row in batch:
                 row[api_column_names.response] = ""
-                row[api_column_names.error_message] = str(e)
-                row[api_column_names.error_type] = error_type
-                row[api_column_names.error_raw] = str(e.args)
+                set_api_error_columns(row, e, api_column_names)
     return batch
 
 
-def convert_api_results_to_df(
-    input_df: pd.DataFrame,
-    api_results: List[Dict],
+def build_pool_kwargs(
+    api_call_function: Callable,
+    api_exceptions: Union[Exception, Tuple[Exception]],
     api_column_names: NamedTuple,
     error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
-    verbose: bool = DEFAULT_VERBOSE,
-) -> pd.DataFrame:
+    **api_call_function_kwargs
+) -> Dict:
     """
-    Helper function to the "api_parallelizer" main function.
-    Combine API results (list of dict) with input dataframe,
-    and convert it to a dataframe.
+    Helper function to the "api_parallelizer" main functions.
+    Gather the keyword arguments passed to "api_call_single_row" or "api_call_batch" in the thread pool.
     """
+    pool_kwargs = api_call_function_kwargs.copy()
+    pool_kwargs["api_call_function"] = api_call_function
+    pool_kwargs["api_exceptions"] = api_exceptions
+    pool_kwargs["api_column_names"] = api_column_names
+    pool_kwargs["error_handling"] = error_handling
+    for k in ["fn", "row", "batch"]:  # Reserved pool keyword arguments
+        pool_kwargs.pop(k, None)
+    return pool_kwargs
+
+
+def get_output_api_column_list(
+    api_column_names: NamedTuple,
+    error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+    verbose: bool = DEFAULT_VERBOSE,
+) -> List[AnyStr]:
+    """Return the API columns to add to the output, without error columns which are not needed"""
     if error_handling == ErrorHandlingEnum.FAIL:
         columns_to_exclude = [v for k, v in api_column_names._asdict().items() if "error" in k]
     else:
         columns_to_exclude = []
         if not verbose:
             columns_to_exclude = [api_column_names.error_raw]
-    output_schema = {**{v: str for v in api_column_names}, **dict(input_df.dtypes)}
-    output_schema = {k: v for k, v in output_schema.items() if k not in columns_to_exclude}
-    record_list = [{col: result.get(col) for col in output_schema.keys()} for result in api_results]
-    api_column_list = [c for c in api_column_names if c not in columns_to_exclude]
-    output_column_list = list(input_df.columns) + api_column_list
-    output_df = pd.DataFrame.from_records(record_list).astype(output_schema).reindex(columns=output_column_list)
-    assert len(output_df.index) == len(input_df.index)
-    return output_df
+    return [c for c in api_column_names if c not in columns_to_exclude]
+
+
+def generate_rows(input_df: pd.DataFrame) -> Iterator[Dict]:
+    """
+    Helper function to the "api_parallelizer" main functions.
+    Generate row dicts lazily from the columns of a DataFrame, without the overhead of `pandas.DataFrame.iterrows`
+    which builds a Series for each row and casts values of all columns to a common type.
+    """
+    columns = list(input_df.columns)
+    for values in zip(*[iter(input_df.iloc[:, i]) for i in range(len(columns))]):
+        yield dict(zip(columns, values))
+
+
+class APIResultArrays:
+    """
+    API results stored in preallocated column arrays, indexed by the position of each row in the input DataFrame:
+    - results can be set in any order, e.g. as API calls complete, without keeping the row dicts
+    - output DataFrames are assembled column by column for a range of positions, in the order of the input
+    - 'num_contiguous_results' tracks how many rows from the start have a result, to emit chunks in order
+    """
+
+    def __init__(self, num_rows: int, api_column_names: NamedTuple):
+        self.api_column_names = api_column_names
+        self.arrays = {column: np.full(num_rows, "", dtype=object) for column in api_column_names}
+        self.has_result = np.zeros(num_rows, dtype=bool)
+        self.num_contiguous_results = 0
+
+    def set_results(self, positions: List[int], results: List[Dict]) -> None:
+        for (position, result) in zip(positions, results):
+            for (column, array) in self.arrays.items():
+                value = result.get(column, "")
+                array[position] = value if isinstance(value, str) else str(value)
+            self.has_result[position] = True
+        while self.num_contiguous_results < len(self.has_result) and self.has_result[self.num_contiguous_results]:
+            self.num_contiguous_results += 1
+
+    def count_errors(self, start: int = 0, stop: int = None) -> int:
+        return int((self.arrays[self.api_column_names.response][start:stop] == "").sum())
+
+    def to_df(
+        self,
+        input_df: pd.DataFrame,
+        start: int = 0,
+        stop: int = None,
+        error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+        verbose: bool = DEFAULT_VERBOSE,
+    ) -> pd.DataFrame:
+        """Combine the input rows between two positions with their API results, as a new DataFrame"""
+        output_df = input_df.iloc[start:stop].reset_index(drop=True)
+        for column in get_output_api_column_list(self.api_column_names, error_handling, verbose):
+            output_df[column] = self.arrays[column][start:stop]
+        return output_df
+
+    def release(self, start: int = 0, stop: int = None) -> None:
+        """Drop the references to API results between two positions, once they have been emitted"""
+        for array in self.arrays.values():
+            array[start:stop] = ""
+
+
+def convert_api_results_to_df(
+    input_df: pd.DataFrame,
+    api_results: List[Dict],
+    api_column_names: NamedTuple,
+    error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+    verbose: bool = DEFAULT_VERBOSE,
+) -> pd.DataFrame:
+    """
+    Helper function to combine API results (list of dict, in the same order as the input dataframe rows)
+    with the input dataframe, and convert it to a dataframe.
+    """
+    if len(api_results) != len(input_df.index):
+        raise ValueError(
+            "Number of API results ({}) does not match number of input rows ({})".format(
+                len(api_results), len(input_df.index)
+            )
+        )
+    api_result_arrays = APIResultArrays(len(input_df.index), api_column_names)
+    api_result_arrays.set_results(range(len(api_results)), api_results)
+    return api_result_arrays.to_df(input_df, error_handling=error_handling, verbose=verbose)
 
 
 def api_parallelizer(
@@ -160,38 +453,282 @@ def api_parallelizer(
     - (default) sending multiple concurrent threads
     - if the API supports it, sending batches of row
     """
-    df_iterator = (i[1].to_dict() for i in input_df.iterrows())
+    task_iterator = enumerate(generate_rows(input_df))
     len_iterator = len(input_df.index)
     log_msg = "Calling remote API endpoint with {} rows".format(len_iterator)
     if api_support_batch:
         log_msg += ", chunked by {}".format(batch_size)
-        df_iterator = chunked(df_iterator, batch_size)
+        task_iterator = chunked(task_iterator, batch_size)
         len_iterator = math.ceil(len_iterator / batch_size)
     logging.info(log_msg)
     api_column_names = build_unique_column_names(input_df.columns, column_prefix)
-    pool_kwargs = api_call_function_kwargs.copy()
-    more_kwargs = [
-        "api_call_function",
-        "error_handling",
-        "api_exceptions",
-        "api_column_names",
-    ]
-    for k in more_kwargs:
-        pool_kwargs[k] = locals()[k]
-    for k in ["fn", "row", "batch"]:  # Reserved pool keyword arguments
-        pool_kwargs.pop(k, None)
-    api_results = []
+    pool_kwargs = build_pool_kwargs(
+        api_call_function, api_exceptions, api_column_names, error_handling, **api_call_function_kwargs
+    )
+    api_result_arrays = APIResultArrays(len(input_df.index), api_column_names)
     with ThreadPoolExecutor(max_workers=parallel_workers) as pool:
-        if api_support_batch:
-            futures = [pool.submit(api_call_batch, batch=batch, **pool_kwargs) for batch in df_iterator]
-        else:
-            futures = [pool.submit(api_call_single_row, row=row, **pool_kwargs) for row in df_iterator]
-        for f in tqdm_auto(as_completed(futures), total=len_iterator):
-            api_results.append(f.result())
-    if api_support_batch:
-        api_results = flatten(api_results)
-    output_df = convert_api_results_to_df(input_df, api_results, api_column_names, error_handling, verbose)
-    num_api_error = sum(output_df[api_column_names.response] == "")
+        futures = {}
+        for task in task_iterator:
+            if api_support_batch:
+                future = pool.submit(api_call_batch, batch=[row for (_, row) in task], **pool_kwargs)
+                futures[future] = [position for (position, _) in task]
+            else:
+                futures[pool.submit(api_call_single_row, row=task[1], **pool_kwargs)] = [task[0]]
+        for future in tqdm_auto(as_completed(futures), total=len_iterator):
+            positions = futures.pop(future)
+            api_result_arrays.set_results(positions, future.result() if api_support_batch else [future.result()])
+    output_df = api_result_arrays.to_df(input_df, error_handling=error_handling, verbose=verbose)
+    num_api_error = api_result_arrays.count_errors()
     num_api_success = len(input_df.index) - num_api_error
     logging.info("Remote API call results: {} rows succeeded, {} rows failed.".format(num_api_success, num_api_error))
     return output_df
+
+
+def generate_api_results_threads(
+    task_iterator: Iterator,
+    pool_kwargs: Dict,
+    parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+    api_support_batch: bool = DEFAULT_API_SUPPORT_BATCH,
+    max_pending_tasks: int = None,
+    concurrency_controller: AdaptiveConcurrencyController = None,
+    admission_limit: Callable[[], int] = None,
+) -> Iterator[Tuple[List[int], List[Dict]]]:
+    """
+    Helper function to the "api_parallelizer_streaming" main function.
+    Submit tasks of (row position, row dict) lazily to a thread pool, with a bounded number of pending tasks,
+    and yield the row positions and results of each task as it completes.
+    Rows are only submitted before the position returned by 'admission_limit' (optional).
+    """
+    pending_futures = {}
+    (tasks_exhausted, num_submitted_rows) = (False, 0)
+    with ThreadPoolExecutor(max_workers=parallel_workers) as pool:
+        while not tasks_exhausted or len(pending_futures) != 0:
+            if concurrency_controller is not None:
+                max_pending_tasks = concurrency_controller.concurrency
+            while (
+                not tasks_exhausted
+                and len(pending_futures) < max_pending_tasks
+                and (admission_limit is None or num_submitted_rows < admission_limit())
+            ):
+                task = next(task_iterator, None)
+                if task is None:
+                    tasks_exhausted = True
+                elif api_support_batch:
+                    future = pool.submit(api_call_batch, batch=[row for (_, row) in task], **pool_kwargs)
+                    pending_futures[future] = [position for (position, _) in task]
+                    num_submitted_rows += len(task)
+                else:
+                    future = pool.submit(api_call_single_row, row=task[1], **pool_kwargs)
+                    pending_futures[future] = [task[0]]
+                    num_submitted_rows += 1
+            if len(pending_futures) == 0:
+                break
+            (done_futures, _) = wait(pending_futures, return_when=FIRST_COMPLETED)
+            for future in done_futures:
+                positions = pending_futures.pop(future)
+                yield (positions, future.result() if api_support_batch else [future.result()])
+
+
+def generate_api_results_asyncio(
+    task_iterator: Iterator,
+    pool_kwargs: Dict,
+    parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+    api_support_batch: bool = DEFAULT_API_SUPPORT_BATCH,
+    max_pending_tasks: int = None,
+    concurrency_controller: AdaptiveConcurrencyController = None,
+    admission_limit: Callable[[], int] = None,
+) -> Iterator[Tuple[List[int], List[Dict]]]:
+    """
+    Helper function to the "api_parallelizer_streaming" main function.
+    Same as "generate_api_results_threads" but tasks are scheduled on an asyncio event loop in a background thread:
+    - coroutine API calling functions run on the event loop, so many calls can be in flight from one thread
+    - blocking API calling functions run in a thread pool of 'parallel_workers' threads, as with the thread engine
+    Results are passed back through a queue bounded by the number of pending tasks.
+    If the consumer stops early, the event loop stops scheduling tasks, cancels pending ones and is joined.
+    """
+    is_coroutine = asyncio.iscoroutinefunction(pool_kwargs["api_call_function"])
+    if is_coroutine and api_support_batch:
+        raise ValueError("Asynchronous API calling functions do not support batches")
+    result_queue = queue.Queue(maxsize=max(max_pending_tasks, 1))
+    end_of_results = object()
+    stop_event = threading.Event()
+
+    def put_result(result) -> bool:
+        """Put a result in the queue, waiting for space unless the consumer has stopped. Returns False if stopped."""
+        while not stop_event.is_set():
+            try:
+                result_queue.put(result, timeout=QUEUE_POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def schedule_tasks(
+        loop: asyncio.AbstractEventLoop, executor: ThreadPoolExecutor, queue_executor: ThreadPoolExecutor
+    ):
+        pending_tasks = {}
+        (tasks_exhausted, num_submitted_rows) = (False, 0)
+        limit = max_pending_tasks
+        try:
+            while not tasks_exhausted or len(pending_tasks) != 0:
+                if concurrency_controller is not None:
+                    limit = concurrency_controller.concurrency
+                while (
+                    not tasks_exhausted
+                    and len(pending_tasks) < limit
+                    and (admission_limit is None or num_submitted_rows < admission_limit())
+                ):
+                    task = next(task_iterator, None)
+                    if task is None:
+                        tasks_exhausted = True
+                    elif api_support_batch:
+                        batch = [row for (_, row) in task]
+                        future = loop.run_in_executor(executor, partial(api_call_batch, batch=batch, **pool_kwargs))
+                        pending_tasks[future] = [position for (position, _) in task]
+                        num_submitted_rows += len(task)
+                    elif is_coroutine:
+                        future = asyncio.ensure_future(api_call_single_row_async(row=task[1], **pool_kwargs))
+                        pending_tasks[future] = [task[0]]
+                        num_submitted_rows += 1
+                    else:
+                        future = loop.run_in_executor(
+                            executor, partial(api_call_single_row, row=task[1], **pool_kwargs)
+                        )
+                        pending_tasks[future] = [task[0]]
+                        num_submitted_rows += 1
+                if len(pending_tasks) == 0:
+                    if tasks_exhausted or stop_event.is_set():
+                        break
+                    # Wait for the consumer to emit the buffered results before admitting more rows
+                    await asyncio.sleep(QUEUE_POLL_INTERVAL)
+                    continue
+                (done_tasks, _) = await asyncio.wait(pending_tasks, return_when=asyncio.FIRST_COMPLETED)
+                for future in done_tasks:
+                    positions = pending_tasks.pop(future)
+                    result = (positions, future.result() if api_support_batch else [future.result()])
+                    if not await loop.run_in_executor(queue_executor, put_result, result):
+                        return
+        finally:
+            for future in pending_tasks:
+                future.cancel()
+            if len(pending_tasks) != 0:
+                await asyncio.wait(pending_tasks)
+
+    def run_event_loop():
+        loop = asyncio.new_event_loop()
+        executor = ThreadPoolExecutor(max_workers=parallel_workers)
+        queue_executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            loop.run_until_complete(schedule_tasks(loop, executor, queue_executor))
+            put_result(end_of_results)
+        except Exception as e:
+            put_result(e)
+        finally:
+            executor.shutdown(wait=True)
+            queue_executor.shutdown(wait=True)
+            loop.close()
+
+    event_loop_thread = threading.Thread(target=run_event_loop, daemon=True)
+    event_loop_thread.start()
+    try:
+        while True:
+            result = result_queue.get()
+            if result is end_of_results:
+                break
+            if isinstance(result, Exception):
+                raise result
+            yield result
+    finally:
+        stop_event.set()
+        event_loop_thread.join()
+
+
+def api_parallelizer_streaming(
+    input_df: pd.DataFrame,
+    api_call_function: Callable,
+    api_exceptions: Union[Exception, Tuple[Exception]],
+    column_prefix: AnyStr,
+    parallel_workers: int = DEFAULT_PARALLEL_WORKERS,
+    api_support_batch: bool = DEFAULT_API_SUPPORT_BATCH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+    verbose: bool = DEFAULT_VERBOSE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_pending_tasks: int = None,
+    adaptive_concurrency: bool = False,
+    throttling_exception_predicate: Callable = None,
+    retry_attempts_function: Callable = None,
+    execution_engine: ExecutionEngineEnum = ExecutionEngineEnum.THREADS,
+    **api_call_function_kwargs
+) -> Iterator[pd.DataFrame]:
+    """
+    Streaming variant of the "api_parallelizer" function with bounded memory usage.
+    Rows are pulled lazily from the input DataFrame and at most 'max_pending_tasks' calls are in flight
+    (by default twice the number of parallel workers).
+    Results are written by row position into preallocated arrays, and yielded as DataFrames of 'chunk_size' rows
+    in the order of the input as soon as all rows of a chunk are done, so that they can be written before all
+    API calls are done. A slow call delays the chunks after its own, and rows are only admitted up to
+    'max_pending_tasks' rows after the chunk which it delays, so that buffered results stay bounded.
+    With 'adaptive_concurrency', 'parallel_workers' is the maximum number of calls in flight,
+    tuned by an AdaptiveConcurrencyController from the latency of calls, from throttling errors
+    (exceptions for which 'throttling_exception_predicate' returns True) and from calls retried by the API client
+    (responses for which 'retry_attempts_function' returns more than 0).
+    Calls are scheduled on a thread pool (default) or on an asyncio event loop, see 'execution_engine'.
+    The asyncio engine only lifts the limit of 'parallel_workers' threads for coroutine API calling functions:
+    blocking ones, such as boto3 client methods, still run on 'parallel_workers' threads.
+    """
+    if max_pending_tasks is None:
+        max_pending_tasks = DEFAULT_PENDING_TASKS_PER_WORKER * parallel_workers
+    concurrency_controller = None
+    if adaptive_concurrency:
+        concurrency_controller = AdaptiveConcurrencyController(max_concurrency=parallel_workers)
+        api_call_function = concurrency_controller.wrap(
+            api_call_function, throttling_exception_predicate, retry_attempts_function
+        )
+    task_iterator = enumerate(generate_rows(input_df))
+    len_iterator = len(input_df.index)
+    log_msg = "Calling remote API endpoint with {} rows, streamed by chunks of {}".format(len_iterator, chunk_size)
+    if api_support_batch:
+        log_msg += ", batched by {}".format(batch_size)
+        task_iterator = chunked(task_iterator, batch_size)
+    logging.info(log_msg)
+    api_column_names = build_unique_column_names(input_df.columns, column_prefix)
+    pool_kwargs = build_pool_kwargs(
+        api_call_function, api_exceptions, api_column_names, error_handling, **api_call_function_kwargs
+    )
+    (num_api_error, chunk_start) = (0, 0)
+
+    def admission_limit() -> int:
+        """Position of the first row not to submit yet, so that at most one chunk and the pending tasks are buffered"""
+        return chunk_start + chunk_size + max_pending_tasks
+
+    generate_api_results = generate_api_results_threads
+    if execution_engine == ExecutionEngineEnum.ASYNCIO:
+        generate_api_results = generate_api_results_asyncio
+    result_iterator = generate_api_results(
+        task_iterator=task_iterator,
+        pool_kwargs=pool_kwargs,
+        parallel_workers=parallel_workers,
+        api_support_batch=api_support_batch,
+        max_pending_tasks=max_pending_tasks,
+        concurrency_controller=concurrency_controller,
+        admission_limit=admission_limit,
+    )
+    api_result_arrays = APIResultArrays(len_iterator, api_column_names)
+    with tqdm_auto(total=len_iterator) as progress_bar:
+        for (positions, results) in result_iterator:
+            api_result_arrays.set_results(positions, results)
+            progress_bar.update(len(results))
+            while api_result_arrays.num_contiguous_results - chunk_start >= chunk_size:
+                chunk_stop = chunk_start + chunk_size
+                yield api_result_arrays.to_df(input_df, chunk_start, chunk_stop, error_handling, verbose)
+                num_api_error += api_result_arrays.count_errors(chunk_start, chunk_stop)
+                api_result_arrays.release(chunk_start, chunk_stop)
+                chunk_start = chunk_stop
+        if chunk_start < len_iterator:
+            yield api_result_arrays.to_df(input_df, chunk_start, len_iterator, error_handling, verbose)
+            num_api_error += api_result_arrays.count_errors(chunk_start, len_iterator)
+    num_api_success = len_iterator - num_api_error
+    logging.info("Remote API call results: {} rows succeeded, {} rows failed.".format(num_api_success, num_api_error))
+    if concurrency_controller is not None:
+        concurrency_controller.log_summary()
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""Module with thread-safe token buckets to rate limit API calls, within one process or across processes"""
+
+import logging
+import os
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+from time import monotonic, sleep
+from typing import AnyStr, Callable, Dict
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+DEFAULT_BURST = 1
+STATE_FILE_PREFIX = "api_rate_limiter_"
+STATE_DIRECTORY_PREFIX = "api_rate_limiter_user_"
+STATE_FORMAT = "dd"  # number of tokens and time of last refill
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class TokenBucketRateLimiter:
+    """
+    Thread-safe token bucket rate limiter:
+    - tokens are added continuously at a rate of 'rate_limit' per 'period' seconds, up to 'burst' tokens
+    - each call takes a token, and callers which find the bucket empty reserve the next token
+      and block just long enough for it to arrive, so that calls are spread evenly across the period
+    - keeps statistics on the time spent waiting for tokens versus calling the API
+    """
+
+    def __init__(self, rate_limit: int, period: float = 1.0, burst: int = DEFAULT_BURST):
+        if rate_limit < 1 or period <= 0:
+            raise ValueError("Rate limit must be greater than 1 and period must be positive")
+        self.rate = float(rate_limit) / float(period)
+        self.capacity = float(max(burst, 1))
+        self.num_calls = 0
+        self.num_throttled_calls = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.total_call_time = 0.0
+        self._tokens = self.capacity
+        self._last_refill_time = monotonic()
+        self._lock = threading.Lock()
+
+    def _take_token(self) -> float:
+        """Refill the bucket, take a token and return the time to wait until it is available (caller holds the lock)"""
+        now = monotonic()
+        self._tokens = min(self._tokens + (now - self._last_refill_time) * self.rate, self.capacity)
+        self._last_refill_time = now
+        self._tokens -= 1.0
+        return max(-self._tokens / self.rate, 0.0)
+
+    def _reserve(self) -> float:
+        """Take a token, possibly in advance, and return the time to wait until it is available"""
+        with self._lock:
+            wait_time = self._take_token()
+            self.num_calls += 1
+            if wait_time > 0:
+                self.num_throttled_calls += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+        return wait_time
+
+    def acquire(self) -> float:
+        """Block until a token is available and return the time spent waiting"""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            sleep(wait_time)
+        return wait_time
+
+    def call(self, function: Callable, *args, **kwargs):
+        """Call a function once a token is available"""
+        self.acquire()
+        start = monotonic()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.total_call_time += monotonic() - start
+
+    def limit(self, function: Callable) -> Callable:
+        """Decorator to rate limit a function"""
+
+        def rate_limited_function(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+
+        return rate_limited_function
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "num_calls": self.num_calls,
+                "num_throttled_calls": self.num_throttled_calls,
+                "total_wait_time": self.total_wait_time,
+                "max_wait_time": self.max_wait_time,
+                "average_wait_time": self.total_wait_time / max(self.num_calls, 1),
+                "total_call_time": self.total_call_time,
+            }
+
+    def log_stats(self) -> None:
+        logging.info(
+            "Rate limiter: {num_calls} calls, {num_throttled_calls} throttled, "
+            "{total_wait_time:.1f}s waiting for quota (max {max_wait_time:.3f}s), "
+            "{total_call_time:.1f}s calling the API".format(**self.get_stats())
+        )
+
+
+class SharedTokenBucketRateLimiter(TokenBucketRateLimiter):
+    """
+    Token bucket rate limiter shared by all processes on the same host:
+    - the bucket state is stored in a small file, locked with 'fcntl.flock' while taking a token
+    - processes using the same 'state_key' (e.g. AWS account and region) and quota share the same bucket,
+      so that they collectively stay within the quota while each can use all of it when others are idle
+    - the state file is private to the current user, in a per-user directory of the temporary folder by default.
+      If it cannot be used safely, the rate limit falls back to the current process only
+    - statistics are kept for the current process only
+    """
+
+    def __init__(
+        self,
+        rate_limit: int,
+        period: float = 1.0,
+        burst: int = DEFAULT_BURST,
+        state_key: AnyStr = "",
+        state_directory: AnyStr = None,
+    ):
+        super().__init__(rate_limit=rate_limit, period=period, burst=burst)
+        if state_directory is None:
+            state_directory = os.path.join(tempfile.gettempdir(), STATE_DIRECTORY_PREFIX + str(os.getuid()))
+        state_hash = hashlib.sha1("{}_{}_{}".format(state_key, self.rate, self.capacity).encode("utf-8")).hexdigest()
+        self.state_path = os.path.join(state_directory, STATE_FILE_PREFIX + state_hash[:16] + ".state")
+        self._state_file_descriptor = None
+        try:
+            self._state_file_descriptor = self._open_state_file(state_directory)
+            logging.info("Sharing rate limit across processes with state file: {}".format(self.state_path))
+        except PermissionError as e:
+            logging.warning("Rate limit applied to the current process only, cannot share it: {}".format(e))
+
+    def _open_state_file(self, state_directory: AnyStr) -> int:
+        """Open the state file, in a directory which must belong to the current user and be private to them"""
+        os.makedirs(state_directory, mode=0o700, exist_ok=True)
+        directory_stat = os.stat(state_directory)
+        if directory_stat.st_uid != os.getuid() or directory_stat.st_mode & 0o022:
+            raise PermissionError(
+                "State directory not owned by the current user or writable by others: {}".format(state_directory)
+            )
+        return os.open(self.state_path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+
+    def _take_token(self) -> float:
+        if self._state_file_descriptor is None:
+            return super()._take_token()
+        fcntl.flock(self._state_file_descriptor, fcntl.LOCK_EX)
+        try:
+            state = os.pread(self._state_file_descriptor, struct.calcsize(STATE_FORMAT), 0)
+            (self._tokens, self._last_refill_time) = (self.capacity, monotonic())
+            if len(state) == struct.calcsize(STATE_FORMAT):
+                (tokens, last_refill_time) = struct.unpack(STATE_FORMAT, state)
+                if last_refill_time <= self._last_refill_time:  # state files from before a reboot are ignored
+                    (self._tokens, self._last_refill_time) = (tokens, last_refill_time)
+            wait_time = super()._take_token()
+            os.pwrite(self._state_file_descriptor, struct.pack(STATE_FORMAT, self._tokens, self._last_refill_time), 0)
+        finally:
+            fcntl.flock(self._state_file_descriptor, fcntl.LOCK_UN)
+        return wait_time
+
+    def close(self) -> None:
+        if self._state_file_descriptor is not None:
+            os.close(self._state_file_descriptor)
+            self._state_file_descriptor = None
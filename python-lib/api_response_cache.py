@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Module with a content-addressed cache of API responses stored on local disk"""
+
+import logging
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from time import time
+from typing import AnyStr, Dict, Optional
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+DEFAULT_CACHE_MAX_SIZE_MB = 1024
+CACHE_FILE_NAME = "api_response_cache.sqlite"
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def hash_bytes(data: bytes) -> AnyStr:
+    return hashlib.sha256(data).hexdigest()
+
+
+class APIResponseCache:
+    """
+    Cache of raw API responses keyed by image content and API parameters:
+    - stored in a SQLite file within a local directory, which can be shared across runs and recipes
+    - keys combine an image fingerprint (hash of the image bytes or S3 ETag) with the API method and parameters
+    - entries are evicted in least-recently-used order when the total response size exceeds 'max_size_mb'
+    - counts cache hits and misses during the run
+    """
+
+    def __init__(self, cache_directory: AnyStr, max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB):
+        os.makedirs(cache_directory, exist_ok=True)
+        self.cache_path = os.path.join(cache_directory, CACHE_FILE_NAME)
+        self.max_size = int(max_size_mb) * 1024 * 1024
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.cache_path, timeout=60, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS last_access_index ON responses (last_access)")
+            self.total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        logging.info("Loaded API response cache from {} ({} bytes)".format(self.cache_path, self.total_size))
+
+    @staticmethod
+    def build_key(image_fingerprint: AnyStr, api_client_method_name: AnyStr, **api_params) -> AnyStr:
+        key_dict = {"image": image_fingerprint, "method": api_client_method_name, "params": api_params}
+        return hash_bytes(json.dumps(key_dict, sort_keys=True, default=str).encode("utf-8"))
+
+    def get(self, key: AnyStr) -> Optional[AnyStr]:
+        with self._lock, self._connection:
+            result = self._connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if result is None:
+                self.num_misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time(), key))
+            self.num_hits += 1
+        return result[0]
+
+    def set(self, key: AnyStr, response: AnyStr) -> None:
+        size = len(response.encode("utf-8"))
+        with self._lock, self._connection:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self.total_size -= previous[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time()),
+            )
+            self.total_size += size
+            self._evict()
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits in its maximum size (caller holds the lock)"""
+        while self.total_size > self.max_size:
+            oldest = self._connection.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC, rowid ASC LIMIT 100"
+            ).fetchall()
+            if len(oldest) == 0:
+                break
+            for (key, size) in oldest:
+                if self.total_size <= self.max_size:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_size -= size
+                self.num_evictions += 1
+
+    def get_stats(self) -> Dict:
+        return {
+            "hits": self.num_hits,
+            "misses": self.num_misses,
+            "evictions": self.num_evictions,
+            "size_bytes": self.total_size,
+        }
+
+    def log_stats(self) -> None:
+        logging.info(
+            "API response cache: {hits} hits, {misses} misses, {evictions} evictions, {size_bytes} bytes".format(
+                **self.get_stats()
+            )
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 """Module with read/write utility functions based on the Dataiku API"""
 
-from typing import Dict, List, AnyStr
+import logging
+from collections import OrderedDict
+from typing import Dict, List, AnyStr, Iterator
 
 import dataiku
+import pandas as pd
 
 
 # ==============================================================================
@@ -12,11 +15,107 @@ import dataiku
 
 
 def generate_path_list(folder: dataiku.Folder) -> List[AnyStr]:
-    partition = ""
+    """List paths of all files in the folder, or in all the partitions read by the recipe if it is partitioned"""
+    partitions = [""]
     if folder.read_partitions is not None:
-        partition = folder.read_partitions[0]
-    path_list = folder.list_paths_in_partition(partition)
-    return path_list
+        partitions = folder.read_partitions
+    path_list = []
+    for partition in partitions:
+        path_list.extend(folder.list_paths_in_partition(partition))
+    return list(OrderedDict.fromkeys(path_list))  # remove duplicates, keeping the listing order
+
+
+def generate_path_details_dict(folder: dataiku.Folder) -> Dict[AnyStr, Dict]:
+    """
+    List details (size, last modification time, etc.) of all files in the folder, indexed by path.
+    Walks the folder tree with one call per directory instead of one call per file.
+    """
+    path_details_dict = {}
+    directories_to_visit = [folder.get_path_details("/")]
+    while len(directories_to_visit) != 0:
+        directory_details = directories_to_visit.pop()
+        for child_details in directory_details.get("children", []):
+            if child_details.get("directory", False):
+                if "children" not in child_details:
+                    child_details = folder.get_path_details(child_details.get("fullPath"))
+                directories_to_visit.append(child_details)
+            else:
+                path_details_dict[child_details.get("fullPath")] = child_details
+    return path_details_dict
+
+
+def write_chunks_with_schema(
+    output_dataset: dataiku.Dataset, df_iterator: Iterator[pd.DataFrame], schema: List[Dict] = None
+) -> int:
+    """
+    Write an iterator of dataframes to the output dataset as they arrive, with a single dataset writer.
+    If a schema is given, it is written before the first chunk, even if there is none, and chunks are aligned
+    on its columns. Otherwise, the schema of the output dataset is inferred from the first chunk.
+    Returns the total number of rows written.
+    """
+    num_rows = 0
+    writer = None
+    columns = None
+    if schema is not None:
+        output_dataset.write_schema(schema)
+        columns = [column["name"] for column in schema]
+        writer = output_dataset.get_writer()
+    try:
+        for df in df_iterator:
+            if writer is None:
+                output_dataset.write_schema_from_dataframe(df)
+                writer = output_dataset.get_writer()
+            if columns is not None:
+                df = df.reindex(columns=columns)
+            writer.write_dataframe(df)
+            num_rows += len(df.index)
+            logging.info("Wrote {} rows to output dataset".format(num_rows))
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_rows
+
+
+def merge_schemas(schema_list: List[List[Dict]]) -> List[Dict]:
+    """
+    Merge dataset schemas into a schema with all their columns, in order of first appearance.
+    Columns with different types in different schemas are typed as strings.
+    """
+    merged_schema = OrderedDict()
+    for schema in schema_list:
+        for column in schema:
+            if column["name"] not in merged_schema:
+                merged_schema[column["name"]] = dict(column)
+            elif merged_schema[column["name"]].get("type") != column.get("type"):
+                merged_schema[column["name"]]["type"] = "string"
+    return list(merged_schema.values())
+
+
+def generate_stacked_chunks(
+    input_datasets: List[dataiku.Dataset], columns: List[AnyStr], key_column: AnyStr = None, chunk_size: int = 10000
+) -> Iterator[pd.DataFrame]:
+    """
+    Read input datasets one after the other by chunks, with the given columns, filling missing columns with nulls.
+    If a key column is given, check that no key appears in more than one dataset, e.g. an image in two shards.
+    """
+    previous_keys = set()
+    for input_dataset in input_datasets:
+        keys = set()
+        num_rows = 0
+        for df in input_dataset.iter_dataframes(chunksize=chunk_size):
+            if key_column is not None and key_column in df.columns:
+                keys.update(df[key_column])
+                duplicate_keys = previous_keys.intersection(df[key_column])
+                if len(duplicate_keys) != 0:
+                    raise ValueError(
+                        "Dataset {} has rows already found in another dataset, e.g. {}: {}".format(
+                            input_dataset.name, key_column, sorted(duplicate_keys)[0]
+                        )
+                    )
+            num_rows += len(df.index)
+            yield df.reindex(columns=columns)
+        previous_keys.update(keys)
+        logging.info("Read {} rows from dataset {}".format(num_rows, input_dataset.name))
 
 
 def set_column_description(
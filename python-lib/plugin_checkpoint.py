@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Module with a checkpoint class to resume interrupted or incremental API calls from a journal in a managed folder"""
+
+import logging
+import json
+import hashlib
+import uuid
+from time import time
+from typing import AnyStr, Dict, List, Set, Iterator, NamedTuple
+
+import dataiku
+import pandas as pd
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, ErrorHandlingEnum
+from api_parallelizer import convert_api_results_to_df
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+FINGERPRINT_KEY = "_image_fingerprint"
+MAX_JOURNAL_FILES = 100
+COMPACTION_CHUNK_SIZE = 10000
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class APICheckpoint:
+    """
+    Checkpoint of successful API responses, stored as a journal of JSON lines files in a managed folder:
+    - journal files are namespaced by a hash of the parameters which affect API responses
+    - each chunk of results is saved to a new file, so that no file is ever rewritten
+    - already processed rows are filtered out of the input and their responses are emitted again
+    - the journal is cleared once the run has completed
+    In incremental mode, the journal is kept across runs and compacted instead of cleared.
+    Each record stores a fingerprint of the image (size and last modification time) from a manifest,
+    so that only new or modified images are sent again to the API.
+    """
+
+    def __init__(
+        self,
+        folder: dataiku.Folder,
+        params: Dict,
+        key_column: AnyStr = IMAGE_PATH_COLUMN,
+        incremental: bool = False,
+        manifest: Dict[AnyStr, AnyStr] = None,
+    ):
+        self.folder = folder
+        self.key_column = key_column
+        self.incremental = incremental
+        self.manifest = manifest
+        self.params_key = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+        self.journal_prefix = "/checkpoint_" + self.params_key[:16] + "/"
+        self.processed_keys = set()  # initialization before calling load
+        self.num_stale_records = 0
+
+    def list_journal_paths(self) -> List[AnyStr]:
+        return sorted(
+            [
+                p
+                for p in self.folder.list_paths_in_partition()
+                if p.startswith(self.journal_prefix) and p.endswith(".jsonl")
+            ]
+        )
+
+    def read_journal_file(self, path: AnyStr) -> List[Dict]:
+        """
+        Read the records of a journal file. A last line which is not valid JSON was left by an interrupted write,
+        so it is skipped: its row has no saved response and will be sent again to the API.
+        """
+        with self.folder.get_download_stream(path) as stream:
+            lines = stream.read().decode("utf-8", errors="replace").splitlines()
+        lines = [line for line in lines if line.strip() != ""]
+        records = [json.loads(line) for line in lines[:-1]]
+        if len(lines) != 0:
+            try:
+                records.append(json.loads(lines[-1]))
+            except ValueError:
+                logging.warning("Skipping truncated last line of checkpoint journal file: " + path)
+        return records
+
+    def is_valid_record(self, record: Dict) -> bool:
+        """Check that a journal record matches the current version of the image, if a manifest is available"""
+        if self.manifest is None:
+            return True
+        key = record.get(self.key_column)
+        return key in self.manifest and record.get(FINGERPRINT_KEY) == self.manifest[key]
+
+    def load(self) -> Set[AnyStr]:
+        """Load the set of keys which already have a successful API response in the journal"""
+        self.processed_keys = set()
+        self.num_stale_records = 0
+        for path in self.list_journal_paths():
+            for record in self.read_journal_file(path):
+                if self.is_valid_record(record):
+                    self.processed_keys.add(record.get(self.key_column))
+                else:
+                    self.num_stale_records += 1
+        logging.info(
+            "Loaded checkpoint with {} processed rows and {} stale rows".format(
+                len(self.processed_keys), self.num_stale_records
+            )
+        )
+        return self.processed_keys
+
+    def filter_input_df(self, input_df: pd.DataFrame) -> pd.DataFrame:
+        """Remove rows which already have a successful API response in the journal"""
+        if len(self.processed_keys) == 0:
+            return input_df
+        filtered_df = input_df[~input_df[self.key_column].isin(self.processed_keys)].reset_index(drop=True)
+        logging.info(
+            "Resuming from checkpoint: {} rows already processed, {} rows remaining".format(
+                len(input_df.index) - len(filtered_df.index), len(filtered_df.index)
+            )
+        )
+        return filtered_df
+
+    def save_chunk(self, df: pd.DataFrame, input_columns: List[AnyStr], api_column_names: NamedTuple) -> int:
+        """Append successful rows of a chunk of API results to the journal, as a new file"""
+        records = [
+            {**{col: row[col] for col in input_columns}, api_column_names.response: row[api_column_names.response]}
+            for row in df[input_columns + [api_column_names.response]].to_dict(orient="records")
+            if row[api_column_names.response] != ""
+        ]
+        if self.manifest is not None:
+            for record in records:
+                record[FINGERPRINT_KEY] = self.manifest.get(record[self.key_column])
+        self.write_journal_file(records)
+        return len(records)
+
+    def write_journal_file(self, records: List[Dict]) -> None:
+        if len(records) != 0:
+            path = self.journal_prefix + "{:.0f}_{}.jsonl".format(time() * 1000, uuid.uuid4().hex[:8])
+            data = "\n".join([json.dumps(record, default=str) for record in records])
+            self.folder.upload_stream(path, data.encode("utf-8"))
+
+    def checkpoint_stream(
+        self,
+        df_iterator: Iterator[pd.DataFrame],
+        input_df: pd.DataFrame,
+        api_column_names: NamedTuple,
+        error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG,
+        verbose: bool = False,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Emit API results saved in the journal, then save chunks of new API results to the journal as they arrive.
+        Results from the journal have the same columns as the output of the "api_parallelizer" functions.
+        """
+        input_columns = list(input_df.columns)
+        for path in self.list_journal_paths():
+            records = [record for record in self.read_journal_file(path) if self.is_valid_record(record)]
+            if len(records) == 0:
+                continue
+            for record in records:
+                for k in api_column_names:
+                    record.setdefault(k, "")
+            journal_input_df = pd.DataFrame.from_records(records, columns=input_columns).astype(dict(input_df.dtypes))
+            yield convert_api_results_to_df(journal_input_df, records, api_column_names, error_handling, verbose)
+        for df in df_iterator:
+            self.save_chunk(df, input_columns, api_column_names)
+            yield df
+
+    def clear(self) -> None:
+        """Delete the journal once the run has completed"""
+        for path in self.list_journal_paths():
+            self.folder.delete_path(path)
+        self.processed_keys = set()
+        logging.info("Cleared checkpoint")
+
+    def compact(self) -> None:
+        """Rewrite the journal without stale records, if there are any or if the journal has too many files"""
+        old_paths = self.list_journal_paths()
+        if self.num_stale_records == 0 and len(old_paths) <= MAX_JOURNAL_FILES:
+            return
+        records = []
+        for path in old_paths:
+            records.extend([record for record in self.read_journal_file(path) if self.is_valid_record(record)])
+            if len(records) >= COMPACTION_CHUNK_SIZE:
+                self.write_journal_file(records)
+                records = []
+        self.write_journal_file(records)
+        for path in old_paths:
+            self.folder.delete_path(path)
+        self.num_stale_records = 0
+        logging.info("Compacted checkpoint from {} to {} files".format(len(old_paths), len(self.list_journal_paths())))
+
+    def finalize(self) -> None:
+        """Clear the journal once the run has completed, or compact it in incremental mode"""
+        if self.incremental:
+            self.compact()
+        else:
+            self.clear()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Module with a class to downscale and recompress images before sending them to the API"""
+
+import logging
+import os
+import multiprocessing
+import threading
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from typing import AnyStr, Dict
+
+from PIL import Image
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+API_MAX_IMAGE_BYTES = 5 * 1024 * 1024  # maximum size of raw image bytes accepted by the API
+DEFAULT_IMAGE_MAX_DIMENSION = 1920
+DEFAULT_JPEG_QUALITY = 90
+PROCESS_START_METHOD = "spawn"
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def needs_downscaling(image: Image, num_bytes: int, max_dimension: int = DEFAULT_IMAGE_MAX_DIMENSION) -> bool:
+    """Check image dimensions from the header of a lazily loaded image, and size in bytes"""
+    return max(image.size) > max_dimension or num_bytes > API_MAX_IMAGE_BYTES
+
+
+def downscale_image_bytes(
+    image_bytes: bytes, max_dimension: int = DEFAULT_IMAGE_MAX_DIMENSION, jpeg_quality: int = DEFAULT_JPEG_QUALITY
+) -> bytes:
+    """
+    Resize an image to fit within a maximum width and height, and re-encode it to JPEG:
+    - images which are already small enough in both dimensions and bytes are returned as-is
+    - EXIF metadata is kept so that the API can still read the image orientation
+    - the original bytes are returned if re-encoding does not make them smaller
+    This function works on bytes rather than PIL images so that it can run in a separate process.
+    """
+    image = Image.open(BytesIO(image_bytes))
+    if not needs_downscaling(image, len(image_bytes), max_dimension):
+        return image_bytes
+    exif = image.getexif()
+    image.draft("RGB", (max_dimension, max_dimension))  # fast JPEG decoding at reduced scale
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    output_bytes = BytesIO()
+    image.save(output_bytes, format="JPEG", quality=jpeg_quality, exif=exif)
+    if output_bytes.tell() >= len(image_bytes):
+        return image_bytes
+    return output_bytes.getvalue()
+
+
+class ImagePreprocessor:
+    """
+    Downscale and recompress image bytes before they are sent to the API, in a pool of processes:
+    - API bounding boxes are normalized by image width and height, so results stay valid on the original image
+    - decoding and encoding run in separate processes so that they do not compete with API threads for the GIL.
+      They are spawned rather than forked, as a process forked while API threads run may copy locks held by them
+    - keeps statistics on the number of bytes saved
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = DEFAULT_IMAGE_MAX_DIMENSION,
+        jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+        max_workers: int = None,
+    ):
+        if max_dimension < 1 or jpeg_quality < 1 or jpeg_quality > 95:
+            raise ValueError("Maximum dimension must be positive and JPEG quality must be between 1 and 95")
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.num_images = 0
+        self.num_downscaled_images = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self._lock = threading.Lock()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=multiprocessing.get_context(PROCESS_START_METHOD)
+        )
+
+    @property
+    def cache_key(self) -> AnyStr:
+        """Key to distinguish API responses on preprocessed images in the response cache"""
+        return "{}px_{}q".format(self.max_dimension, self.jpeg_quality)
+
+    def preprocess(self, image_bytes: bytes) -> bytes:
+        """
+        Return downscaled image bytes, blocking the calling thread until a process has handled them.
+        Only the image header is read in the calling thread, so that small images skip the process pool.
+        """
+        output_bytes = image_bytes
+        if needs_downscaling(Image.open(BytesIO(image_bytes)), len(image_bytes), self.max_dimension):
+            output_bytes = self._pool.submit(
+                downscale_image_bytes, image_bytes, self.max_dimension, self.jpeg_quality
+            ).result()
+        with self._lock:
+            self.num_images += 1
+            self.num_downscaled_images += int(len(output_bytes) < len(image_bytes))
+            self.input_bytes += len(image_bytes)
+            self.output_bytes += len(output_bytes)
+        return output_bytes
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "num_images": self.num_images,
+                "num_downscaled_images": self.num_downscaled_images,
+                "input_bytes": self.input_bytes,
+                "output_bytes": self.output_bytes,
+                "saved_bytes": self.input_bytes - self.output_bytes,
+            }
+
+    def log_stats(self) -> None:
+        logging.info(
+            "Image preprocessing: {num_downscaled_images}/{num_images} images downscaled, "
+            "{saved_bytes} bytes saved ({input_bytes} bytes before, {output_bytes} bytes after)".format(
+                **self.get_stats()
+            )
+        )
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
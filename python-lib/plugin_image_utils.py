@@ -2,7 +2,11 @@
 """Module with utility functions to annotate images"""
 
 import os
-from typing import List, AnyStr
+import logging
+import threading
+from enum import Enum
+from functools import lru_cache
+from typing import List, AnyStr, Dict, Optional, Tuple
 
 import numpy as np
 from dataiku.customrecipe import get_recipe_resource
@@ -17,6 +21,15 @@ from io import BytesIO
 BOUNDING_BOX_COLOR = "red"
 BOUNDING_BOX_FONT_PATH = os.path.join(get_recipe_resource(), "SourceSansPro-Regular.ttf")
 BOUNDING_BOX_FONT_DEFAULT_SIZE = 18
+TEXT_SIZE_CACHE_MAX_SIZE = 100000
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_ORIENTATION_CORRECTION_DICT = {1: "ROTATE_0", 3: "ROTATE_180", 6: "ROTATE_90", 8: "ROTATE_270"}
+
+
+class OrientationEstimationEnum(Enum):
+    API = "API call for every image"
+    EXIF = "EXIF metadata, with API call as fallback"
+    EXIF_UPRIGHT = "EXIF metadata, assuming upright images as fallback"
 
 
 # ==============================================================================
@@ -36,18 +49,29 @@ def save_image_bytes(pil_image: Image, path: AnyStr) -> bytes:
     return image_bytes
 
 
+def reset_exif_orientation(image: Image) -> None:
+    """Set the EXIF orientation tag of an image with rotated pixels to upright, so that it is not rotated twice"""
+    exif = image.getexif()
+    if exif is not None and exif.get(EXIF_ORIENTATION_TAG) is not None:
+        exif[EXIF_ORIENTATION_TAG] = 1
+        image.info["exif"] = exif.tobytes()
+
+
 def auto_rotate_image(image: Image, detected_orientation: AnyStr) -> (Image, bool):
     (rotated_image, rotated) = (image.copy(), False)
     if detected_orientation == "ROTATE_90":
         (rotated_image, rotated) = (image.transpose(Image.ROTATE_270), True)
+        reset_exif_orientation(rotated_image)
     elif detected_orientation == "ROTATE_180":
         (rotated_image, rotated) = (image.transpose(Image.ROTATE_180), True)
+        reset_exif_orientation(rotated_image)
     elif detected_orientation == "ROTATE_270":
         (rotated_image, rotated) = (image.transpose(Image.ROTATE_90), True)
+        reset_exif_orientation(rotated_image)
     else:
         exif = image.getexif()
         if exif is not None:
-            orientation = exif.get(0x0112)
+            orientation = exif.get(EXIF_ORIENTATION_TAG)
             method = {
                 2: Image.FLIP_LEFT_RIGHT,
                 3: Image.ROTATE_180,
@@ -63,29 +87,96 @@ def auto_rotate_image(image: Image, detected_orientation: AnyStr) -> (Image, boo
     return (rotated_image, rotated)
 
 
-def scale_bounding_box_font(image: Image, text_line_list: List[AnyStr], bbox_left: int, bbox_right: int) -> ImageFont:
+class ImageOrientationEstimator:
+    """
+    Thread-safe estimator of image orientation without calling the API when possible:
+    - 'API' method always returns None so that the caller gets the orientation from the API
+    - 'EXIF' method reads the EXIF orientation tag, which cameras write for JPEG images,
+      and returns None for images without it (e.g. PNG) so that the caller falls back to the API
+    - 'EXIF_UPRIGHT' method reads the EXIF orientation tag, and assumes images without it are upright
+    Returned values follow the format of the 'OrientationCorrection' field of the API response.
+    Mirrored EXIF orientations return an empty string, as 'auto_rotate_image' then applies the EXIF tag.
     """
-    Compute font for bounding box text to enforce specific design guidelines for short text:
-    - use custom font from BOUNDING_BOX_FONT_PATH (bundled in the resource folder of the plugin)
+
+    def __init__(self, method: OrientationEstimationEnum = OrientationEstimationEnum.EXIF):
+        self.method = method
+        self.num_exif = 0
+        self.num_upright = 0
+        self.num_api = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, image: Image) -> Optional[AnyStr]:
+        """Estimate orientation locally, or return None if the API is needed to estimate it"""
+        (orientation, exif_orientation) = (None, None)
+        if self.method != OrientationEstimationEnum.API:
+            exif = image.getexif()
+            if exif is not None:
+                exif_orientation = exif.get(EXIF_ORIENTATION_TAG)
+        with self._lock:
+            if exif_orientation in range(1, 9):
+                orientation = EXIF_ORIENTATION_CORRECTION_DICT.get(exif_orientation, "")
+                self.num_exif += 1
+            elif self.method == OrientationEstimationEnum.EXIF_UPRIGHT:
+                orientation = "ROTATE_0"
+                self.num_upright += 1
+            else:
+                self.num_api += 1
+        return orientation
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "num_exif": self.num_exif,
+                "num_upright": self.num_upright,
+                "num_api": self.num_api,
+                "num_avoided_api_calls": self.num_exif + self.num_upright,
+            }
+
+    def log_stats(self) -> None:
+        logging.info(
+            "Orientation estimation: {num_exif} images from EXIF metadata, {num_upright} assumed upright, "
+            "{num_api} from API calls ({num_avoided_api_calls} API calls avoided)".format(**self.get_stats())
+        )
+
+
+@lru_cache(maxsize=None)
+def load_bounding_box_font(size: int = BOUNDING_BOX_FONT_DEFAULT_SIZE) -> ImageFont:
+    """Load the bounding box font once per size, shared across threads and images"""
+    return ImageFont.truetype(font=BOUNDING_BOX_FONT_PATH, size=size)
+
+
+@lru_cache(maxsize=TEXT_SIZE_CACHE_MAX_SIZE)
+def get_text_size(text: AnyStr, font_size: int = BOUNDING_BOX_FONT_DEFAULT_SIZE) -> Tuple[int, int]:
+    """Measure the width and height of a text in the bounding box font, once per text and font size"""
+    return load_bounding_box_font(font_size).getsize(text)
+
+
+def scale_bounding_box_font_size(image: Image, text_line_list: List[AnyStr], bbox_left: int, bbox_right: int) -> int:
+    """
+    Compute font size for bounding box text to enforce specific design guidelines for short text:
     - scale font size to fit the text width to percentages of the width of the image and bounding box
       and avoid text overflowing to the right outside the image
     - bucket font size in increments (4, 6, 8, ...) to homogenize font sizing
     Note that this function is designed for languages which read horizontally from left to right
     """
-    # Initialize font
     im_width, im_height = image.size
-    font_default_size = ImageFont.truetype(font=BOUNDING_BOX_FONT_PATH, size=BOUNDING_BOX_FONT_DEFAULT_SIZE)
-    text_width_default_size = max([font_default_size.getsize(t)[0] for t in text_line_list])
+    text_width_default_size = max([get_text_size(t)[0] for t in text_line_list])
     # Scale font size to percentages of the width of the image and bounding box
     target_width = int(max(0.15 * im_width, 0.3 * (bbox_right - bbox_left)))
     if bbox_left + target_width > im_width:
         target_width = int(im_width - bbox_left)
     scaled_font_size = int(target_width * BOUNDING_BOX_FONT_DEFAULT_SIZE / text_width_default_size)
-    scaled_font = font_default_size.font_variant(size=scaled_font_size)
     # Bucket font size in increments (2, 4, 6, 8, ...) to homogenize font sizing
-    scaled_font_size = max(2 * int(np.ceil(scaled_font_size / 2.0)), 4)
-    scaled_font = font_default_size.font_variant(size=scaled_font_size)
-    return scaled_font
+    return max(2 * int(np.ceil(scaled_font_size / 2.0)), 4)
+
+
+def scale_bounding_box_font(image: Image, text_line_list: List[AnyStr], bbox_left: int, bbox_right: int) -> ImageFont:
+    """
+    Compute font for bounding box text, using the custom font from BOUNDING_BOX_FONT_PATH
+    (bundled in the resource folder of the plugin) at the size given by 'scale_bounding_box_font_size'.
+    Fonts are cached per bucketed size, so that no font is loaded for each bounding box.
+    """
+    return load_bounding_box_font(scale_bounding_box_font_size(image, text_line_list, bbox_left, bbox_right))
 
 
 def draw_bounding_box_pil_image(
@@ -127,17 +218,19 @@ def draw_bounding_box_pil_image(
     draw.line(xy=lines, width=line_thickness, fill=color)
     if text != "" and text is not None:
         text_line_list = text.splitlines()
-        scaled_font = scale_bounding_box_font(image, text_line_list, left, right)
+        scaled_font_size = scale_bounding_box_font_size(image, text_line_list, left, right)
+        scaled_font = load_bounding_box_font(scaled_font_size)
+        text_size_list = [get_text_size(t, scaled_font_size) for t in text_line_list]
         # If the total height of the display strings added to the top of the bounding box
         # exceeds the top of the image, stack the strings below the bounding box instead of above.
-        text_height = sum([scaled_font.getsize(t)[1] for t in text_line_list])
+        text_height = sum([text_size[1] for text_size in text_size_list])
         text_height_with_margin = (1 + 2 * 0.05) * text_height  # Each line has a top and bottom margin of 0.05x
         text_bottom = top
         if top < text_height_with_margin:
             text_bottom += text_height_with_margin
         # Reverse list and print from bottom to top.
-        for t in text_line_list[::-1]:
-            text_width, text_height = scaled_font.getsize(t)
+        for (t, text_size) in zip(text_line_list[::-1], text_size_list[::-1]):
+            text_width, text_height = text_size
             margin = int(np.ceil(0.05 * text_height))
             rectangle = [(left, text_bottom - text_height - 2 * margin), (left + text_width, text_bottom + 2 * margin)]
             draw.rectangle(xy=rectangle, fill=color)
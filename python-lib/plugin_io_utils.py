@@ -4,11 +4,16 @@
 import logging
 import json
 from enum import Enum
-from typing import AnyStr, List, NamedTuple, Dict
+from typing import AnyStr, Iterable, List, NamedTuple, Dict
 from collections import OrderedDict, namedtuple
 
 import pandas as pd
 
+try:
+    import orjson  # optional faster JSON codec, used when available
+except ImportError:
+    orjson = None
+
 
 # ==============================================================================
 # CONSTANT DEFINITION
@@ -64,6 +69,53 @@ def build_unique_column_names(existing_names: List[AnyStr], column_prefix: AnySt
     return api_column_names
 
 
+def json_dumps(obj: Dict) -> AnyStr:
+    """Serialize an object to a JSON string, with orjson if available"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)  # same compact output as orjson
+
+
+def json_loads(str_to_load: AnyStr) -> Dict:
+    """Parse a JSON string, with orjson if available"""
+    if orjson is not None:
+        if isinstance(str_to_load, str):
+            str_to_load = str(str_to_load)  # orjson rejects subclasses of str such as JSONResponse
+        return orjson.loads(str_to_load)
+    return json.loads(str_to_load)
+
+
+class JSONResponse(str):
+    """
+    JSON string of an API response which keeps a reference to the decoded response:
+    - behaves as a string, so that it can be stored in dataframes, journals and datasets
+    - 'safe_json_loads' returns the decoded response directly instead of parsing the string again,
+      for as long as the string object is kept as-is in 'object' dataframe columns
+    - 'from_cache' tells that the response was served from a cache instead of the API
+    """
+
+    def __new__(cls, serialized: AnyStr, decoded: Dict = None, from_cache: bool = False):
+        json_response = super().__new__(cls, serialized)
+        json_response.decoded = decoded
+        json_response.from_cache = from_cache
+        return json_response
+
+    def __getnewargs__(self):
+        return (str(self),)
+
+    @classmethod
+    def from_decoded(cls, decoded: Dict) -> "JSONResponse":
+        """Serialize a decoded API response, exactly once"""
+        return cls(json_dumps(decoded), decoded)
+
+
+def release_decoded_responses(responses: Iterable) -> None:
+    """Drop the decoded API responses attached to JSON strings once they are formatted, to free their memory"""
+    for response in responses:
+        if isinstance(response, JSONResponse):
+            response.decoded = None
+
+
 def safe_json_loads(
     str_to_check: AnyStr, error_handling: ErrorHandlingEnum = ErrorHandlingEnum.LOG, verbose: bool = False,
 ) -> Dict:
@@ -71,12 +123,16 @@ def safe_json_loads(
     Wrap json.loads with an additional parameter to handle errors:
     - 'FAIL' to use json.loads, which throws an exception on invalid data
     - 'LOG' to try json.loads and return an empty dict if data is invalid
+    API responses which are still attached to their decoded object are not parsed again.
     """
+    decoded = getattr(str_to_check, "decoded", None)
+    if decoded is not None:
+        return decoded
     if error_handling == ErrorHandlingEnum.FAIL:
-        output = json.loads(str_to_check)
+        output = json_loads(str_to_check)
     else:
         try:
-            output = json.loads(str_to_check)
+            output = json_loads(str_to_check)
         except (TypeError, ValueError):
             if verbose:
                 logging.warning("Invalid JSON: '" + str(str_to_check) + "'")
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Module with classes to measure the latency of each stage of the pipeline and its overall throughput"""
+
+import logging
+import math
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import monotonic
+from typing import AnyStr, Dict
+
+from plugin_io_utils import json_dumps
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+HISTOGRAM_MIN_DURATION = 1e-5  # in seconds, shorter durations fall in the first bucket
+HISTOGRAM_GROWTH_FACTOR = 1.05  # ratio between the bounds of consecutive buckets, i.e. 5% relative error
+PERCENTILES = (50, 95, 99)
+PIPELINE_STAGES = (
+    "listing",
+    "download",
+    "preprocessing",
+    "rate_limit_wait",
+    "api_call",
+    "formatting",
+    "rendering",
+    "upload",
+)
+METRICS_FILE_PATH = "/pipeline_metrics.json"
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class LatencyHistogram:
+    """
+    Histogram of durations with logarithmic buckets:
+    - memory usage does not depend on the number of recorded durations
+    - percentiles are estimated with a relative error below 'HISTOGRAM_GROWTH_FACTOR' - 1
+    This class is not thread-safe, see `PipelineMetrics` for concurrent use.
+    """
+
+    def __init__(self):
+        self.bucket_counts = {}  # type: Dict[int, int]
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, duration: float) -> None:
+        bucket = 0
+        if duration > HISTOGRAM_MIN_DURATION:
+            bucket = int(math.ceil(math.log(duration / HISTOGRAM_MIN_DURATION, HISTOGRAM_GROWTH_FACTOR)))
+        self.bucket_counts[bucket] = self.bucket_counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def percentile(self, percentile: float) -> float:
+        """Estimate a percentile as the upper bound of the bucket where it falls, capped by the maximum duration"""
+        if self.count == 0:
+            return 0.0
+        rank = max(int(math.ceil(percentile / 100.0 * self.count)), 1)
+        cumulative_count = 0
+        for bucket in sorted(self.bucket_counts):
+            cumulative_count += self.bucket_counts[bucket]
+            if cumulative_count >= rank:
+                return min(HISTOGRAM_MIN_DURATION * HISTOGRAM_GROWTH_FACTOR ** bucket, self.max)
+        return self.max
+
+    def get_stats(self) -> Dict:
+        stats = {
+            "count": self.count,
+            "total_seconds": round(self.total, 6),
+            "mean_seconds": round(self.total / max(self.count, 1), 6),
+        }
+        for percentile in PERCENTILES:
+            stats["p{}_seconds".format(percentile)] = round(self.percentile(percentile), 6)
+        stats["max_seconds"] = round(self.max, 6)
+        return stats
+
+
+class PipelineMetrics:
+    """
+    Thread-safe collection of latency histograms, one per pipeline stage (see 'PIPELINE_STAGES'):
+    - stages are timed with the `time_stage` context manager by the functions which run them
+    - the summary reports percentiles of each stage, the stage with the most time spent, and rows per second
+    Since stages run in parallel threads, time spent in a stage is summed over threads and can exceed elapsed time.
+    """
+
+    def __init__(self):
+        self.histograms = {}  # type: Dict[AnyStr, LatencyHistogram]
+        self.start_time = monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, stage: AnyStr, duration: float) -> None:
+        with self._lock:
+            if stage not in self.histograms:
+                self.histograms[stage] = LatencyHistogram()
+            self.histograms[stage].record(duration)
+
+    def get_summary(self, num_rows: int) -> Dict:
+        elapsed_time = monotonic() - self.start_time
+        with self._lock:
+            stages = sorted(self.histograms, key=lambda s: (PIPELINE_STAGES + (s,)).index(s))
+            stage_stats = OrderedDict((stage, self.histograms[stage].get_stats()) for stage in stages)
+        return {
+            "num_rows": num_rows,
+            "elapsed_seconds": round(elapsed_time, 3),
+            "rows_per_second": round(num_rows / elapsed_time, 3) if elapsed_time > 0 else 0.0,
+            "slowest_stage": max(stage_stats, key=lambda s: stage_stats[s]["total_seconds"]) if stage_stats else None,
+            "stages": stage_stats,
+        }
+
+    def log_summary(self, num_rows: int) -> None:
+        logging.info("Pipeline metrics: {}".format(json_dumps(self.get_summary(num_rows))))
+
+    def save_summary(self, folder, num_rows: int, path: AnyStr = METRICS_FILE_PATH) -> None:
+        """Save the summary as a JSON file in a folder"""
+        folder.upload_stream(path, json_dumps(self.get_summary(num_rows)).encode("utf-8"))
+        logging.info("Pipeline metrics saved to output folder on path: {}".format(path))
+
+
+@contextmanager
+def time_stage(metrics: PipelineMetrics, stage: AnyStr):
+    """Record the duration of the enclosed block in a stage histogram, if metrics are given"""
+    if metrics is None:
+        yield
+        return
+    start = monotonic()
+    try:
+        yield
+    finally:
+        metrics.record(stage, monotonic() - start)
@@ -2,23 +2,51 @@
 """Module with utility classes for validating and loading plugin parameters"""
 
 import logging
-from typing import Dict, AnyStr, List
+from typing import Dict, AnyStr, List, Set
 
 import dataiku
 import boto3
 import pandas as pd
 from dataiku.customrecipe import get_recipe_config, get_input_names_for_role, get_output_names_for_role
 
-from amazon_rekognition_api_client import get_client
+from amazon_rekognition_api_client import (
+    get_client,
+    get_client_config,
+    RetryModeEnum,
+    DEFAULT_CONNECT_TIMEOUT,
+    DEFAULT_READ_TIMEOUT,
+    log_connection_stats,
+)
+from api_response_cache import APIResponseCache, DEFAULT_CACHE_MAX_SIZE_MB
+from api_rate_limiter import TokenBucketRateLimiter, SharedTokenBucketRateLimiter
 from plugin_io_utils import IMAGE_PATH_COLUMN, ErrorHandlingEnum
-from dku_io_utils import generate_path_list
+from dku_io_utils import generate_path_list, generate_path_details_dict, set_column_description
+from plugin_checkpoint import APICheckpoint
+from plugin_s3_folder import S3Folder
+from plugin_metrics import PipelineMetrics, time_stage, METRICS_FILE_PATH
+from plugin_sharding import ShardingModeEnum, is_in_shard, parse_partition_shard_index, get_shard_file_path
+from plugin_image_utils import OrientationEstimationEnum, ImageOrientationEstimator
+from plugin_image_preprocessing import ImagePreprocessor, DEFAULT_IMAGE_MAX_DIMENSION, DEFAULT_JPEG_QUALITY
 from amazon_rekognition_api_formatting import (
+    RenderingEngineEnum,
+    OutputFormatEnum,
+    AnalysisEnum,
     UnsafeContentCategoryLevelEnum,
     UnsafeContentCategoryTopLevelEnum,
     UnsafeContentCategorySecondLevelEnum,
+    GenericAPIFormatter,
+    ImageRenderingPipeline,
 )
 
 
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+# Recipe parameters which do not affect API responses, hence excluded from the checkpoint parameters
+OUTPUT_ONLY_RECIPE_PARAMS = {"error_handling", "output_format", "keep_raw_response", "save_metrics"}
+
+
 # ==============================================================================
 # CLASS AND FUNCTION DEFINITION
 # ==============================================================================
@@ -41,11 +69,17 @@ class PluginParams:
         output_dataset: dataiku.Dataset,
         api_quota_rate_limit: int,
         api_quota_period: int,
+        rate_limiter: TokenBucketRateLimiter,
         parallel_workers: int,
+        adaptive_concurrency: bool,
+        rendering_engine: RenderingEngineEnum,
         minimum_score: float,
         error_handling: ErrorHandlingEnum,
         num_objects: int = 10,
         orientation_correction: bool = False,
+        orientation_estimator: ImageOrientationEstimator = None,
+        output_format: OutputFormatEnum = OutputFormatEnum.WIDE,
+        keep_raw_response: bool = True,
         output_folder: dataiku.Folder = None,
         input_folder_is_s3: bool = False,
         input_folder_bucket: AnyStr = "",
@@ -53,6 +87,18 @@ class PluginParams:
         unsafe_content_category_level: UnsafeContentCategoryLevelEnum = UnsafeContentCategoryLevelEnum.TOP,
         unsafe_content_categories_top_level: List[UnsafeContentCategoryTopLevelEnum] = [],
         unsafe_content_categories_second_level: List[UnsafeContentCategorySecondLevelEnum] = [],
+        checkpoint: APICheckpoint = None,
+        response_cache: APIResponseCache = None,
+        s3_client: boto3.client = None,
+        image_preprocessor: ImagePreprocessor = None,
+        metrics: PipelineMetrics = None,
+        save_metrics: bool = False,
+        analyses: List[AnalysisEnum] = [],
+        shard_index: int = 0,
+        num_shards: int = 1,
+        clear_output_folder: bool = True,
+        rendered_paths: Set[AnyStr] = None,
+        metrics_path: AnyStr = METRICS_FILE_PATH,
     ):
         self.api_client = api_client
         self.input_folder = input_folder
@@ -64,31 +110,91 @@ class PluginParams:
         self.output_folder = output_folder
         self.api_quota_rate_limit = api_quota_rate_limit
         self.api_quota_period = api_quota_period
+        self.rate_limiter = rate_limiter
         self.parallel_workers = parallel_workers
+        self.adaptive_concurrency = adaptive_concurrency
+        self.rendering_engine = rendering_engine
         self.num_objects = num_objects
         self.minimum_score = minimum_score
         self.orientation_correction = orientation_correction
+        self.orientation_estimator = orientation_estimator
+        self.output_format = output_format
+        self.keep_raw_response = keep_raw_response
         self.error_handling = error_handling
         self.unsafe_content_category_level = unsafe_content_category_level
         self.unsafe_content_categories_top_level = unsafe_content_categories_top_level
         self.unsafe_content_categories_second_level = unsafe_content_categories_second_level
+        self.checkpoint = checkpoint
+        self.response_cache = response_cache
+        self.s3_client = s3_client
+        self.image_preprocessor = image_preprocessor
+        self.metrics = metrics
+        self.save_metrics = save_metrics
+        self.analyses = analyses
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        self.clear_output_folder = clear_output_folder
+        self.rendered_paths = rendered_paths
+        self.metrics_path = metrics_path
+
+    def finalize_run(self, api_formatter: GenericAPIFormatter, image_pipeline: ImageRenderingPipeline = None) -> None:
+        """
+        Finish a recipe run once all results are written to the output dataset:
+        - wait for images to be rendered and release rendering resources
+        - set column descriptions of the output dataset and mark the checkpoint as complete
+        - log statistics of the cache, image preprocessing, rate limiting, connections and orientation estimation
+        - log pipeline metrics, and save them to the output folder (optional)
+        """
+        if image_pipeline is not None:
+            image_pipeline.close()
+        api_formatter.close()
+        set_column_description(
+            output_dataset=self.output_dataset, column_description_dict=api_formatter.column_description_dict
+        )
+        if self.checkpoint is not None:
+            self.checkpoint.finalize()
+        if self.response_cache is not None:
+            self.response_cache.log_stats()
+        if self.image_preprocessor is not None:
+            self.image_preprocessor.log_stats()
+            self.image_preprocessor.close()
+        self.rate_limiter.log_stats()
+        log_connection_stats(self.api_client)
+        if self.s3_client is not None:
+            log_connection_stats(self.s3_client)
+        if self.orientation_estimator is not None:
+            self.orientation_estimator.log_stats()
+        self.metrics.log_summary(num_rows=len(self.input_df))
+        if self.save_metrics:
+            self.metrics.save_summary(self.output_folder, num_rows=len(self.input_df), path=self.metrics_path)
 
 
 class PluginParamsLoader:
     """Class to validate and load plugin parameters"""
 
-    def validate_input_params(self) -> Dict:
+    def wrap_s3_folder(self, folder: dataiku.Folder, s3_client: boto3.client = None):
+        """Wrap a managed folder stored on Amazon S3 to access it directly from S3, if an S3 client is given"""
+        folder_info = folder.get_info()
+        if s3_client is None or folder_info.get("type", "") != "S3":
+            return folder
+        folder_access_info = folder_info.get("accessInfo", {})
+        return S3Folder(
+            folder=folder,
+            s3_client=s3_client,
+            bucket=folder_access_info.get("bucket"),
+            root_path=str(folder_access_info.get("root", "")),
+        )
+
+    def validate_input_params(self, s3_client: boto3.client = None, metrics: PipelineMetrics = None) -> Dict:
         """Validate input parameters"""
         input_params_dict = {}
         input_folder_names = get_input_names_for_role("input_folder")
         if len(input_folder_names) == 0:
             raise PluginParamValidationError("Please specify input folder")
-        input_params_dict["input_folder"] = dataiku.Folder(input_folder_names[0])
-        image_path_list = [
-            p
-            for p in generate_path_list(input_params_dict["input_folder"])
-            if p.split(".")[-1].lower() in {"jpeg", "jpg", "png"}
-        ]
+        input_params_dict["input_folder"] = self.wrap_s3_folder(dataiku.Folder(input_folder_names[0]), s3_client)
+        with time_stage(metrics, "listing"):
+            path_list = generate_path_list(input_params_dict["input_folder"])
+        image_path_list = [p for p in path_list if p.split(".")[-1].lower() in {"jpeg", "jpg", "png"}]
         if len(image_path_list) == 0:
             raise PluginParamValidationError("No images of supported format (PNG or JPG) were found in input folder")
         input_params_dict["input_df"] = pd.DataFrame(image_path_list, columns=[IMAGE_PATH_COLUMN])
@@ -104,7 +210,7 @@ class PluginParamsLoader:
             )
         return input_params_dict
 
-    def validate_output_params(self) -> Dict:
+    def validate_output_params(self, s3_client: boto3.client = None) -> Dict:
         """Validate output parameters"""
         output_params_dict = {}
         # Mandatory output dataset
@@ -116,7 +222,12 @@ class PluginParamsLoader:
         output_folder_names = get_output_names_for_role("output_folder")
         output_params_dict["output_folder"] = None
         if len(output_folder_names) != 0:
-            output_params_dict["output_folder"] = dataiku.Folder(output_folder_names[0])
+            output_params_dict["output_folder"] = self.wrap_s3_folder(dataiku.Folder(output_folder_names[0]), s3_client)
+        # Optional checkpoint folder
+        checkpoint_folder_names = get_output_names_for_role("checkpoint_folder")
+        output_params_dict["checkpoint_folder"] = None
+        if len(checkpoint_folder_names) != 0:
+            output_params_dict["checkpoint_folder"] = dataiku.Folder(checkpoint_folder_names[0])
         return output_params_dict
 
     def validate_recipe_params(self) -> Dict:
@@ -129,7 +240,28 @@ class PluginParamsLoader:
         if recipe_params_dict["minimum_score"] < 0 or recipe_params_dict["minimum_score"] > 100:
             raise PluginParamValidationError("Minimum confidence score must be between 0 and 1")
         recipe_params_dict["orientation_correction"] = bool(recipe_config.get("orientation_correction", False))
+        if recipe_params_dict["orientation_correction"]:
+            recipe_params_dict["orientation_estimation"] = OrientationEstimationEnum[
+                recipe_config.get("orientation_estimation", "EXIF")
+            ]
         recipe_params_dict["error_handling"] = ErrorHandlingEnum[recipe_config.get("error_handling")]
+        recipe_params_dict["output_format"] = OutputFormatEnum[recipe_config.get("output_format", "WIDE")]
+        recipe_params_dict["keep_raw_response"] = bool(recipe_config.get("keep_raw_response", True))
+        if "analyses" in recipe_config:
+            recipe_params_dict["analyses"] = [AnalysisEnum[i] for i in recipe_config.get("analyses", [])]
+            if len(recipe_params_dict["analyses"]) == 0:
+                raise PluginParamValidationError("Choose at least one analysis")
+        recipe_params_dict["save_metrics"] = bool(recipe_config.get("save_metrics", False))
+        recipe_params_dict["incremental"] = bool(recipe_config.get("incremental", False))
+        recipe_params_dict["sharding_mode"] = ShardingModeEnum[recipe_config.get("sharding_mode", "NONE")]
+        if recipe_params_dict["sharding_mode"] != ShardingModeEnum.NONE:
+            recipe_params_dict["num_shards"] = int(recipe_config.get("num_shards", 2))
+            if recipe_params_dict["num_shards"] < 2:
+                raise PluginParamValidationError("Number of shards must be greater than 2")
+        if recipe_params_dict["sharding_mode"] == ShardingModeEnum.INDEX:
+            recipe_params_dict["shard_index"] = int(recipe_config.get("shard_index", 0))
+            if not 0 <= recipe_params_dict["shard_index"] < recipe_params_dict["num_shards"]:
+                raise PluginParamValidationError("Shard index must be between 0 and the number of shards minus 1")
         if "category_level" in recipe_config:
             recipe_params_dict["unsafe_content_category_level"] = UnsafeContentCategoryLevelEnum[
                 recipe_config.get("category_level")
@@ -163,21 +295,165 @@ class PluginParamsLoader:
         preset_params_dict["parallel_workers"] = int(api_configuration_preset.get("parallel_workers", 1))
         if preset_params_dict["parallel_workers"] < 1 or preset_params_dict["parallel_workers"] > 100:
             raise PluginParamValidationError("Concurrency must be between 1 and 100")
+        preset_params_dict["adaptive_concurrency"] = bool(api_configuration_preset.get("adaptive_concurrency", False))
+        preset_params_dict["rendering_engine"] = RenderingEngineEnum[
+            api_configuration_preset.get("rendering_engine", "THREADS")
+        ]
+        connect_timeout = int(api_configuration_preset.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT))
+        read_timeout = int(api_configuration_preset.get("read_timeout", DEFAULT_READ_TIMEOUT))
+        if connect_timeout < 1 or read_timeout < 1:
+            raise PluginParamValidationError("Connection and read timeouts must be greater than 1")
+        retry_mode = RetryModeEnum[api_configuration_preset.get("retry_mode", "ADAPTIVE")]
+        if preset_params_dict["adaptive_concurrency"] and retry_mode == RetryModeEnum.ADAPTIVE:
+            # Client-side rate limiting of adaptive retries would absorb the throttling errors which tune concurrency
+            logging.warning("Using standard retry mode instead of adaptive, as adaptive concurrency is enabled")
+            retry_mode = RetryModeEnum.STANDARD
+        cache_directory = str(api_configuration_preset.get("cache_directory") or "").strip()
+        cache_max_size = int(api_configuration_preset.get("cache_max_size", DEFAULT_CACHE_MAX_SIZE_MB))
+        if cache_max_size < 1:
+            raise PluginParamValidationError("Cache maximum size must be greater than 1")
+        image_preprocessing = bool(api_configuration_preset.get("image_preprocessing", False))
+        image_max_dimension = int(api_configuration_preset.get("image_max_dimension", DEFAULT_IMAGE_MAX_DIMENSION))
+        image_jpeg_quality = int(api_configuration_preset.get("image_jpeg_quality", DEFAULT_JPEG_QUALITY))
+        if image_preprocessing and image_max_dimension < 1:
+            raise PluginParamValidationError("Maximum image dimension must be greater than 1")
+        if image_preprocessing and (image_jpeg_quality < 1 or image_jpeg_quality > 95):
+            raise PluginParamValidationError("JPEG quality must be between 1 and 95")
         logging.info("Validated preset parameters: {}".format(preset_params_dict))
-        preset_params_dict["api_client"] = get_client(
-            aws_access_key_id=api_configuration_preset.get("aws_access_key_id"),
-            aws_secret_access_key=api_configuration_preset.get("aws_secret_access_key"),
-            aws_region_name=api_configuration_preset.get("aws_region_name"),
+        client_kwargs = {
+            "aws_access_key_id": api_configuration_preset.get("aws_access_key_id"),
+            "aws_secret_access_key": api_configuration_preset.get("aws_secret_access_key"),
+            "aws_region_name": api_configuration_preset.get("aws_region_name"),
+        }
+        # Each parallel worker makes one API call at a time, or one per analysis for the multi-analysis recipe
+        num_api_calls_per_worker = max(len(recipe_config.get("analyses", [])), 1)
+        client_config = get_client_config(
+            max_pool_connections=preset_params_dict["parallel_workers"] * num_api_calls_per_worker,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            retry_mode=retry_mode,
         )
+        preset_params_dict["api_client"] = get_client(**client_kwargs, config=client_config)
+        rate_limit_scope = api_configuration_preset.get("rate_limit_scope", "PROCESS")
+        if rate_limit_scope == "HOST":
+            preset_params_dict["rate_limiter"] = SharedTokenBucketRateLimiter(
+                rate_limit=preset_params_dict["api_quota_rate_limit"],
+                period=preset_params_dict["api_quota_period"],
+                state_key="{}_{}".format(client_kwargs["aws_access_key_id"], client_kwargs["aws_region_name"]),
+            )
+        else:
+            preset_params_dict["rate_limiter"] = TokenBucketRateLimiter(
+                rate_limit=preset_params_dict["api_quota_rate_limit"], period=preset_params_dict["api_quota_period"]
+            )
+        preset_params_dict["s3_native"] = bool(api_configuration_preset.get("s3_native", False))
+        if cache_directory != "":
+            preset_params_dict["response_cache"] = APIResponseCache(cache_directory, max_size_mb=cache_max_size)
+        if cache_directory != "" or preset_params_dict["s3_native"]:
+            preset_params_dict["s3_client"] = get_client(**client_kwargs, service_name="s3", config=client_config)
+        if image_preprocessing:
+            preset_params_dict["image_preprocessor"] = ImagePreprocessor(
+                max_dimension=image_max_dimension, jpeg_quality=image_jpeg_quality
+            )
         return preset_params_dict
 
+    def select_shard(self, input_params_dict: Dict, output_params_dict: Dict, recipe_params_dict: Dict) -> None:
+        """Keep only the images of the shard processed by this run (optional), see `plugin_sharding`"""
+        sharding_mode = recipe_params_dict.pop("sharding_mode", ShardingModeEnum.NONE)
+        num_shards = recipe_params_dict.pop("num_shards", 1)
+        shard_index = recipe_params_dict.pop("shard_index", 0)
+        if sharding_mode == ShardingModeEnum.PARTITION:
+            partition = output_params_dict["output_dataset"].writePartition
+            if not partition:
+                raise PluginParamValidationError("Please partition the output dataset to use partitions as shards")
+            try:
+                shard_index = parse_partition_shard_index(partition, num_shards)
+            except ValueError as e:
+                raise PluginParamValidationError(str(e))
+        input_params_dict["shard_index"] = shard_index
+        input_params_dict["num_shards"] = num_shards
+        output_params_dict["metrics_path"] = get_shard_file_path(METRICS_FILE_PATH, shard_index, num_shards)
+        output_folder = output_params_dict["output_folder"]
+        # Shards writing to the same unpartitioned output folder must not clear images saved by the other shards
+        output_params_dict["clear_output_folder"] = num_shards == 1 or (
+            output_folder is not None and bool(output_folder.writePartition)
+        )
+        if num_shards == 1:
+            return
+        input_df = input_params_dict["input_df"]
+        shard_mask = [is_in_shard(p, shard_index, num_shards) for p in input_df[IMAGE_PATH_COLUMN]]
+        input_params_dict["input_df"] = input_df[shard_mask].reset_index(drop=True)
+        logging.info(
+            "Processing shard {} of {} shards: {} images out of {}".format(
+                shard_index, num_shards, len(input_params_dict["input_df"].index), len(input_df.index)
+            )
+        )
+        if len(input_params_dict["input_df"].index) == 0:
+            logging.warning("No images in shard {} of {} shards".format(shard_index, num_shards))
+
+    def load_checkpoint(
+        self, input_params_dict: Dict, output_params_dict: Dict, recipe_params_dict: Dict, preset_params_dict: Dict
+    ) -> None:
+        """
+        Load the checkpoint (optional) and remove already processed images from the input.
+        In incremental mode, images of processed rows which are already in the output folder are kept as they are.
+        """
+        checkpoint_folder = output_params_dict.pop("checkpoint_folder", None)
+        incremental = recipe_params_dict.pop("incremental", False)
+        if incremental and checkpoint_folder is None:
+            raise PluginParamValidationError("Please specify a checkpoint folder to use incremental mode")
+        if checkpoint_folder is not None:
+            # Orientation estimation is a recipe parameter, but image preprocessing is a preset parameter
+            api_params_dict = {k: v for k, v in recipe_params_dict.items() if k not in OUTPUT_ONLY_RECIPE_PARAMS}
+            image_preprocessor = preset_params_dict.get("image_preprocessor")
+            if image_preprocessor is not None:
+                api_params_dict["image_preprocessing"] = image_preprocessor.cache_key
+            if input_params_dict["num_shards"] > 1:
+                # Each shard has its own journal, so that shards can share a checkpoint folder and finish separately
+                api_params_dict["shard"] = "{}_of_{}".format(
+                    input_params_dict["shard_index"], input_params_dict["num_shards"]
+                )
+            manifest = None
+            if incremental:
+                if isinstance(input_params_dict["input_folder"], S3Folder):
+                    path_details_dict = input_params_dict["input_folder"].path_details_dict
+                else:
+                    path_details_dict = generate_path_details_dict(input_params_dict["input_folder"])
+                manifest = {
+                    path: "{}_{}".format(path_details.get("size"), path_details.get("lastModified"))
+                    for path, path_details in [
+                        (p, path_details_dict.get(p, {})) for p in input_params_dict["input_df"][IMAGE_PATH_COLUMN]
+                    ]
+                }
+            checkpoint = APICheckpoint(
+                folder=checkpoint_folder, params=api_params_dict, incremental=incremental, manifest=manifest
+            )
+            checkpoint.load()
+            input_params_dict["input_df"] = checkpoint.filter_input_df(input_params_dict["input_df"])
+            output_params_dict["checkpoint"] = checkpoint
+            output_folder = output_params_dict["output_folder"]
+            if incremental and output_folder is not None:
+                partition = output_folder.writePartition if output_folder.writePartition else ""
+                output_paths = output_folder.list_paths_in_partition(partition)
+                output_params_dict["rendered_paths"] = checkpoint.processed_keys.intersection(output_paths)
+                output_params_dict["clear_output_folder"] = False
+
     def validate_load_params(self) -> PluginParams:
         """Validate and load all parameters into a `PluginParams` instance"""
-        input_params_dict = self.validate_input_params()
-        output_params_dict = self.validate_output_params()
-        recipe_params_dict = self.validate_recipe_params()
+        metrics = PipelineMetrics()
         preset_params_dict = self.validate_preset_params()
+        s3_client = preset_params_dict.get("s3_client") if preset_params_dict.pop("s3_native") else None
+        input_params_dict = self.validate_input_params(s3_client, metrics)
+        output_params_dict = self.validate_output_params(s3_client)
+        recipe_params_dict = self.validate_recipe_params()
+        if recipe_params_dict["save_metrics"] and output_params_dict["output_folder"] is None:
+            raise PluginParamValidationError("Please specify an output folder to save pipeline metrics")
+        self.select_shard(input_params_dict, output_params_dict, recipe_params_dict)
+        self.load_checkpoint(input_params_dict, output_params_dict, recipe_params_dict, preset_params_dict)
+        if "orientation_estimation" in recipe_params_dict:
+            recipe_params_dict["orientation_estimator"] = ImageOrientationEstimator(
+                recipe_params_dict.pop("orientation_estimation")
+            )
         plugin_params = PluginParams(
-            **input_params_dict, **output_params_dict, **recipe_params_dict, **preset_params_dict
+            **input_params_dict, **output_params_dict, **recipe_params_dict, **preset_params_dict, metrics=metrics
         )
         return plugin_params
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Module with a class to read and write files of S3-backed managed folders directly from Amazon S3"""
+
+import logging
+import re
+from io import BytesIO
+from contextlib import contextmanager
+from typing import AnyStr, Dict, List, Tuple
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+MULTIPART_THRESHOLD = 8 * 1024 * 1024  # files above this size are downloaded with ranged GETs and uploaded in parts
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_TRANSFER_CONCURRENCY = 4  # ranged GETs or uploaded parts in parallel, for each large file
+TIME_DIMENSION_PATTERN_TOKENS = ("%Y", "%M", "%D", "%H")  # in the order of the parts of time partition identifiers
+PATTERN_SPECIAL_CHARACTERS_REGEX = re.compile(r"[%\\.*+?()\[\]{}|^$]")
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class S3Folder:
+    """
+    Wrapper of a managed folder stored on Amazon S3, which bypasses the DSS folder API on the data path:
+    - lists keys with paginated 'list_objects_v2' calls, keeping their size, ETag and last modification time,
+      under the path prefix of a partition resolved from the partitioning pattern of the folder
+    - downloads files with a shared S3 client, using parallel ranged GETs for large files
+    - uploads files with a shared S3 client, using multipart uploads for large files
+    Other methods and attributes (e.g. 'clear_partition') are delegated to the wrapped folder.
+    Paths follow the format of the DSS folder API: relative to the folder root, with a leading slash.
+    """
+
+    def __init__(self, folder, s3_client: boto3.client, bucket: AnyStr, root_path: AnyStr = ""):
+        self.folder = folder
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.root_path = root_path.strip("/")
+        self.path_details_dict = {}  # type: Dict[AnyStr, Dict]
+        self._transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=MAX_TRANSFER_CONCURRENCY,
+        )
+
+    def __getattr__(self, name: AnyStr):
+        if name == "folder":  # not yet set, e.g. when unpickling
+            raise AttributeError(name)
+        return getattr(self.folder, name)
+
+    def get_key(self, path: AnyStr) -> AnyStr:
+        return (self.root_path + "/" + path.lstrip("/")).lstrip("/")
+
+    def get_partition_path_prefix(self, partition: AnyStr = "") -> Tuple[AnyStr, bool]:
+        """
+        Resolve the path prefix of the files in a partition from the partitioning pattern of the folder,
+        relative to the folder root, and whether all files under this prefix belong to the partition:
+        - the whole folder if no partition is given
+        - value dimensions '%{name}' and the '%Y', '%M', '%D', '%H' parts of time dimensions are replaced
+          by the partition identifier, e.g. '/2020/01/FR/' for '2020-01|FR' and the pattern '%Y/%M/%{country}/.*'
+        - the prefix stops at the last directory before any other part of the pattern, e.g. a regular expression
+        """
+        if partition is None or partition == "":
+            return ("/", True)
+        partitioning = self.folder.get_info().get("partitioning") or {}
+        pattern = partitioning.get("filePathPattern", "").lstrip("/")
+        for (dimension, dimension_value) in zip(partitioning.get("dimensions", []), str(partition).split("|")):
+            if dimension.get("type") == "time":
+                for (token, time_value) in zip(TIME_DIMENSION_PATTERN_TOKENS, dimension_value.split("-")):
+                    pattern = pattern.replace(token, time_value)
+            else:
+                pattern = pattern.replace("%{" + dimension.get("name", "") + "}", dimension_value)
+        literal_prefix = PATTERN_SPECIAL_CHARACTERS_REGEX.split(pattern, maxsplit=1)[0]
+        path_prefix = literal_prefix[: literal_prefix.rfind("/") + 1]
+        return ("/" + path_prefix, pattern == path_prefix + ".*")
+
+    def list_path_details(self, path_prefix: AnyStr = "/") -> Dict[AnyStr, Dict]:
+        """
+        List details (size, ETag, last modification time in ms) of all files in the folder
+        whose path starts with a prefix, indexed by path, and keep them for later lookups
+        """
+        root_prefix = self.root_path + "/" if self.root_path != "" else ""
+        prefix = root_prefix + path_prefix.lstrip("/")
+        path_details_dict = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for s3_object in page.get("Contents", []):
+                if s3_object["Key"].endswith("/"):
+                    continue  # placeholder of an empty directory
+                path = "/" + s3_object["Key"][len(root_prefix) :]
+                path_details_dict[path] = {
+                    "fullPath": path,
+                    "size": s3_object.get("Size"),
+                    "etag": s3_object.get("ETag", ""),
+                    "lastModified": int(s3_object["LastModified"].timestamp() * 1000)
+                    if "LastModified" in s3_object
+                    else None,
+                }
+        self.path_details_dict.update(path_details_dict)
+        logging.info(
+            "Listed {} files on Amazon S3 in bucket: {} with prefix: {}".format(
+                len(path_details_dict), self.bucket, prefix
+            )
+        )
+        return path_details_dict
+
+    def list_paths_in_partition(self, partition: AnyStr = "") -> List[AnyStr]:
+        """
+        List paths of the files in a partition from Amazon S3, under the path prefix of the partition.
+        If the partitioning pattern does not match all files under this prefix, they are filtered
+        with the listing of the partition by the wrapped folder.
+        """
+        (path_prefix, is_partition_prefix) = self.get_partition_path_prefix(partition)
+        paths = list(self.list_path_details(path_prefix).keys())
+        if not is_partition_prefix:
+            partition_paths = set(self.folder.list_paths_in_partition(partition))
+            paths = [path for path in paths if path in partition_paths]
+        return paths
+
+    def get_etag(self, path: AnyStr) -> AnyStr:
+        """Get the ETag of a file from the last listing, or from a HEAD request if it was not listed"""
+        path_details = self.path_details_dict.get(path)
+        if path_details is not None:
+            return path_details.get("etag", "")
+        return self.s3_client.head_object(Bucket=self.bucket, Key=self.get_key(path)).get("ETag", "")
+
+    @contextmanager
+    def get_download_stream(self, path: AnyStr):
+        stream = BytesIO()
+        self.s3_client.download_fileobj(self.bucket, self.get_key(path), stream, Config=self._transfer_config)
+        stream.seek(0)
+        yield stream
+
+    def upload_stream(self, path: AnyStr, data) -> None:
+        stream = BytesIO(data) if isinstance(data, bytes) else data
+        self.s3_client.upload_fileobj(stream, self.bucket, self.get_key(path), Config=self._transfer_config)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Module with functions to split images into disjoint shards processed by separate recipe runs"""
+
+import hashlib
+import os
+from enum import Enum
+from typing import AnyStr
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+
+class ShardingModeEnum(Enum):
+    NONE = "All images in one run"
+    INDEX = "Shard given by its index and the number of shards"
+    PARTITION = "Shard given by the partition of the output dataset"
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_shard_index(path: AnyStr, num_shards: int) -> int:
+    """
+    Assign a path to a shard by hashing it, so that:
+    - every run assigns a path to the same shard, whatever the machine or the other paths in the folder
+    - shards have about the same number of images
+    """
+    path_hash = hashlib.md5(path.encode("utf-8")).hexdigest()
+    return int(path_hash[:8], 16) % num_shards
+
+
+def is_in_shard(path: AnyStr, shard_index: int, num_shards: int) -> bool:
+    return num_shards <= 1 or get_shard_index(path, num_shards) == shard_index
+
+
+def parse_partition_shard_index(partition: AnyStr, num_shards: int) -> int:
+    """Get the shard index from a partition identifier, which must be an integer between 0 and num_shards - 1"""
+    try:
+        shard_index = int(str(partition).strip())
+    except ValueError:
+        raise ValueError("Partition '{}' is not a shard index between 0 and {}".format(partition, num_shards - 1))
+    if shard_index < 0 or shard_index >= num_shards:
+        raise ValueError("Partition '{}' is not a shard index between 0 and {}".format(partition, num_shards - 1))
+    return shard_index
+
+
+def get_shard_file_path(path: AnyStr, shard_index: int, num_shards: int) -> AnyStr:
+    """Add the shard to the name of a file, e.g. '/metrics.json' becomes '/metrics_shard_1_of_4.json'"""
+    if num_shards <= 1:
+        return path
+    (root, extension) = os.path.splitext(path)
+    return "{}_shard_{}_of_{}{}".format(root, shard_index, num_shards, extension)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# This is a benchmark file intended to be used with pytest and the pytest-benchmark plugin
+# pytest automatically runs all the function starting with "test_"
+# see https://pytest-benchmark.readthedocs.io for more information
+
+import os
+import json
+from time import sleep
+from typing import AnyStr, Dict
+
+import boto3
+import pandas as pd
+import pytest
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import BotoCoreError, ClientError
+
+from api_parallelizer import api_parallelizer, api_parallelizer_streaming, convert_api_results_to_df  # noqa
+from plugin_io_utils import build_unique_column_names  # noqa
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+API_EXCEPTIONS = (BotoCoreError, ClientError)
+API_LATENCY = float(os.getenv("BENCHMARK_API_LATENCY", 0.01))  # in seconds, for each API call
+NUM_ROWS = int(os.getenv("BENCHMARK_NUM_ROWS", 200))
+NUM_ASSEMBLY_ROWS = int(os.getenv("BENCHMARK_NUM_ASSEMBLY_ROWS", 1000000))
+PARALLEL_WORKERS = [1, 4, 16, 64]
+COLUMN_PREFIX = "benchmark_api"
+RESPONSE = {"Labels": [{"Name": "Cat", "Confidence": 99.0, "Instances": [], "Parents": []}]}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class FakeRawResponse:
+    """Raw HTTP response body, as read by botocore"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def get_fake_rekognition_client(latency: float = API_LATENCY, response: Dict = RESPONSE) -> boto3.client:
+    """
+    Real Amazon Rekognition client which answers all requests locally after some latency, without network calls.
+    Requests are still serialized and responses parsed by botocore, as with the real API.
+    """
+    client = boto3.client(
+        "rekognition", region_name="us-east-1", aws_access_key_id="fake", aws_secret_access_key="fake"
+    )
+    body = json.dumps(response).encode("utf-8")
+
+    def send_fake_response(request, **kwargs):
+        sleep(latency)
+        return AWSResponse(request.url, 200, {"Content-Type": "application/x-amz-json-1.1"}, FakeRawResponse(body))
+
+    client.meta.events.register("before-send.rekognition", send_fake_response)
+    return client
+
+
+def run_api_parallelizer(api_call_function, input_df: pd.DataFrame, parallel_workers: int, streaming: bool):
+    api_parallelizer_kwargs = {
+        "input_df": input_df,
+        "api_call_function": api_call_function,
+        "api_exceptions": API_EXCEPTIONS,
+        "column_prefix": COLUMN_PREFIX,
+        "parallel_workers": parallel_workers,
+    }
+    if streaming:
+        return pd.concat(list(api_parallelizer_streaming(**api_parallelizer_kwargs)))
+    return api_parallelizer(**api_parallelizer_kwargs)
+
+
+@pytest.mark.parametrize("streaming", [False, True], ids=["batch", "streaming"])
+@pytest.mark.parametrize("parallel_workers", PARALLEL_WORKERS)
+def test_benchmark_api_parallelizer(benchmark, parallel_workers: int, streaming: bool):
+    api_client = get_fake_rekognition_client()
+    input_df = pd.DataFrame({"image_path": ["/image_{}.jpg".format(i) for i in range(NUM_ROWS)]})
+
+    def call_fake_api(row: Dict) -> AnyStr:
+        return json.dumps(api_client.detect_labels(Image={"Bytes": b"image"}, MaxLabels=10))
+
+    df = benchmark.pedantic(
+        run_api_parallelizer, args=(call_fake_api, input_df, parallel_workers, streaming), rounds=3, iterations=1
+    )
+    assert len(df.index) == NUM_ROWS
+    assert (df[COLUMN_PREFIX + "_error_message"] == "").all()
+    if benchmark.stats:  # no stats with --benchmark-disable
+        benchmark.extra_info["rows_per_second"] = round(NUM_ROWS / benchmark.stats.stats.mean, 1)
+
+
+def test_benchmark_result_assembly(benchmark):
+    input_df = pd.DataFrame({"image_path": ["/image_{}.jpg".format(i) for i in range(NUM_ASSEMBLY_ROWS)]})
+    api_column_names = build_unique_column_names(input_df.columns, COLUMN_PREFIX)
+    response = json.dumps(RESPONSE)
+    api_results = [
+        {api_column_names.response: response, api_column_names.error_message: "", api_column_names.error_type: ""}
+        for _ in range(NUM_ASSEMBLY_ROWS)
+    ]
+    df = benchmark.pedantic(
+        convert_api_results_to_df, args=(input_df, api_results, api_column_names), rounds=3, iterations=1
+    )
+    assert len(df.index) == NUM_ASSEMBLY_ROWS
+    if benchmark.stats:  # no stats with --benchmark-disable
+        benchmark.extra_info["rows_per_second"] = round(NUM_ASSEMBLY_ROWS / benchmark.stats.stats.mean, 1)
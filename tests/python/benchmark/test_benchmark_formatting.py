@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# This is a benchmark file intended to be used with pytest and the pytest-benchmark plugin
+# pytest automatically runs all the function starting with "test_"
+# see https://pytest-benchmark.readthedocs.io for more information
+
+import os
+import json
+import random
+from io import BytesIO
+from typing import AnyStr, Dict, List
+
+import dataiku
+import pandas as pd
+import pytest
+from PIL import Image
+
+from plugin_io_utils import IMAGE_PATH_COLUMN
+from amazon_rekognition_api_formatting import (
+    RenderingEngineEnum,
+    OutputFormatEnum,
+    UnsafeContentCategoryTopLevelEnum,
+    ObjectDetectionLabelingAPIFormatter,
+    TextDetectionAPIFormatter,
+    UnsafeContentAPIFormatter,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+NUM_RESPONSES = int(os.getenv("BENCHMARK_NUM_RESPONSES", 100000))
+NUM_IMAGES = int(os.getenv("BENCHMARK_NUM_IMAGES", 100))
+IMAGE_SIZE = (640, 480)
+RANDOM_SEED = 42
+LABEL_NAMES = ["Cat", "Dog", "Car", "Person", "Tree", "Road", "Sky", "Building", "Bicycle", "Chair"]
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit"]
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def generate_bounding_box(rng: random.Random) -> Dict:
+    (left, top) = (rng.uniform(0, 0.8), rng.uniform(0, 0.8))
+    return {"Left": left, "Top": top, "Width": rng.uniform(0.05, 1 - left), "Height": rng.uniform(0.05, 1 - top)}
+
+
+def generate_object_detection_response(rng: random.Random) -> Dict:
+    labels = []
+    for name in rng.sample(LABEL_NAMES, rng.randint(0, len(LABEL_NAMES))):
+        instances = [
+            {"BoundingBox": generate_bounding_box(rng), "Confidence": rng.uniform(50, 100)}
+            for _ in range(rng.randint(0, 3))
+        ]
+        labels.append({"Name": name, "Confidence": rng.uniform(50, 100), "Instances": instances, "Parents": []})
+    return {"Labels": labels, "LabelModelVersion": "2.0"}
+
+
+def generate_text_detection_response(rng: random.Random) -> Dict:
+    text_detections = []
+    for line_id in range(rng.randint(0, 5)):
+        words = rng.sample(WORDS, rng.randint(1, 4))
+        geometry = {"BoundingBox": generate_bounding_box(rng)}
+        text_detections.append(
+            {
+                "DetectedText": " ".join(words),
+                "Type": "LINE",
+                "Id": line_id,
+                "Confidence": rng.uniform(50, 100),
+                "Geometry": geometry,
+            }
+        )
+        for word in words:
+            text_detections.append(
+                {
+                    "DetectedText": word,
+                    "Type": "WORD",
+                    "ParentId": line_id,
+                    "Confidence": rng.uniform(50, 100),
+                    "Geometry": geometry,
+                }
+            )
+    return {"TextDetections": text_detections, "TextModelVersion": "3.0"}
+
+
+def generate_unsafe_content_response(rng: random.Random) -> Dict:
+    moderation_labels = [
+        {"Name": category.value, "ParentName": category.value, "Confidence": rng.uniform(50, 100)}
+        for category in rng.sample(list(UnsafeContentCategoryTopLevelEnum), rng.randint(0, 2))
+    ]
+    return {"ModerationLabels": moderation_labels, "ModerationModelVersion": "4.0"}
+
+
+def generate_api_results_df(api_formatter, responses: List[Dict]) -> pd.DataFrame:
+    """Build a dataframe of API results as returned by the API parallelizer, with JSON responses as strings"""
+    api_column_names = api_formatter.api_column_names
+    return pd.DataFrame(
+        {
+            IMAGE_PATH_COLUMN: ["/image_{}.jpg".format(i) for i in range(len(responses))],
+            api_column_names.response: [json.dumps(response) for response in responses],
+            api_column_names.error_message: "",
+            api_column_names.error_type: "",
+            api_column_names.error_raw: "",
+        }
+    )
+
+
+FORMATTER_CASES = {
+    "object_detection_wide": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(input_df=df, num_objects=10, orientation_correction=False),
+        generate_object_detection_response,
+    ),
+    "object_detection_long": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(
+            input_df=df, num_objects=10, orientation_correction=False, output_format=OutputFormatEnum.LONG
+        ),
+        generate_object_detection_response,
+    ),
+    "text_detection": (
+        lambda df: TextDetectionAPIFormatter(input_df=df, minimum_score=50, orientation_correction=False),
+        generate_text_detection_response,
+    ),
+    "unsafe_content": (
+        lambda df: UnsafeContentAPIFormatter(
+            input_df=df, content_categories_top_level=list(UnsafeContentCategoryTopLevelEnum)
+        ),
+        generate_unsafe_content_response,
+    ),
+}
+
+
+@pytest.mark.parametrize("formatter_case", list(FORMATTER_CASES.keys()))
+def test_benchmark_format_df(benchmark, formatter_case: AnyStr):
+    (build_formatter, generate_response) = FORMATTER_CASES[formatter_case]
+    rng = random.Random(RANDOM_SEED)
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: []})
+    api_formatter = build_formatter(input_df)
+    df = generate_api_results_df(api_formatter, [generate_response(rng) for _ in range(NUM_RESPONSES)])
+    output_df = benchmark.pedantic(api_formatter.format_df, args=(df,), rounds=3, iterations=1)
+    assert len(output_df.index) >= NUM_RESPONSES
+    if benchmark.stats:  # no stats with --benchmark-disable
+        benchmark.extra_info["rows_per_second"] = round(NUM_RESPONSES / benchmark.stats.stats.mean, 1)
+
+
+@pytest.mark.parametrize("rendering_engine", list(RenderingEngineEnum), ids=lambda x: x.name.lower())
+def test_benchmark_format_save_images(benchmark, rendering_engine: RenderingEngineEnum):
+    rng = random.Random(RANDOM_SEED)
+    input_folder = dataiku.Folder("input")
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: []})
+    api_formatter = ObjectDetectionLabelingAPIFormatter(
+        input_df=input_df,
+        num_objects=10,
+        orientation_correction=False,
+        input_folder=input_folder,
+        rendering_engine=rendering_engine,
+    )
+    df = generate_api_results_df(api_formatter, [generate_object_detection_response(rng) for _ in range(NUM_IMAGES)])
+    for image_path in df[IMAGE_PATH_COLUMN]:
+        image_bytes = BytesIO()
+        Image.effect_noise(IMAGE_SIZE, 64).convert("RGB").save(image_bytes, format="JPEG")
+        input_folder.files[image_path] = image_bytes.getvalue()
+    output_df = api_formatter.format_df(df)
+    output_folder = dataiku.Folder("output")
+    benchmark.pedantic(api_formatter.format_save_images, args=(output_folder, output_df), rounds=3, iterations=1)
+    api_formatter.close()
+    assert len(output_folder.files) == NUM_IMAGES
+    if benchmark.stats:  # no stats with --benchmark-disable
+        benchmark.extra_info["images_per_second"] = round(NUM_IMAGES / benchmark.stats.stats.mean, 1)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# This is a configuration file intended to be used with pytest
+# pytest automatically loads it before collecting the test files of this folder and its subfolders
+# see https://docs.pytest.org for more information
+
+"""
+Install the stub of the Dataiku API in the 'stubs' folder, so that modules which import it can be tested
+outside of DSS. The folder is added to the path of modules, which processes spawned by tests inherit.
+"""
+
+import os
+import sys
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+STUBS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stubs")
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def install_dataiku_stub() -> None:
+    """Add the stub package to the path of modules, unless the real Dataiku API is available"""
+    try:
+        import dataiku  # noqa
+        import dataiku.customrecipe  # noqa
+
+        return
+    except ImportError:
+        for module_name in ("dataiku.customrecipe", "dataiku"):
+            sys.modules.pop(module_name, None)
+    if STUBS_PATH not in sys.path:
+        sys.path.insert(0, STUBS_PATH)
+
+
+install_dataiku_stub()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""Module with a local HTTP server which stands in for the Amazon Rekognition API in load tests"""
+
+import json
+import math
+import random
+import threading
+import uuid
+from enum import Enum
+from time import monotonic, sleep
+from typing import AnyStr, Dict, List, Tuple
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+TARGET_PREFIX = "RekognitionService."
+SYNTHETIC_RESPONSES = {
+    "DetectLabels": {
+        "Labels": [
+            {
+                "Name": "Cat",
+                "Confidence": 99.1,
+                "Instances": [
+                    {"BoundingBox": {"Width": 0.5, "Height": 0.6, "Left": 0.2, "Top": 0.1}, "Confidence": 98.7}
+                ],
+                "Parents": [{"Name": "Animal"}],
+            },
+            {"Name": "Animal", "Confidence": 99.1, "Instances": [], "Parents": []},
+        ],
+        "LabelModelVersion": "2.0",
+    },
+    "DetectText": {
+        "TextDetections": [
+            {
+                "DetectedText": "STOP",
+                "Type": "LINE",
+                "Id": 0,
+                "Confidence": 97.5,
+                "Geometry": {"BoundingBox": {"Width": 0.2, "Height": 0.1, "Left": 0.4, "Top": 0.4}},
+            }
+        ],
+        "TextModelVersion": "3.0",
+    },
+    "DetectModerationLabels": {
+        "ModerationLabels": [{"Name": "Violence", "ParentName": "", "Confidence": 80.2}],
+        "ModerationModelVersion": "4.0",
+    },
+    "RecognizeCelebrities": {"CelebrityFaces": [], "UnrecognizedFaces": [], "OrientationCorrection": "ROTATE_0"},
+}
+
+
+class LatencyDistributionEnum(Enum):
+    CONSTANT = "Constant latency"
+    UNIFORM = "Uniform between 0 and twice the median"
+    LOGNORMAL = "Log-normal with a given median and shape"
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class LatencyModel:
+    """Random latency of the fake API, in seconds, following a distribution around a median"""
+
+    def __init__(
+        self,
+        distribution: LatencyDistributionEnum = LatencyDistributionEnum.LOGNORMAL,
+        median: float = 0.1,
+        sigma: float = 0.5,
+        seed: int = None,
+    ):
+        self.distribution = distribution
+        self.median = median
+        self.sigma = sigma
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.distribution == LatencyDistributionEnum.UNIFORM:
+                return self._random.uniform(0, 2 * self.median)
+            if self.distribution == LatencyDistributionEnum.LOGNORMAL:
+                return self._random.lognormvariate(math.log(self.median), self.sigma)
+            return self.median
+
+
+class ServerQuota:
+    """Token bucket enforcing a quota of transactions per second for each API method, as AWS does"""
+
+    def __init__(self, tps: float):
+        self.tps = tps
+        self._buckets = {}  # type: Dict[AnyStr, List[float]]
+        self._lock = threading.Lock()
+
+    def try_acquire(self, method: AnyStr) -> bool:
+        now = monotonic()
+        with self._lock:
+            (tokens, last_refill_time) = self._buckets.get(method, [self.tps, now])
+            tokens = min(self.tps, tokens + (now - last_refill_time) * self.tps)
+            allowed = tokens >= 1
+            self._buckets[method] = [tokens - 1 if allowed else tokens, now]
+            return allowed
+
+
+class FakeRekognitionServer(ThreadingMixIn, HTTPServer):
+    """
+    Local HTTP server speaking enough of the Amazon Rekognition JSON protocol for botocore clients:
+    - answers each method with recorded responses (optional), or synthetic responses by default
+    - waits for a random latency before answering, following a 'LatencyModel'
+    - returns 'ThrottlingException' errors above a quota of transactions per second (optional),
+      and at random with a given probability (optional)
+    Point a client to it with the 'endpoint_url' argument of `boto3.client`, e.g. 'http://127.0.0.1:<port>'.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency_model: LatencyModel = None,
+        tps_quota: float = None,
+        throttling_probability: float = 0.0,
+        responses: Dict[AnyStr, List[Dict]] = None,
+        seed: int = None,
+    ):
+        super().__init__(("127.0.0.1", port), FakeRekognitionRequestHandler)
+        self.latency_model = latency_model or LatencyModel(seed=seed)
+        self.quota = ServerQuota(tps_quota) if tps_quota else None
+        self.throttling_probability = throttling_probability
+        self.responses = responses or {}
+        self.num_requests = 0
+        self.num_quota_throttles = 0
+        self.num_injected_throttles = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def endpoint_url(self) -> AnyStr:
+        return "http://127.0.0.1:{}".format(self.server_address[1])
+
+    def start(self) -> "FakeRekognitionServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def handle_api_request(self, method: AnyStr) -> Tuple[int, Dict]:
+        """Return the HTTP status and JSON body to answer a request to an API method"""
+        with self._lock:
+            self.num_requests += 1
+            inject_throttle = self._random.random() < self.throttling_probability
+            recorded_responses = self.responses.get(method)
+            response = self._random.choice(recorded_responses) if recorded_responses else None
+        if self.quota is not None and not self.quota.try_acquire(method):
+            with self._lock:
+                self.num_quota_throttles += 1
+            return (400, {"__type": "ThrottlingException", "message": "Rate exceeded"})
+        if inject_throttle:
+            with self._lock:
+                self.num_injected_throttles += 1
+            return (400, {"__type": "ThrottlingException", "message": "Injected throttling"})
+        sleep(self.latency_model.sample())
+        if response is None:
+            response = SYNTHETIC_RESPONSES.get(method)
+        if response is None:
+            return (400, {"__type": "InvalidParameterException", "message": "Unsupported method: " + method})
+        return (200, response)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "num_requests": self.num_requests,
+                "num_quota_throttles": self.num_quota_throttles,
+                "num_injected_throttles": self.num_injected_throttles,
+            }
+
+
+class FakeRekognitionRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep connections alive, as AWS does
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        method = self.headers.get("X-Amz-Target", "")[len(TARGET_PREFIX) :]
+        (status, body) = self.server.handle_api_request(method)
+        body_bytes = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/x-amz-json-1.1")
+        self.send_header("Content-Length", str(len(body_bytes)))
+        self.send_header("x-amzn-RequestId", str(uuid.uuid4()))
+        self.end_headers()
+        self.wfile.write(body_bytes)
+
+    def log_message(self, format, *args):
+        pass  # one line per request would flood the load test output
+
+
+def load_recorded_responses(path: AnyStr) -> Dict[AnyStr, List[Dict]]:
+    """
+    Load API responses to replay from a JSON Lines file, with one object per line with keys:
+    - 'method': API method name, e.g. 'DetectLabels'
+    - 'response': API response as returned by the real API
+    """
+    responses = {}
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip() != "":
+                record = json.loads(line)
+                responses.setdefault(record["method"], []).append(record["response"])
+    return responses
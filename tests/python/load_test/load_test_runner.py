@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+"""
+Script to load test the API calling code of the plugin against a local fake Amazon Rekognition API.
+Drives `call_api_generic` through `api_parallelizer_streaming` as the recipes do, and reports the achieved
+transactions per second, error rates and tail latency, to tune quota, concurrency and retry settings offline.
+Run it with the python-lib folder in PYTHONPATH, e.g. `python tests/python/load_test/load_test_runner.py --help`.
+The stub of the Dataiku API used by tests is installed if the real one is not available.
+"""
+
+import os
+import sys
+import argparse
+import json
+import logging
+from io import BytesIO
+from contextlib import contextmanager
+from time import monotonic
+from typing import AnyStr, Dict, Tuple
+
+import boto3
+import pandas as pd
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from conftest import install_dataiku_stub  # noqa: E402
+
+install_dataiku_stub()
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, build_unique_column_names  # noqa: E402
+from api_parallelizer import api_parallelizer_streaming, ExecutionEngineEnum  # noqa: E402
+from api_rate_limiter import TokenBucketRateLimiter  # noqa: E402
+from plugin_metrics import PipelineMetrics  # noqa: E402
+from amazon_rekognition_api_client import (  # noqa: E402
+    API_EXCEPTIONS,
+    RetryModeEnum,
+    call_api_generic,
+    get_client_config,
+    get_connection_stats,
+    is_throttling_exception,
+    get_retry_attempts,
+)
+from fake_rekognition_server import (  # noqa: E402
+    FakeRekognitionServer,
+    LatencyModel,
+    LatencyDistributionEnum,
+    load_recorded_responses,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+API_CLIENT_METHOD_NAMES = ["detect_labels", "detect_text", "detect_moderation_labels"]
+COLUMN_PREFIX = "load_test_api"
+IMAGE_SIZE = (640, 480)
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class InMemoryImageFolder:
+    """Folder with the download method of `dataiku.Folder`, serving the same synthetic image on every path"""
+
+    def __init__(self, image_size: Tuple[int, int] = IMAGE_SIZE):
+        image_bytes = BytesIO()
+        Image.effect_noise(image_size, 64).convert("RGB").save(image_bytes, format="JPEG")
+        self.image_bytes = image_bytes.getvalue()
+
+    @contextmanager
+    def get_download_stream(self, path: AnyStr):
+        yield BytesIO(self.image_bytes)
+
+
+def run_load_test(
+    server: FakeRekognitionServer,
+    api_client_method_name: AnyStr = "detect_labels",
+    num_images: int = 1000,
+    parallel_workers: int = 4,
+    api_quota_rate_limit: int = None,
+    api_quota_period: int = 1,
+    adaptive_concurrency: bool = False,
+    retry_mode: RetryModeEnum = RetryModeEnum.ADAPTIVE,
+    execution_engine: ExecutionEngineEnum = ExecutionEngineEnum.THREADS,
+) -> Dict:
+    """Call the fake API on synthetic images as the recipes do, and return a summary of the load test"""
+    if adaptive_concurrency and retry_mode == RetryModeEnum.ADAPTIVE:
+        # As in the plugin: client-side rate limiting of adaptive retries would absorb the throttling errors
+        logging.warning("Using standard retry mode instead of adaptive, as adaptive concurrency is enabled")
+        retry_mode = RetryModeEnum.STANDARD
+    api_client = boto3.client(
+        "rekognition",
+        region_name="us-east-1",
+        aws_access_key_id="fake",
+        aws_secret_access_key="fake",
+        endpoint_url=server.endpoint_url,
+        config=get_client_config(max_pool_connections=parallel_workers, retry_mode=retry_mode),
+    )
+    rate_limiter = None
+    if api_quota_rate_limit:
+        rate_limiter = TokenBucketRateLimiter(rate_limit=api_quota_rate_limit, period=api_quota_period)
+    metrics = PipelineMetrics()
+    input_folder = InMemoryImageFolder()
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: ["/image_{}.jpg".format(i) for i in range(num_images)]})
+    api_column_names = build_unique_column_names(input_df.keys(), COLUMN_PREFIX)
+
+    def call_fake_api(row: Dict) -> AnyStr:
+        return call_api_generic(
+            row=row,
+            api_client=api_client,
+            api_client_method_name=api_client_method_name,
+            input_folder=input_folder,
+            input_folder_is_s3=False,
+            input_folder_bucket="",
+            input_folder_root_path="",
+            rate_limiter=rate_limiter,
+            metrics=metrics,
+        )
+
+    start = monotonic()
+    df = pd.concat(
+        list(
+            api_parallelizer_streaming(
+                input_df=input_df,
+                api_call_function=call_fake_api,
+                api_exceptions=API_EXCEPTIONS,
+                column_prefix=COLUMN_PREFIX,
+                parallel_workers=parallel_workers,
+                adaptive_concurrency=adaptive_concurrency,
+                throttling_exception_predicate=is_throttling_exception,
+                retry_attempts_function=get_retry_attempts,
+                execution_engine=execution_engine,
+            )
+        )
+    )
+    elapsed_time = monotonic() - start
+    error_messages = df[api_column_names.error_message].fillna("")
+    num_errors = int((error_messages != "").sum())
+    server_stats = server.get_stats()
+    stage_stats = metrics.get_summary(num_images)["stages"]
+    return {
+        "settings": {
+            "api_client_method_name": api_client_method_name,
+            "num_images": num_images,
+            "parallel_workers": parallel_workers,
+            "api_quota_rate_limit": api_quota_rate_limit,
+            "api_quota_period": api_quota_period,
+            "adaptive_concurrency": adaptive_concurrency,
+            "retry_mode": retry_mode.name,
+            "execution_engine": execution_engine.name,
+        },
+        "elapsed_seconds": round(elapsed_time, 3),
+        "achieved_tps": round((num_images - num_errors) / elapsed_time, 3),
+        "server_tps": round(server_stats["num_requests"] / elapsed_time, 3),
+        "error_rate": round(num_errors / max(num_images, 1), 4),
+        "error_messages": error_messages[error_messages != ""].value_counts().to_dict(),
+        "api_call_latency": stage_stats.get("api_call", {}),
+        "rate_limit_wait": stage_stats.get("rate_limit_wait", {}),
+        "server": server_stats,
+        "connections": get_connection_stats(api_client),
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    server_group = parser.add_argument_group("fake API")
+    server_group.add_argument(
+        "--latency-distribution", choices=[e.name for e in LatencyDistributionEnum], default="LOGNORMAL"
+    )
+    server_group.add_argument("--latency-median", type=float, default=0.1, help="in seconds")
+    server_group.add_argument("--latency-sigma", type=float, default=0.5, help="shape of the log-normal distribution")
+    server_group.add_argument("--tps-quota", type=float, default=50, help="transactions per second, 0 to disable")
+    server_group.add_argument("--throttling-probability", type=float, default=0.0)
+    server_group.add_argument("--responses-file", help="JSON Lines file of recorded responses to replay")
+    server_group.add_argument("--seed", type=int, default=None)
+    client_group = parser.add_argument_group("plugin")
+    client_group.add_argument("--method", choices=API_CLIENT_METHOD_NAMES, default="detect_labels")
+    client_group.add_argument("--num-images", type=int, default=1000)
+    client_group.add_argument("--parallel-workers", type=int, default=4)
+    client_group.add_argument("--api-quota-rate-limit", type=int, default=0, help="0 to disable the rate limiter")
+    client_group.add_argument("--api-quota-period", type=int, default=1)
+    client_group.add_argument("--adaptive-concurrency", action="store_true")
+    client_group.add_argument("--retry-mode", choices=[e.name for e in RetryModeEnum], default="ADAPTIVE")
+    client_group.add_argument("--execution-engine", choices=[e.name for e in ExecutionEngineEnum], default="THREADS")
+    parser.add_argument("--output-file", help="JSON file to save the load test summary")
+    return parser.parse_args()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.WARNING, format="Load test | %(levelname)s - %(message)s")
+    args = parse_args()
+    latency_model = LatencyModel(
+        distribution=LatencyDistributionEnum[args.latency_distribution],
+        median=args.latency_median,
+        sigma=args.latency_sigma,
+        seed=args.seed,
+    )
+    server = FakeRekognitionServer(
+        latency_model=latency_model,
+        tps_quota=args.tps_quota,
+        throttling_probability=args.throttling_probability,
+        responses=load_recorded_responses(args.responses_file) if args.responses_file else None,
+        seed=args.seed,
+    ).start()
+    try:
+        summary = run_load_test(
+            server,
+            api_client_method_name=args.method,
+            num_images=args.num_images,
+            parallel_workers=args.parallel_workers,
+            api_quota_rate_limit=args.api_quota_rate_limit,
+            api_quota_period=args.api_quota_period,
+            adaptive_concurrency=args.adaptive_concurrency,
+            retry_mode=RetryModeEnum[args.retry_mode],
+            execution_engine=ExecutionEngineEnum[args.execution_engine],
+        )
+    finally:
+        server.stop()
+    print(json.dumps(summary, indent=4))
+    if args.output_file:
+        with open(args.output_file, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+
+import boto3
+import pytest
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from fake_rekognition_server import (  # noqa
+    FakeRekognitionServer,
+    LatencyModel,
+    LatencyDistributionEnum,
+    SYNTHETIC_RESPONSES,
+    load_recorded_responses,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+IMAGE_BYTES = b"fake image"
+NO_LATENCY_MODEL = LatencyModel(distribution=LatencyDistributionEnum.CONSTANT, median=0.0)
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_fake_client(server: FakeRekognitionServer):
+    return boto3.client(
+        "rekognition",
+        region_name="us-east-1",
+        aws_access_key_id="fake",
+        aws_secret_access_key="fake",
+        endpoint_url=server.endpoint_url,
+        config=Config(retries={"max_attempts": 0}),
+    )
+
+
+def test_synthetic_responses():
+    server = FakeRekognitionServer(latency_model=NO_LATENCY_MODEL).start()
+    try:
+        client = get_fake_client(server)
+        response = client.detect_labels(Image={"Bytes": IMAGE_BYTES})
+        assert response["Labels"] == SYNTHETIC_RESPONSES["DetectLabels"]["Labels"]
+        response = client.detect_text(Image={"Bytes": IMAGE_BYTES})
+        assert response["TextDetections"][0]["DetectedText"] == "STOP"
+        response = client.detect_moderation_labels(Image={"Bytes": IMAGE_BYTES})
+        assert response["ModerationLabels"][0]["Name"] == "Violence"
+        assert server.get_stats()["num_requests"] == 3
+    finally:
+        server.stop()
+
+
+def test_recorded_responses(tmp_path):
+    responses_file = tmp_path / "responses.jsonl"
+    record = {"method": "DetectLabels", "response": {"Labels": [{"Name": "Dog", "Confidence": 90.0}]}}
+    responses_file.write_text(json.dumps(record) + "\n\n", encoding="utf-8")
+    responses = load_recorded_responses(str(responses_file))
+    server = FakeRekognitionServer(latency_model=NO_LATENCY_MODEL, responses=responses).start()
+    try:
+        response = get_fake_client(server).detect_labels(Image={"Bytes": IMAGE_BYTES})
+        assert response["Labels"] == [{"Name": "Dog", "Confidence": 90.0}]
+    finally:
+        server.stop()
+
+
+def test_throttling():
+    server = FakeRekognitionServer(latency_model=NO_LATENCY_MODEL, tps_quota=1).start()
+    try:
+        client = get_fake_client(server)
+        client.detect_labels(Image={"Bytes": IMAGE_BYTES})
+        with pytest.raises(ClientError) as error:
+            client.detect_labels(Image={"Bytes": IMAGE_BYTES})
+        assert error.value.response["Error"]["Code"] == "ThrottlingException"
+        client.detect_text(Image={"Bytes": IMAGE_BYTES})  # quota is per API method
+        assert server.get_stats()["num_quota_throttles"] == 1
+    finally:
+        server.stop()
+    server = FakeRekognitionServer(latency_model=NO_LATENCY_MODEL, throttling_probability=1.0).start()
+    try:
+        with pytest.raises(ClientError) as error:
+            get_fake_client(server).detect_labels(Image={"Bytes": IMAGE_BYTES})
+        assert error.value.response["Error"]["Code"] == "ThrottlingException"
+        assert server.get_stats()["num_injected_throttles"] == 1
+    finally:
+        server.stop()
+
+
+def test_latency_model():
+    latency_model = LatencyModel(distribution=LatencyDistributionEnum.LOGNORMAL, median=0.1, sigma=0.5, seed=42)
+    samples = sorted(latency_model.sample() for _ in range(1001))
+    assert 0.08 < samples[500] < 0.12
+    assert all(sample > 0 for sample in samples)
+    latency_model = LatencyModel(distribution=LatencyDistributionEnum.UNIFORM, median=0.1, seed=42)
+    assert all(0 <= latency_model.sample() <= 0.2 for _ in range(100))
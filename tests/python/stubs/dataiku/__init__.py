@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Stub of the Dataiku API so that modules which import it can be tested outside of DSS:
+- `dataiku.Folder` and `dataiku.Dataset` keep files and dataframes in memory
+- `dataiku.customrecipe` serves a recipe config set by tests and the resource folder of the plugin
+It is a package rather than modules built in memory, so that processes spawned by tests can import it too.
+"""
+
+from io import BytesIO
+from contextlib import contextmanager
+from typing import AnyStr, Dict, List
+
+import pandas as pd
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+DTYPE_KIND_TO_SCHEMA_TYPE = {"b": "boolean", "i": "bigint", "u": "bigint", "f": "double", "M": "date"}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class Folder:
+    """In-memory folder with the methods of `dataiku.Folder` used by the plugin"""
+
+    def __init__(self, name: AnyStr = "folder", files: Dict[AnyStr, bytes] = None):
+        self.name = name
+        self.files = dict(files or {})
+        self.read_partitions = None
+        self.writePartition = None
+
+    def get_info(self) -> Dict:
+        return {"type": "Filesystem", "accessInfo": {}}
+
+    def list_paths_in_partition(self, partition: AnyStr = "") -> List[AnyStr]:
+        return list(self.files.keys())
+
+    def get_path_details(self, path: AnyStr = "/") -> Dict:
+        children = [{"fullPath": p, "directory": False, "size": len(b)} for (p, b) in self.files.items()]
+        return {"fullPath": path, "directory": True, "children": children}
+
+    @contextmanager
+    def get_download_stream(self, path: AnyStr):
+        if path not in self.files:
+            raise OSError("No file on path: {}".format(path))
+        yield BytesIO(self.files[path])
+
+    def upload_stream(self, path: AnyStr, data) -> None:
+        self.files[path] = data if isinstance(data, bytes) else data.read()
+
+    def upload_data(self, path: AnyStr, data: bytes) -> None:
+        self.upload_stream(path, data)
+
+    def delete_path(self, path: AnyStr) -> None:
+        self.files.pop(path, None)
+
+    def clear_partition(self, partition: AnyStr = "") -> None:
+        self.files = {}
+
+
+class DatasetWriter:
+    """Writer of `Dataset`, which checks that dataframes have the columns of the dataset schema"""
+
+    def __init__(self, dataset: "Dataset"):
+        self.dataset = dataset
+        self.closed = False
+
+    def write_dataframe(self, df: pd.DataFrame) -> None:
+        schema_columns = [column["name"] for column in self.dataset.schema]
+        if list(df.columns) != schema_columns:
+            raise ValueError("Columns {} do not match dataset schema {}".format(list(df.columns), schema_columns))
+        self.dataset.chunks.append(df.copy())
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class Dataset:
+    """In-memory dataset with the methods of `dataiku.Dataset` used by the plugin"""
+
+    def __init__(self, name: AnyStr = "dataset", df: pd.DataFrame = None):
+        self.name = name
+        self.schema = None
+        self.chunks = []
+        self.writePartition = None
+        if df is not None:
+            self.write_schema_from_dataframe(df)
+            self.chunks.append(df)
+
+    def get_dataframe(self) -> pd.DataFrame:
+        columns = [column["name"] for column in self.schema or []]
+        if len(self.chunks) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(self.chunks, ignore_index=True)
+
+    def iter_dataframes(self, chunksize: int = 10000):
+        df = self.get_dataframe()
+        for start in range(0, len(df.index), chunksize):
+            yield df.iloc[start : start + chunksize]
+
+    def read_schema(self) -> List[Dict]:
+        return [dict(column) for column in self.schema or []]
+
+    def write_schema(self, schema: List[Dict]) -> None:
+        self.schema = [dict(column) for column in schema]
+
+    def write_schema_from_dataframe(self, df: pd.DataFrame) -> None:
+        self.write_schema(
+            [
+                {"name": column, "type": DTYPE_KIND_TO_SCHEMA_TYPE.get(dtype.kind, "string")}
+                for (column, dtype) in df.dtypes.items()
+            ]
+        )
+
+    def get_writer(self) -> DatasetWriter:
+        self.chunks = []
+        return DatasetWriter(self)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Stub of `dataiku.customrecipe`, serving a recipe config and roles set by tests and the resource folder"""
+
+import os
+from typing import AnyStr, Dict, List
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+PLUGIN_ROOT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "..", ".."))
+PLUGIN_RESOURCE_PATH = os.path.join(PLUGIN_ROOT_PATH, "resource")
+
+recipe_config = {}  # type: Dict
+recipe_roles = {}  # type: Dict[AnyStr, List[AnyStr]]
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_recipe_config() -> Dict:
+    return recipe_config
+
+
+def get_recipe_resource() -> AnyStr:
+    return PLUGIN_RESOURCE_PATH
+
+
+def get_input_names_for_role(role: AnyStr) -> List[AnyStr]:
+    return recipe_roles.get(role, [])
+
+
+def get_output_names_for_role(role: AnyStr) -> List[AnyStr]:
+    return recipe_roles.get(role, [])
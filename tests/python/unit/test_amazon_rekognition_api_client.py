@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+import threading
+from io import BytesIO
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import dataiku
+import pandas as pd
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+from PIL import Image
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, JSONResponse
+from api_response_cache import APIResponseCache
+from plugin_image_utils import EXIF_ORIENTATION_TAG, OrientationEstimationEnum, ImageOrientationEstimator
+from amazon_rekognition_api_formatting import TextDetectionAPIFormatter
+from amazon_rekognition_api_client import (
+    compute_image_fingerprint,
+    call_api_generic,
+    call_api_multi,
+    get_retry_attempts,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+BUCKET = "images-bucket"
+ROOT_PATH = "dataset/images"
+IMAGE_PATH = "/cat.jpg"
+ETAG = '"9b2cf535f27731c974343645a3985328"'
+RAW_IMAGE_SIZE = (120, 80)  # stored in landscape with EXIF orientation 6, so upright images are in portrait
+RAW_BLOCK_BOX = (0, 0, 30, 20)  # green block in the top-left corner of stored pixels, top-right once upright
+UPRIGHT_BLOCK_BOX = (60, 0, 80, 30)
+GREEN = (0, 255, 0)
+LABELS_RESPONSE = {"Labels": [{"Name": "Cat", "Confidence": 98.5, "Instances": [], "Parents": []}]}
+MULTI_ANALYSIS_RESPONSES = {
+    "detect_labels": LABELS_RESPONSE,
+    "detect_text": {"TextDetections": []},
+    "detect_moderation_labels": {"ModerationLabels": []},
+}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def get_fake_client(service_name: str):
+    return boto3.client(service_name, region_name="us-east-1", aws_access_key_id="fake", aws_secret_access_key="fake")
+
+
+def test_compute_image_fingerprint_s3_object():
+    s3_client = get_fake_client("s3")
+    image_request = {"S3Object": {"Bucket": BUCKET, "Name": ROOT_PATH + IMAGE_PATH}}
+    with Stubber(s3_client) as s3_stubber:
+        s3_stubber.add_response("head_object", {"ETag": ETAG}, {"Bucket": BUCKET, "Key": ROOT_PATH + IMAGE_PATH})
+        fingerprint = compute_image_fingerprint(IMAGE_PATH, image_request, None, dataiku.Folder(), s3_client)
+        s3_stubber.assert_no_pending_responses()
+    assert fingerprint == "s3_etag:" + ETAG
+
+
+def test_call_api_generic_s3_response_cache(tmp_path):
+    (api_client, s3_client) = (get_fake_client("rekognition"), get_fake_client("s3"))
+    response_cache = APIResponseCache(str(tmp_path))
+    image_request = {"S3Object": {"Bucket": BUCKET, "Name": ROOT_PATH + IMAGE_PATH}}
+    call_kwargs = {
+        "row": {IMAGE_PATH_COLUMN: IMAGE_PATH},
+        "api_client": api_client,
+        "api_client_method_name": "detect_labels",
+        "input_folder": dataiku.Folder(),
+        "input_folder_is_s3": True,
+        "input_folder_bucket": BUCKET,
+        "input_folder_root_path": ROOT_PATH,
+        "num_objects": 10,
+        "response_cache": response_cache,
+        "s3_client": s3_client,
+    }
+    with Stubber(api_client) as api_stubber, Stubber(s3_client) as s3_stubber:
+        for _ in range(2):
+            s3_stubber.add_response("head_object", {"ETag": ETAG}, {"Bucket": BUCKET, "Key": ROOT_PATH + IMAGE_PATH})
+        api_stubber.add_response("detect_labels", LABELS_RESPONSE, {"Image": image_request, "MaxLabels": 10})
+        responses = [call_api_generic(**call_kwargs) for _ in range(2)]  # second call is served by the cache
+        api_stubber.assert_no_pending_responses()
+        s3_stubber.assert_no_pending_responses()
+    assert [json.loads(response)["Labels"] for response in responses] == [LABELS_RESPONSE["Labels"]] * 2
+    assert response_cache.get_stats()["hits"] == 1
+    response_cache.close()
+
+
+def test_get_retry_attempts():
+    retried_response = {**LABELS_RESPONSE, "ResponseMetadata": {"RetryAttempts": 2}}
+    assert get_retry_attempts(JSONResponse.from_decoded(retried_response)) == 2
+    assert get_retry_attempts(JSONResponse.from_decoded({"detect_labels": retried_response, "detect_text": {}})) == 2
+    assert get_retry_attempts(json.dumps(retried_response)) == 0  # no decoded response to read metadata from
+
+
+def open_rgb_image(image_bytes: bytes) -> Image.Image:
+    return Image.open(BytesIO(image_bytes)).convert("RGB")
+
+
+class FakeTextDetectionClient:
+    """API client which detects the green block of images sent to it, and estimates orientation as the API does"""
+
+    def __init__(self):
+        self.requests = []
+
+    def detect_text(self, Image: dict) -> dict:
+        self.requests.append(Image)
+        image = open_rgb_image(Image["Bytes"])
+        green_pixels = [
+            (x, y)
+            for x in range(image.size[0])
+            for y in range(image.size[1])
+            if sum(abs(a - b) for (a, b) in zip(image.getpixel((x, y)), GREEN)) < 100
+        ]
+        (left, top) = (min(p[0] for p in green_pixels), min(p[1] for p in green_pixels))
+        (right, bottom) = (max(p[0] for p in green_pixels) + 1, max(p[1] for p in green_pixels) + 1)
+        bounding_box = {
+            "Left": left / image.size[0],
+            "Top": top / image.size[1],
+            "Width": (right - left) / image.size[0],
+            "Height": (bottom - top) / image.size[1],
+        }
+        text_detection = {"DetectedText": "block", "Type": "LINE", "Id": 0, "Confidence": 99.0}
+        return {"TextDetections": [{**text_detection, "Geometry": {"BoundingBox": bounding_box}}]}
+
+    def recognize_celebrities(self, Image: dict) -> dict:
+        return {"CelebrityFaces": [], "OrientationCorrection": "ROTATE_90"}
+
+
+def generate_exif_rotated_image_bytes() -> bytes:
+    image = Image.new("RGB", RAW_IMAGE_SIZE, color=(255, 255, 255))
+    image.paste(GREEN, RAW_BLOCK_BOX)
+    exif = Image.Exif()
+    exif[EXIF_ORIENTATION_TAG] = 6
+    image_bytes = BytesIO()
+    image.save(image_bytes, format="JPEG", quality=100, exif=exif.tobytes())
+    return image_bytes.getvalue()
+
+
+@pytest.mark.parametrize("orientation_estimation", [OrientationEstimationEnum.EXIF, OrientationEstimationEnum.API])
+def test_orientation_correction_exif_rotated_image(orientation_estimation):
+    image_bytes = generate_exif_rotated_image_bytes()
+    api_client = FakeTextDetectionClient()
+    response = call_api_generic(
+        row={IMAGE_PATH_COLUMN: "/rotated.jpg"},
+        api_client=api_client,
+        api_client_method_name="detect_text",
+        input_folder=dataiku.Folder("input", {"/rotated.jpg": image_bytes}),
+        input_folder_is_s3=False,
+        input_folder_bucket="",
+        input_folder_root_path="",
+        orientation_correction=True,
+        orientation_estimator=ImageOrientationEstimator(orientation_estimation),
+    )
+    sent_image = Image.open(BytesIO(api_client.requests[0]["Bytes"]))
+    assert sent_image.size == RAW_IMAGE_SIZE[::-1]
+    assert sent_image.getexif().get(EXIF_ORIENTATION_TAG) in {None, 1}  # not rotated a second time by the API
+    expected_orientation = "ROTATE_90" if orientation_estimation == OrientationEstimationEnum.API else None
+    assert response.decoded.get("OrientationCorrection") == expected_orientation  # only orientations from the API
+    api_formatter = TextDetectionAPIFormatter(input_df=pd.DataFrame({IMAGE_PATH_COLUMN: []}))
+    rendered_image_bytes = api_formatter.render_image_bytes(image_bytes, "/rotated.jpg", response.decoded)
+    rendered_image = open_rgb_image(rendered_image_bytes)
+    assert rendered_image.size == RAW_IMAGE_SIZE[::-1]
+    assert Image.open(BytesIO(rendered_image_bytes)).getexif().get(EXIF_ORIENTATION_TAG) in {None, 1}
+    (left, top, right, bottom) = UPRIGHT_BLOCK_BOX
+    red_pixel = rendered_image.getpixel((left, (top + bottom) // 2))  # left edge of the bounding box
+    assert red_pixel[0] > 200 and red_pixel[1] < 60 and red_pixel[2] < 60
+    green_pixel = rendered_image.getpixel(((left + right) // 2, (top + bottom) // 2))
+    assert green_pixel[1] > 200 and green_pixel[0] < 60
+
+
+class CountingFolder(dataiku.Folder):
+    """Folder which counts downloads of each file"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.num_downloads = Counter()
+
+    def get_download_stream(self, path):
+        self.num_downloads[path] += 1
+        return super().get_download_stream(path)
+
+
+class FakeMultiAnalysisClient:
+    """API client which records the images sent to each method, and fails on the methods given"""
+
+    def __init__(self, failing_method_names=()):
+        self.failing_method_names = set(failing_method_names)
+        self.requests = {name: [] for name in MULTI_ANALYSIS_RESPONSES}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name not in MULTI_ANALYSIS_RESPONSES:
+            raise AttributeError(name)
+
+        def api_client_method(Image, **kwargs):
+            with self._lock:
+                self.requests[name].append(Image["Bytes"])
+            if name in self.failing_method_names:
+                raise ClientError({"Error": {"Code": "InternalServerError", "Message": "Failed"}}, name)
+            return MULTI_ANALYSIS_RESPONSES[name]
+
+        return api_client_method
+
+
+def call_api_multi_analysis(api_client, input_folder, response_cache=None, executor=None):
+    return call_api_multi(
+        row={IMAGE_PATH_COLUMN: IMAGE_PATH},
+        api_client=api_client,
+        api_client_method_kwargs={name: {} for name in MULTI_ANALYSIS_RESPONSES},
+        input_folder=input_folder,
+        input_folder_is_s3=False,
+        input_folder_bucket="",
+        input_folder_root_path="",
+        response_cache=response_cache,
+        executor=executor,
+    )
+
+
+def test_call_api_multi_downloads_image_once():
+    input_folder = CountingFolder("input", {IMAGE_PATH: generate_exif_rotated_image_bytes()})
+    api_client = FakeMultiAnalysisClient()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        response = call_api_multi_analysis(api_client, input_folder, executor=executor)
+    assert input_folder.num_downloads[IMAGE_PATH] == 1
+    assert all(api_client.requests[name] == [input_folder.files[IMAGE_PATH]] for name in MULTI_ANALYSIS_RESPONSES)
+    assert json.loads(response) == MULTI_ANALYSIS_RESPONSES
+    assert not response.from_cache
+
+
+def test_call_api_multi_one_analysis_fails(tmp_path):
+    input_folder = dataiku.Folder("input", {IMAGE_PATH: generate_exif_rotated_image_bytes()})
+    response_cache = APIResponseCache(str(tmp_path))
+    api_client = FakeMultiAnalysisClient(failing_method_names=["detect_text"])
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with pytest.raises(ClientError):
+            call_api_multi_analysis(api_client, input_folder, response_cache, executor)
+        api_client.failing_method_names = set()
+        response = call_api_multi_analysis(api_client, input_folder, response_cache, executor)
+    assert {name: len(requests) for (name, requests) in api_client.requests.items()} == {
+        "detect_labels": 1,
+        "detect_text": 2,
+        "detect_moderation_labels": 1,
+    }  # the row is retried with the responses of the analyses which succeeded
+    assert json.loads(response) == MULTI_ANALYSIS_RESPONSES
+    assert response_cache.get_stats()["hits"] == 2
+    response_cache.close()
+
+
+def test_call_api_multi_shares_cache_with_call_api_generic(tmp_path):
+    input_folder = dataiku.Folder("input", {IMAGE_PATH: generate_exif_rotated_image_bytes()})
+    response_cache = APIResponseCache(str(tmp_path))
+    call_api_generic(
+        row={IMAGE_PATH_COLUMN: IMAGE_PATH},
+        api_client=FakeMultiAnalysisClient(),
+        api_client_method_name="detect_labels",
+        input_folder=input_folder,
+        input_folder_is_s3=False,
+        input_folder_bucket="",
+        input_folder_root_path="",
+        num_objects=10,
+        minimum_score=0,  # not sent to the API, as when the multi-analysis recipe has no minimum score
+        response_cache=response_cache,
+    )
+    api_client = FakeMultiAnalysisClient()
+    response = call_api_multi(
+        row={IMAGE_PATH_COLUMN: IMAGE_PATH},
+        api_client=api_client,
+        api_client_method_kwargs={"detect_labels": {"MaxLabels": 10}},
+        input_folder=input_folder,
+        input_folder_is_s3=False,
+        input_folder_bucket="",
+        input_folder_root_path="",
+        response_cache=response_cache,
+    )
+    assert api_client.requests["detect_labels"] == []
+    assert json.loads(response) == {"detect_labels": LABELS_RESPONSE}
+    assert response.from_cache
+    response_cache.close()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+from typing import Dict, List
+
+import pandas as pd
+import pytest
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, generate_unique, safe_json_loads, move_api_columns_to_end
+from amazon_rekognition_api_formatting import (
+    OutputFormatEnum,
+    UnsafeContentCategoryLevelEnum,
+    UnsafeContentCategoryTopLevelEnum,
+    UnsafeContentCategorySecondLevelEnum,
+    GenericAPIFormatter,
+    ObjectDetectionLabelingAPIFormatter,
+    TextDetectionAPIFormatter,
+    UnsafeContentAPIFormatter,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+LABELS_RESPONSE = {
+    "Labels": [
+        {"Name": "Pet", "Confidence": 90.0, "Instances": []},
+        {"Name": "Cat", "Confidence": 98.5, "Instances": [{"BoundingBox": {}, "Confidence": 97.0}]},
+        {"Name": "Animal", "Confidence": 95.0, "Instances": []},
+        {"Name": "Mammal", "Confidence": 92.0, "Instances": []},
+    ],
+    "OrientationCorrection": "ROTATE_0",
+}
+TEXT_RESPONSE = {
+    "TextDetections": [
+        {"DetectedText": "hello world", "Type": "LINE", "Id": 0, "Confidence": 99.0},
+        {"DetectedText": "hello", "Type": "WORD", "Id": 1, "ParentId": 0, "Confidence": 99.0},
+        {"DetectedText": "blurry", "Type": "LINE", "Id": 2, "Confidence": 20.0},
+        {"DetectedText": "exit", "Type": "LINE", "Id": 3, "Confidence": 85.0},
+    ],
+    "OrientationCorrection": "ROTATE_90",
+}
+MODERATION_RESPONSE = {
+    "ModerationLabels": [
+        {"Name": "Weapon Violence", "ParentName": "Violence", "Confidence": 80.0},
+        {"Name": "Graphic Violence Or Gore", "ParentName": "Violence", "Confidence": 70.0},
+        {"Name": "Suggestive", "ParentName": "", "Confidence": 60.0},
+        {"Name": "Revealing Clothes", "ParentName": "Suggestive", "Confidence": 60.0},
+    ]
+}
+FORMATTER_CASES = {
+    "object_detection": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(input_df=df, num_objects=3),
+        LABELS_RESPONSE,
+        {"Labels": []},
+    ),
+    "object_detection_without_orientation": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(input_df=df, num_objects=10, orientation_correction=False),
+        LABELS_RESPONSE,
+        {"Labels": []},
+    ),
+    "text_detection": (
+        lambda df: TextDetectionAPIFormatter(input_df=df, minimum_score=50),
+        TEXT_RESPONSE,
+        {"TextDetections": []},
+    ),
+    "unsafe_content_top_level": (
+        lambda df: UnsafeContentAPIFormatter(
+            input_df=df, content_categories_top_level=list(UnsafeContentCategoryTopLevelEnum)
+        ),
+        MODERATION_RESPONSE,
+        {"ModerationLabels": []},
+    ),
+    "unsafe_content_second_level": (
+        lambda df: UnsafeContentAPIFormatter(
+            input_df=df,
+            category_level=UnsafeContentCategoryLevelEnum.SECOND,
+            content_categories_second_level=list(UnsafeContentCategorySecondLevelEnum),
+        ),
+        MODERATION_RESPONSE,
+        {"ModerationLabels": []},
+    ),
+}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def format_row_object_detection(api_formatter: ObjectDetectionLabelingAPIFormatter, row: Dict) -> Dict:
+    response = safe_json_loads(row[api_formatter.api_column_names.response], api_formatter.error_handling)
+    row[api_formatter.label_list_column] = ""
+    labels = sorted(response.get("Labels", []), key=lambda x: x.get("Confidence"), reverse=True)
+    if len(labels) != 0:
+        row[api_formatter.label_list_column] = [l.get("Name") for l in labels]
+    for n in range(api_formatter.num_objects):
+        if len(labels) > n:
+            row[api_formatter.label_name_columns[n]] = labels[n].get("Name", "")
+            row[api_formatter.label_score_columns[n]] = labels[n].get("Confidence", "")
+        else:
+            row[api_formatter.label_name_columns[n]] = ""
+            row[api_formatter.label_score_columns[n]] = None
+    if api_formatter.orientation_correction:
+        row[api_formatter.orientation_column] = response.get("OrientationCorrection", "")
+    return row
+
+
+def format_row_text_detection(api_formatter: TextDetectionAPIFormatter, row: Dict) -> Dict:
+    response = safe_json_loads(row[api_formatter.api_column_names.response], api_formatter.error_handling)
+    text_detections_filtered = [
+        t
+        for t in response.get("TextDetections", [])
+        if t.get("Confidence") >= api_formatter.minimum_score and t.get("ParentId") is None
+    ]
+    row[api_formatter.text_column_list] = ""
+    row[api_formatter.text_column_concat] = ""
+    if len(text_detections_filtered) != 0:
+        row[api_formatter.text_column_list] = [t.get("DetectedText", "") for t in text_detections_filtered]
+        row[api_formatter.text_column_concat] = " ".join(row[api_formatter.text_column_list])
+    if api_formatter.orientation_correction:
+        row[api_formatter.orientation_column] = response.get("OrientationCorrection", "")
+    return row
+
+
+def format_row_unsafe_content(api_formatter: UnsafeContentAPIFormatter, row: Dict) -> Dict:
+    response = safe_json_loads(row[api_formatter.api_column_names.response], api_formatter.error_handling)
+    moderation_labels = response.get("ModerationLabels", [])
+    row[api_formatter.is_unsafe_column] = False
+    row[api_formatter.unsafe_list_column] = ""
+    unsafe_list = []
+    for category in api_formatter.content_categories:
+        confidence_column = generate_unique(
+            category.name.lower() + "_score", api_formatter.input_df.keys(), api_formatter.column_prefix
+        )
+        row[confidence_column] = ""
+        label_key = "ParentName" if api_formatter.category_level == UnsafeContentCategoryLevelEnum.TOP else "Name"
+        scores = [l.get("Confidence") for l in moderation_labels if l.get(label_key, "") == category.value]
+        if len(scores) != 0:
+            unsafe_list.append(str(category.value))
+            row[confidence_column] = scores[0]
+    if len(unsafe_list) != 0:
+        row[api_formatter.is_unsafe_column] = True
+        row[api_formatter.unsafe_list_column] = unsafe_list
+    return row
+
+
+def format_df_row_wise(api_formatter: GenericAPIFormatter, df: pd.DataFrame) -> pd.DataFrame:
+    """Reference implementation: the row-wise 'format_df' which the column-wise one replaced"""
+    if isinstance(api_formatter, ObjectDetectionLabelingAPIFormatter):
+        format_row = format_row_object_detection
+    elif isinstance(api_formatter, TextDetectionAPIFormatter):
+        format_row = format_row_text_detection
+    else:
+        format_row = format_row_unsafe_content
+    df = df.apply(func=lambda row: pd.Series(format_row(api_formatter, row.to_dict())), axis=1)
+    return move_api_columns_to_end(df, api_formatter.api_column_names, api_formatter.error_handling)
+
+
+def cast_strings_to_object(df: pd.DataFrame) -> pd.DataFrame:
+    """Compare string columns as objects, whether or not the version of pandas infers a string dtype for them"""
+    return df.astype({column: object for (column, dtype) in df.dtypes.items() if isinstance(dtype, pd.StringDtype)})
+
+
+def generate_input_df(num_rows: int) -> pd.DataFrame:
+    return pd.DataFrame({IMAGE_PATH_COLUMN: ["/image_{}.jpg".format(i) for i in range(num_rows)]})
+
+
+def generate_api_results_df(api_formatter: GenericAPIFormatter, responses: List) -> pd.DataFrame:
+    """Build a dataframe of API results as returned by the API parallelizer, with an error for None responses"""
+    api_column_names = api_formatter.api_column_names
+    return api_formatter.input_df.assign(
+        **{
+            api_column_names.response: [json.dumps(r) if r is not None else "" for r in responses],
+            api_column_names.error_message: ["" if r is not None else "Throttled" for r in responses],
+            api_column_names.error_type: ["" if r is not None else "ThrottlingException" for r in responses],
+        }
+    )
+
+
+@pytest.mark.parametrize("formatter_case", list(FORMATTER_CASES.keys()))
+def test_format_df_parity_with_row_wise_formatting(formatter_case):
+    (build_formatter, response, empty_response) = FORMATTER_CASES[formatter_case]
+    api_formatter = build_formatter(generate_input_df(5))
+    df = generate_api_results_df(api_formatter, [response, None, empty_response, {}, response])
+    output_df = api_formatter.format_df(df.copy())
+    expected_df = format_df_row_wise(build_formatter(generate_input_df(5)), df.copy())
+    if isinstance(api_formatter, ObjectDetectionLabelingAPIFormatter):
+        # Score columns are always float, whereas row-wise ones without any label are object on older pandas
+        assert all(output_df[column].dtype == float for column in api_formatter.label_score_columns)
+        expected_df = expected_df.astype({column: float for column in api_formatter.label_score_columns})
+    pd.testing.assert_frame_equal(cast_strings_to_object(output_df), cast_strings_to_object(expected_df))
+
+
+def test_format_df_truncates_labels_to_num_objects():
+    (build_formatter, response, _) = FORMATTER_CASES["object_detection"]
+    api_formatter = build_formatter(generate_input_df(1))
+    output_df = api_formatter.format_df(generate_api_results_df(api_formatter, [response]))
+    assert [output_df[column][0] for column in api_formatter.label_name_columns] == ["Cat", "Animal", "Mammal"]
+    assert output_df[api_formatter.label_list_column][0] == ["Cat", "Animal", "Mammal", "Pet"]
+    assert generate_unique("label_4_name", [], api_formatter.column_prefix) not in output_df.columns
+
+
+@pytest.mark.parametrize("keep_raw_response", [True, False])
+def test_format_df_long_output_format(keep_raw_response):
+    api_formatter = ObjectDetectionLabelingAPIFormatter(
+        input_df=generate_input_df(4),
+        num_objects=2,
+        output_format=OutputFormatEnum.LONG,
+        keep_raw_response=keep_raw_response,
+    )
+    df = generate_api_results_df(api_formatter, [LABELS_RESPONSE, None, {"Labels": []}, LABELS_RESPONSE])
+    output_df = api_formatter.format_df(df)
+    api_column_names = api_formatter.api_column_names
+    expected_api_columns = [api_column_names.error_message, api_column_names.error_type]
+    if keep_raw_response:
+        expected_api_columns.insert(0, api_column_names.response)
+        expected_responses = df[api_column_names.response][[0, 0, 1, 2, 3, 3]].tolist()
+        assert output_df[api_column_names.response].tolist() == expected_responses
+    assert list(output_df.columns[-len(expected_api_columns) :]) == expected_api_columns
+    assert [column["name"] for column in api_formatter.get_output_schema()] == list(output_df.columns)
+    expected_paths = ["/image_0.jpg", "/image_0.jpg", "/image_1.jpg", "/image_2.jpg", "/image_3.jpg", "/image_3.jpg"]
+    assert output_df[IMAGE_PATH_COLUMN].tolist() == expected_paths
+    assert output_df[api_formatter.label_name_column].tolist() == ["Cat", "Animal", "", "", "Cat", "Animal"]
+    assert output_df[api_formatter.label_score_column].tolist()[:2] == [98.5, 95.0]
+    assert output_df[api_formatter.instance_score_column].tolist()[0] == 97.0
+    assert output_df[api_column_names.error_type].tolist()[1:4] == ["", "ThrottlingException", ""]
+    empty_rows_df = output_df.iloc[[1, 2, 3]]  # label without instance, API error and image without labels
+    assert empty_rows_df[api_formatter.instance_score_column].isna().all()
+    assert empty_rows_df[api_formatter.bbox_columns["Left"]].isna().all()
+    assert output_df.iloc[[2, 3]][api_formatter.label_score_column].isna().all()
+    score_columns = [api_formatter.label_score_column, api_formatter.instance_score_column]
+    assert all(output_df[column].dtype == float for column in score_columns + list(api_formatter.bbox_columns.values()))
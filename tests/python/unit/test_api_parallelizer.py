@@ -4,13 +4,26 @@
 # see https://docs.pytest.org for more information
 
 import json
+import asyncio
+import math
+import random
+import threading
+from time import sleep
 from typing import AnyStr, Dict
 from enum import Enum
 
 import pandas as pd
+import pytest
 from boto3.exceptions import Boto3Error
 
-from api_parallelizer import api_parallelizer  # noqa
+from api_parallelizer import (  # noqa
+    api_parallelizer,
+    api_parallelizer_streaming,
+    convert_api_results_to_df,
+    AdaptiveConcurrencyController,
+    ExecutionEngineEnum,
+)
+from plugin_io_utils import JSONResponse, build_unique_column_names  # noqa
 
 
 # ==============================================================================
@@ -60,6 +73,11 @@ def call_mock_api(row: Dict, api_function_param: int = 42) -> AnyStr:
     return json.dumps(response)
 
 
+async def call_mock_api_async(row: Dict, api_function_param: int = 42) -> AnyStr:
+    await asyncio.sleep(0.001)
+    return call_mock_api(row, api_function_param)
+
+
 def test_api_success():
     input_df = pd.DataFrame({INPUT_COLUMN: [APICaseEnum.SUCCESS]})
     df = api_parallelizer(
@@ -95,3 +113,210 @@ def test_invalid_input():
     expected_dictionary = APICaseEnum.INVALID_INPUT.value
     for k in expected_dictionary:
         assert output_dictionary[k] == expected_dictionary[k]
+
+
+def test_api_streaming_chunks():
+    input_df = pd.DataFrame({INPUT_COLUMN: [APICaseEnum.SUCCESS] * 7 + [APICaseEnum.API_FAILURE] * 3})
+    df_list = list(
+        api_parallelizer_streaming(
+            input_df=input_df,
+            api_call_function=call_mock_api,
+            api_exceptions=API_EXCEPTIONS,
+            column_prefix=COLUMN_PREFIX,
+            chunk_size=4,
+            max_pending_tasks=3,
+        )
+    )
+    assert [len(df.index) for df in df_list] == [4, 4, 2]
+    df = pd.concat(df_list, ignore_index=True)
+    assert sum(df["test_api_response"] == APICaseEnum.SUCCESS.value["test_api_response"]) == 7
+    assert sum(df["test_api_error_type"] == APICaseEnum.API_FAILURE.value["test_api_error_type"]) == 3
+
+
+def test_adaptive_concurrency_aimd():
+    controller = AdaptiveConcurrencyController(max_concurrency=6, initial_concurrency=2)
+    for _ in range(2 + 3 + 4 + 5 + 6):
+        controller.on_success(latency=0.1)
+    assert controller.concurrency == 6  # additive increase capped at max_concurrency
+    controller.on_throttle()
+    assert controller.concurrency == 3  # multiplicative decrease
+    controller.on_throttle()
+    assert controller.concurrency == 3  # at most one decrease per smoothed latency period
+    assert controller.num_throttles == 2
+
+
+def test_adaptive_concurrency_sustained_latency_rise():
+    controller = AdaptiveConcurrencyController(max_concurrency=8, initial_concurrency=8)
+    for _ in range(100):
+        controller.on_success(latency=0.1)
+    for _ in range(10):
+        controller.on_success(latency=1.0)
+        for _ in range(9):
+            controller.on_success(latency=0.1)
+    assert controller.concurrency == 8  # isolated slow calls are not a sustained rise
+    for _ in range(20):
+        controller.on_success(latency=0.5)
+    assert controller.concurrency < 8
+
+
+def test_adaptive_concurrency_noisy_latency_without_throttles():
+    controller = AdaptiveConcurrencyController(max_concurrency=16, initial_concurrency=2)
+    random_generator = random.Random(42)
+    for _ in range(5000):
+        controller.on_success(latency=random_generator.lognormvariate(mu=math.log(0.1), sigma=1.0))
+    assert controller.peak_concurrency == 16
+    assert controller.concurrency >= 14
+
+
+def test_adaptive_concurrency_cache_hits_and_retries():
+    controller = AdaptiveConcurrencyController(max_concurrency=8, initial_concurrency=8)
+    responses = {
+        "cached": JSONResponse("{}", from_cache=True),
+        "retried": JSONResponse.from_decoded({"ResponseMetadata": {"RetryAttempts": 2}}),
+        "direct": JSONResponse.from_decoded({"ResponseMetadata": {"RetryAttempts": 0}}),
+    }
+    api_call_function = controller.wrap(
+        lambda row: responses[row["case"]],
+        retry_attempts_function=lambda response: response.decoded["ResponseMetadata"]["RetryAttempts"],
+    )
+    for _ in range(10):
+        api_call_function(row={"case": "cached"})
+    assert (controller.num_cache_hits, controller.smoothed_latency) == (10, None)
+    api_call_function(row={"case": "direct"})
+    assert controller.smoothed_latency is not None
+    api_call_function(row={"case": "retried"})
+    assert (controller.num_retried, controller.num_successes, controller.concurrency) == (1, 2, 4)
+
+
+def test_adaptive_concurrency_streaming():
+    input_df = pd.DataFrame({INPUT_COLUMN: [APICaseEnum.SUCCESS] * 20 + [APICaseEnum.API_FAILURE] * 5})
+    df = pd.concat(
+        api_parallelizer_streaming(
+            input_df=input_df,
+            api_call_function=call_mock_api,
+            api_exceptions=API_EXCEPTIONS,
+            column_prefix=COLUMN_PREFIX,
+            parallel_workers=8,
+            adaptive_concurrency=True,
+            throttling_exception_predicate=lambda e: isinstance(e, Boto3Error),
+        ),
+        ignore_index=True,
+    )
+    assert len(df.index) == 25
+    assert sum(df["test_api_error_type"] == APICaseEnum.API_FAILURE.value["test_api_error_type"]) == 5
+
+
+def test_asyncio_engine():
+    input_df = pd.DataFrame({INPUT_COLUMN: [APICaseEnum.SUCCESS] * 30 + [APICaseEnum.API_FAILURE] * 10})
+    for api_call_function in [call_mock_api, call_mock_api_async]:
+        df = pd.concat(
+            api_parallelizer_streaming(
+                input_df=input_df,
+                api_call_function=api_call_function,
+                api_exceptions=API_EXCEPTIONS,
+                column_prefix=COLUMN_PREFIX,
+                chunk_size=16,
+                parallel_workers=50,
+                execution_engine=ExecutionEngineEnum.ASYNCIO,
+            ),
+            ignore_index=True,
+        )
+        assert len(df.index) == 40
+        assert sum(df["test_api_response"] == APICaseEnum.SUCCESS.value["test_api_response"]) == 30
+        assert sum(df["test_api_error_type"] == APICaseEnum.API_FAILURE.value["test_api_error_type"]) == 10
+
+
+def test_asyncio_engine_consumer_stops_early():
+    input_df = pd.DataFrame({INPUT_COLUMN: [APICaseEnum.SUCCESS] * 200})
+    num_threads_before = threading.active_count()
+    df_iterator = api_parallelizer_streaming(
+        input_df=input_df,
+        api_call_function=lambda row: sleep(0.005) or call_mock_api(row),
+        api_exceptions=API_EXCEPTIONS,
+        column_prefix=COLUMN_PREFIX,
+        chunk_size=1,
+        parallel_workers=4,
+        max_pending_tasks=2,
+        execution_engine=ExecutionEngineEnum.ASYNCIO,
+    )
+    assert len(next(df_iterator).index) == 1
+    df_iterator.close()  # the event loop thread must not stay blocked on the full result queue
+    assert threading.active_count() == num_threads_before
+
+
+@pytest.mark.parametrize("execution_engine", list(ExecutionEngineEnum), ids=lambda x: x.name.lower())
+def test_slow_row_bounds_buffered_results(execution_engine):
+    (chunk_size, max_pending_tasks) = (4, 3)
+    input_df = pd.DataFrame({"position": range(100)})
+    started_positions = []
+    num_started_when_slow_row_done = []
+
+    def call_mock_api_slow_first_row(row: Dict) -> AnyStr:
+        started_positions.append(row["position"])
+        if row["position"] == 0:
+            sleep(0.3)
+            num_started_when_slow_row_done.append(len(started_positions))
+        return json.dumps({"result": row["position"]})
+
+    df = pd.concat(
+        api_parallelizer_streaming(
+            input_df=input_df,
+            api_call_function=call_mock_api_slow_first_row,
+            api_exceptions=API_EXCEPTIONS,
+            column_prefix=COLUMN_PREFIX,
+            chunk_size=chunk_size,
+            parallel_workers=max_pending_tasks,
+            max_pending_tasks=max_pending_tasks,
+            execution_engine=execution_engine,
+        ),
+        ignore_index=True,
+    )
+    # Rows after the first chunk wait for the slow row, instead of buffering results of all other rows
+    assert num_started_when_slow_row_done[0] <= chunk_size + max_pending_tasks
+    assert df["test_api_response"].tolist() == [json.dumps({"result": i}) for i in range(100)]
+
+
+def call_mock_api_random_latency(row: Dict) -> AnyStr:
+    sleep(random.uniform(0, 0.005))
+    return json.dumps({"result": row["position"]})
+
+
+def test_output_keeps_input_order():
+    input_df = pd.DataFrame({"position": list(range(100)), "value": [i / 2 for i in range(100)]})
+    for execution_engine in ExecutionEngineEnum:
+        df_list = list(
+            api_parallelizer_streaming(
+                input_df=input_df,
+                api_call_function=call_mock_api_random_latency,
+                api_exceptions=API_EXCEPTIONS,
+                column_prefix=COLUMN_PREFIX,
+                chunk_size=16,
+                parallel_workers=8,
+                execution_engine=execution_engine,
+            )
+        )
+        assert [len(df.index) for df in df_list] == [16] * 6 + [4]
+        df = pd.concat(df_list, ignore_index=True)
+        assert df["position"].tolist() == list(range(100))
+        assert df["value"].dtype == input_df["value"].dtype
+        assert [json.loads(r)["result"] for r in df["test_api_response"]] == list(range(100))
+    df = api_parallelizer(
+        input_df=input_df,
+        api_call_function=call_mock_api_random_latency,
+        api_exceptions=API_EXCEPTIONS,
+        column_prefix=COLUMN_PREFIX,
+        parallel_workers=8,
+    )
+    assert [json.loads(r)["result"] for r in df["test_api_response"]] == list(range(100))
+    assert list(df.columns) == list(input_df.columns) + [
+        "test_api_response",
+        "test_api_error_message",
+        "test_api_error_type",
+    ]
+
+
+def test_convert_api_results_length_mismatch():
+    input_df = pd.DataFrame({INPUT_COLUMN: ["a", "b"]})
+    api_column_names = build_unique_column_names(input_df.columns, COLUMN_PREFIX)
+    with pytest.raises(ValueError):
+        convert_api_results_to_df(input_df, [{api_column_names.response: "{}"}], api_column_names)
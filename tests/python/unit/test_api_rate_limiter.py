@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import os
+import stat
+import tempfile
+from time import monotonic
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from api_rate_limiter import TokenBucketRateLimiter, SharedTokenBucketRateLimiter  # noqa
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+RATE_LIMIT = 50
+NUM_CALLS = 26
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def call_shared_rate_limiter(state_directory: str) -> int:
+    rate_limiter = SharedTokenBucketRateLimiter(rate_limit=RATE_LIMIT, period=1, state_directory=state_directory)
+    for _ in range(NUM_CALLS):
+        rate_limiter.acquire()
+    rate_limiter.close()
+    return rate_limiter.get_stats()["num_calls"]
+
+
+def test_rate_limiter_spreads_calls():
+    rate_limiter = TokenBucketRateLimiter(rate_limit=RATE_LIMIT, period=1)
+    start = monotonic()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda x: rate_limiter.call(lambda: x * 2), range(NUM_CALLS)))
+    elapsed = monotonic() - start
+    assert results == [x * 2 for x in range(NUM_CALLS)]
+    assert elapsed >= (NUM_CALLS - 1) / RATE_LIMIT * 0.95  # first token is available immediately
+    stats = rate_limiter.get_stats()
+    assert stats["num_calls"] == NUM_CALLS
+    assert stats["num_throttled_calls"] == NUM_CALLS - 1
+    assert stats["max_wait_time"] <= (NUM_CALLS - 1) / RATE_LIMIT + 0.01
+
+
+def test_rate_limiter_decorator():
+    rate_limiter = TokenBucketRateLimiter(rate_limit=1000, period=1)
+
+    @rate_limiter.limit
+    def add(a, b):
+        return a + b
+
+    assert add(1, b=2) == 3
+    assert rate_limiter.get_stats()["num_calls"] == 1
+
+
+def test_shared_rate_limiter_across_processes(tmp_path):
+    start = monotonic()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        num_calls = sum(pool.map(call_shared_rate_limiter, [str(tmp_path)] * 2))
+    elapsed = monotonic() - start
+    assert num_calls == 2 * NUM_CALLS
+    assert elapsed >= (2 * NUM_CALLS - 1) / RATE_LIMIT * 0.95  # both processes share the same quota
+
+
+def test_shared_rate_limiter_private_state_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    rate_limiter = SharedTokenBucketRateLimiter(rate_limit=RATE_LIMIT, period=1)
+    rate_limiter.acquire()
+    rate_limiter.close()
+    state_directory = os.path.dirname(rate_limiter.state_path)
+    assert state_directory == str(tmp_path / "api_rate_limiter_user_{}".format(os.getuid()))
+    assert stat.S_IMODE(os.stat(state_directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(rate_limiter.state_path).st_mode) == 0o600
+
+
+def test_shared_rate_limiter_falls_back_to_process_without_safe_state_directory(tmp_path):
+    tmp_path.chmod(0o777)
+    rate_limiter = SharedTokenBucketRateLimiter(rate_limit=RATE_LIMIT, period=1, state_directory=str(tmp_path))
+    for _ in range(NUM_CALLS):
+        rate_limiter.acquire()
+    rate_limiter.close()
+    assert not os.path.exists(rate_limiter.state_path)
+    assert rate_limiter.get_stats()["num_throttled_calls"] == NUM_CALLS - 1
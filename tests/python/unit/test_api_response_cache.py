@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+from api_response_cache import APIResponseCache, hash_bytes  # noqa
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+API_METHOD = "detect_labels"
+RESPONSE = '{"Labels": []}'
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def test_cache_hit_miss(tmp_path):
+    cache = APIResponseCache(str(tmp_path))
+    key = cache.build_key(hash_bytes(b"image"), API_METHOD, MaxLabels=10, MinConfidence=55)
+    assert cache.get(key) is None
+    cache.set(key, RESPONSE)
+    assert cache.get(key) == RESPONSE
+    assert cache.get(cache.build_key(hash_bytes(b"image"), API_METHOD, MaxLabels=5, MinConfidence=55)) is None
+    assert cache.get_stats()["hits"] == 1
+    assert cache.get_stats()["misses"] == 2
+    cache.close()
+    assert APIResponseCache(str(tmp_path)).get(key) == RESPONSE
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = APIResponseCache(str(tmp_path), max_size_mb=0)
+    cache.max_size = 3 * len(RESPONSE)
+    keys = [cache.build_key(hash_bytes(bytes([i])), API_METHOD) for i in range(4)]
+    for key in keys[:3]:
+        cache.set(key, RESPONSE)
+    assert cache.get(keys[0]) == RESPONSE  # most recently used
+    cache.set(keys[3], RESPONSE)
+    assert cache.get(keys[1]) is None  # least recently used
+    assert cache.get(keys[0]) == RESPONSE
+    assert cache.get_stats()["evictions"] == 1
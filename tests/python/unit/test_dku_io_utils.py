@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+
+import dataiku
+import pandas as pd
+import pytest
+
+from plugin_io_utils import IMAGE_PATH_COLUMN
+from dku_io_utils import write_chunks_with_schema
+from amazon_rekognition_api_formatting import (
+    OutputFormatEnum,
+    UnsafeContentCategoryTopLevelEnum,
+    ObjectDetectionLabelingAPIFormatter,
+    TextDetectionAPIFormatter,
+    UnsafeContentAPIFormatter,
+    MultiAnalysisAPIFormatter,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+INPUT_DF = pd.DataFrame({IMAGE_PATH_COLUMN: ["/cat.jpg", "/empty.jpg"]})
+LABELS_RESPONSE = {
+    "Labels": [
+        {
+            "Name": "Cat",
+            "Confidence": 98.5,
+            "Instances": [{"BoundingBox": {"Left": 0.1, "Top": 0.2, "Width": 0.3, "Height": 0.4}, "Confidence": 97.0}],
+        },
+        {"Name": "Pet", "Confidence": 90.0, "Instances": []},
+    ],
+    "OrientationCorrection": "ROTATE_0",
+}
+TEXT_RESPONSE = {"TextDetections": [{"DetectedText": "hello", "Type": "LINE", "Id": 0, "Confidence": 99.0}]}
+MODERATION_RESPONSE = {"ModerationLabels": [{"Name": "Weapon Violence", "ParentName": "Violence", "Confidence": 80.0}]}
+FORMATTER_CASES = {
+    "object_detection_wide": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(input_df=df, num_objects=3),
+        LABELS_RESPONSE,
+    ),
+    "object_detection_long": (
+        lambda df: ObjectDetectionLabelingAPIFormatter(
+            input_df=df, num_objects=3, output_format=OutputFormatEnum.LONG, keep_raw_response=False
+        ),
+        LABELS_RESPONSE,
+    ),
+    "text_detection": (lambda df: TextDetectionAPIFormatter(input_df=df, orientation_correction=False), TEXT_RESPONSE),
+    "unsafe_content": (
+        lambda df: UnsafeContentAPIFormatter(
+            input_df=df, content_categories_top_level=list(UnsafeContentCategoryTopLevelEnum)
+        ),
+        MODERATION_RESPONSE,
+    ),
+    "multi_analysis": (
+        lambda df: MultiAnalysisAPIFormatter(
+            input_df=df,
+            api_formatters={
+                "detect_labels": ObjectDetectionLabelingAPIFormatter(input_df=df, num_objects=2),
+                "detect_text": TextDetectionAPIFormatter(input_df=df),
+            },
+        ),
+        {"detect_labels": LABELS_RESPONSE, "detect_text": TEXT_RESPONSE},
+    ),
+}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def generate_api_results_df(api_formatter, responses) -> pd.DataFrame:
+    """Build a dataframe of API results as returned by the API parallelizer, with one row per response"""
+    api_column_names = api_formatter.api_column_names
+    return pd.DataFrame(
+        {
+            IMAGE_PATH_COLUMN: INPUT_DF[IMAGE_PATH_COLUMN][: len(responses)].tolist(),
+            api_column_names.response: [json.dumps(response) if response else "" for response in responses],
+            api_column_names.error_message: ["" if response else "Error" for response in responses],
+            api_column_names.error_type: ["" if response else "ClientError" for response in responses],
+        }
+    )
+
+
+@pytest.mark.parametrize("formatter_case", list(FORMATTER_CASES.keys()))
+def test_output_schema_matches_formatted_columns(formatter_case):
+    (build_formatter, response) = FORMATTER_CASES[formatter_case]
+    api_formatter = build_formatter(INPUT_DF)
+    output_df = api_formatter.format_df(generate_api_results_df(api_formatter, [response, {}]))
+    assert [column["name"] for column in api_formatter.get_output_schema()] == list(output_df.columns)
+
+
+def test_write_chunks_with_declared_schema():
+    (build_formatter, response) = FORMATTER_CASES["unsafe_content"]
+    api_formatter = build_formatter(INPUT_DF)
+    df_iterator = (api_formatter.format_df(generate_api_results_df(api_formatter, [r])) for r in [{}, response])
+    output_dataset = dataiku.Dataset("output")
+    num_rows = write_chunks_with_schema(output_dataset, df_iterator, schema=api_formatter.get_output_schema())
+    assert num_rows == 2
+    schema_types = {column["name"]: column["type"] for column in output_dataset.read_schema()}
+    assert schema_types[api_formatter.is_unsafe_column] == "boolean"
+    assert all(schema_types[column] == "double" for column in api_formatter.confidence_columns)
+    assert list(output_dataset.get_dataframe()[api_formatter.is_unsafe_column]) == [False, True]
+
+
+def test_write_chunks_with_declared_schema_without_chunks():
+    api_formatter = FORMATTER_CASES["object_detection_wide"][0](INPUT_DF)
+    schema = api_formatter.get_output_schema()
+    output_dataset = dataiku.Dataset("output")
+    num_rows = write_chunks_with_schema(output_dataset, iter([]), schema=schema)
+    assert num_rows == 0
+    assert output_dataset.read_schema() == schema
+    assert list(output_dataset.get_dataframe().columns) == [column["name"] for column in schema]
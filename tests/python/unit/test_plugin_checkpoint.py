@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+from typing import List
+
+import dataiku
+import pandas as pd
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, build_unique_column_names
+from plugin_checkpoint import APICheckpoint
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+INPUT_DF = pd.DataFrame({IMAGE_PATH_COLUMN: ["/image_{}.jpg".format(i) for i in range(6)]})
+API_COLUMN_NAMES = build_unique_column_names(INPUT_DF.keys(), "api")
+PARAMS = {"api_client_method_name": "detect_labels", "num_objects": 10}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def generate_api_results_df(image_paths: List, failed_paths: List = []) -> pd.DataFrame:
+    """Build a chunk of API results as returned by the API parallelizer, with an empty response for failed rows"""
+    failed = [p in failed_paths for p in image_paths]
+    return pd.DataFrame(
+        {
+            IMAGE_PATH_COLUMN: image_paths,
+            API_COLUMN_NAMES.response: ["" if f else json.dumps({"Path": p}) for (p, f) in zip(image_paths, failed)],
+            API_COLUMN_NAMES.error_message: ["Throttled" if f else "" for f in failed],
+            API_COLUMN_NAMES.error_type: ["ThrottlingException" if f else "" for f in failed],
+        }
+    )
+
+
+def run_with_checkpoint(checkpoint: APICheckpoint, chunks: List[pd.DataFrame], num_chunks_to_consume: int = None):
+    """Stream chunks of API results through the checkpoint, stopping early to simulate an interrupted run"""
+    checkpoint.load()
+    input_df = checkpoint.filter_input_df(INPUT_DF)
+    df_iterator = checkpoint.checkpoint_stream(iter(chunks), input_df=input_df, api_column_names=API_COLUMN_NAMES)
+    output_chunks = []
+    for df in df_iterator:
+        output_chunks.append(df)
+        if num_chunks_to_consume is not None and len(output_chunks) == num_chunks_to_consume:
+            df_iterator.close()
+            break
+    return (input_df, output_chunks)
+
+
+def test_journal_append():
+    folder = dataiku.Folder("checkpoint")
+    checkpoint = APICheckpoint(folder, PARAMS)
+    chunks = [
+        generate_api_results_df(INPUT_DF[IMAGE_PATH_COLUMN][:3].tolist(), failed_paths=["/image_1.jpg"]),
+        generate_api_results_df(INPUT_DF[IMAGE_PATH_COLUMN][3:].tolist()),
+    ]
+    (_, output_chunks) = run_with_checkpoint(checkpoint, chunks)
+    assert len(output_chunks) == 2
+    assert len(checkpoint.list_journal_paths()) == 2
+    assert checkpoint.load() == {"/image_{}.jpg".format(i) for i in [0, 2, 3, 4, 5]}
+    checkpoint.finalize()
+    assert checkpoint.list_journal_paths() == []
+
+
+def test_resume_after_partial_write():
+    folder = dataiku.Folder("checkpoint")
+    chunks = [
+        generate_api_results_df(INPUT_DF[IMAGE_PATH_COLUMN][:2].tolist()),
+        generate_api_results_df(INPUT_DF[IMAGE_PATH_COLUMN][2:].tolist()),
+    ]
+    run_with_checkpoint(APICheckpoint(folder, PARAMS), chunks, num_chunks_to_consume=1)
+    checkpoint = APICheckpoint(folder, PARAMS)
+    (input_df, output_chunks) = run_with_checkpoint(checkpoint, chunks[1:])
+    assert input_df[IMAGE_PATH_COLUMN].tolist() == INPUT_DF[IMAGE_PATH_COLUMN][2:].tolist()
+    output_df = pd.concat(output_chunks, ignore_index=True)
+    assert sorted(output_df[IMAGE_PATH_COLUMN]) == sorted(INPUT_DF[IMAGE_PATH_COLUMN])
+    resumed_responses = output_df[API_COLUMN_NAMES.response][:2].tolist()
+    assert resumed_responses == [json.dumps({"Path": "/image_0.jpg"}), json.dumps({"Path": "/image_1.jpg"})]
+    assert APICheckpoint(folder, {**PARAMS, "num_objects": 5}).load() == set()
+
+
+def test_truncated_last_line():
+    folder = dataiku.Folder("checkpoint")
+    checkpoint = APICheckpoint(folder, PARAMS)
+    records = [{IMAGE_PATH_COLUMN: p, API_COLUMN_NAMES.response: "{}"} for p in ["/image_0.jpg", "/image_1.jpg"]]
+    data = "\n".join([json.dumps(record) for record in records])
+    folder.upload_stream(checkpoint.journal_prefix + "0_truncated.jsonl", data[:-5].encode("utf-8"))
+    assert checkpoint.load() == {"/image_0.jpg"}
+    assert checkpoint.filter_input_df(INPUT_DF)[IMAGE_PATH_COLUMN].tolist() == INPUT_DF[IMAGE_PATH_COLUMN][1:].tolist()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+from io import BytesIO
+
+from PIL import Image
+
+from plugin_image_preprocessing import ImagePreprocessor  # noqa
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+MAX_DIMENSION = 100
+EXIF_ORIENTATION_TAG = 0x0112
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def generate_image_bytes(width: int, height: int, image_format: str = "JPEG", orientation: int = None) -> bytes:
+    image = Image.effect_noise((width, height), 64).convert("RGB")
+    image_bytes = BytesIO()
+    if orientation is not None:
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION_TAG] = orientation
+        image.save(image_bytes, format=image_format, exif=exif)
+    else:
+        image.save(image_bytes, format=image_format)
+    return image_bytes.getvalue()
+
+
+def test_image_preprocessor_downscaling():
+    image_preprocessor = ImagePreprocessor(max_dimension=MAX_DIMENSION, jpeg_quality=80, max_workers=2)
+    large_image_bytes = generate_image_bytes(400, 200, image_format="PNG")
+    small_image_bytes = generate_image_bytes(50, 50)
+    rotated_image_bytes = generate_image_bytes(300, 300, orientation=6)
+    output_image_bytes = [image_preprocessor.preprocess(b) for b in [large_image_bytes, small_image_bytes]]
+    output_rotated_image = Image.open(BytesIO(image_preprocessor.preprocess(rotated_image_bytes)))
+    assert image_preprocessor._pool._mp_context.get_start_method() == "spawn"
+    image_preprocessor.close()
+    output_image = Image.open(BytesIO(output_image_bytes[0]))
+    assert output_image.format == "JPEG"
+    assert output_image.size == (MAX_DIMENSION, MAX_DIMENSION // 2)
+    assert output_image_bytes[1] is small_image_bytes
+    assert output_rotated_image.getexif().get(EXIF_ORIENTATION_TAG) == 6
+    stats = image_preprocessor.get_stats()
+    assert stats["num_images"] == 3
+    assert stats["num_downscaled_images"] == 2
+    assert stats["saved_bytes"] == stats["input_bytes"] - stats["output_bytes"] > 0
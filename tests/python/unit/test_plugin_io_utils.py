@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+import pickle
+
+import pandas as pd
+
+import plugin_io_utils
+from plugin_io_utils import IMAGE_PATH_COLUMN, JSONResponse, json_dumps, safe_json_loads
+from amazon_rekognition_api_formatting import ObjectDetectionLabelingAPIFormatter
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+RESPONSE = {"Labels": [{"Name": "Cat", "Confidence": 99.5}]}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def test_json_response_decoded_once():
+    json_response = JSONResponse.from_decoded(RESPONSE)
+    assert isinstance(json_response, str)
+    assert json.loads(json_response) == RESPONSE
+    assert safe_json_loads(json_response) is RESPONSE
+    df = pd.DataFrame({"response": pd.Series([json_response, ""], dtype=object)})
+    assert safe_json_loads(df["response"].iloc[0]) is RESPONSE
+    assert safe_json_loads(df["response"].iloc[1]) == {}
+    unpickled_json_response = pickle.loads(pickle.dumps(json_response))
+    assert unpickled_json_response == json_response
+    assert unpickled_json_response.decoded == RESPONSE
+
+
+def test_json_dumps_fallback_matches_orjson(monkeypatch):
+    response = {"TextDetections": [{"DetectedText": "café №5", "Confidence": 99.5}]}
+    json_string = json_dumps(response)
+    monkeypatch.setattr(plugin_io_utils, "orjson", None)
+    assert json_dumps(response) == json_string == '{"TextDetections":[{"DetectedText":"café №5","Confidence":99.5}]}'
+
+
+def test_format_df_chunks_releases_decoded_responses():
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: ["/cat.jpg", "/dog.jpg"]})
+    api_formatter = ObjectDetectionLabelingAPIFormatter(input_df=input_df, num_objects=1)
+    responses = [JSONResponse.from_decoded(RESPONSE), JSONResponse.from_decoded({"Labels": []})]
+    df = input_df.assign(**{api_formatter.api_column_names.response: pd.Series(responses, dtype=object)})
+    output_df = next(api_formatter.format_df_chunks(iter([df])))
+    assert output_df[api_formatter.label_name_columns[0]].tolist() == ["Cat", ""]
+    assert [response.decoded for response in responses] == [None, None]
+    assert api_formatter.output_image_responses == []
+    assert safe_json_loads(output_df[api_formatter.api_column_names.response][0]) == RESPONSE
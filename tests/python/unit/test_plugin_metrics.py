@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from plugin_metrics import LatencyHistogram, PipelineMetrics, time_stage, HISTOGRAM_GROWTH_FACTOR  # noqa
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+DURATIONS = [i / 1000.0 for i in range(1, 1001)]  # 1ms to 1s
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class FakeFolder:
+    def __init__(self):
+        self.files = {}
+
+    def upload_stream(self, path, data):
+        self.files[path] = data
+
+
+def test_latency_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for duration in DURATIONS:
+        histogram.record(duration)
+    for (percentile, exact_value) in [(50, 0.5), (95, 0.95), (99, 0.99)]:
+        assert exact_value <= histogram.percentile(percentile) <= exact_value * HISTOGRAM_GROWTH_FACTOR
+    assert histogram.percentile(100) == 1.0
+    stats = histogram.get_stats()
+    assert stats["count"] == len(DURATIONS)
+    assert abs(stats["mean_seconds"] - 0.5005) < 1e-6
+    assert LatencyHistogram().get_stats()["p99_seconds"] == 0.0
+
+
+def test_pipeline_metrics_summary():
+    metrics = PipelineMetrics()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda d: metrics.record("api_call", d), DURATIONS))
+    metrics.record("custom_stage", 0.1)
+    with time_stage(metrics, "download"):
+        pass
+    with time_stage(None, "upload"):
+        pass
+    folder = FakeFolder()
+    metrics.save_summary(folder, num_rows=len(DURATIONS))
+    summary = json.loads(folder.files["/pipeline_metrics.json"].decode("utf-8"))
+    assert list(summary["stages"].keys()) == ["download", "api_call", "custom_stage"]
+    assert summary["stages"]["api_call"]["count"] == len(DURATIONS)
+    assert summary["slowest_stage"] == "api_call"
+    assert summary["num_rows"] == len(DURATIONS)
+    assert summary["rows_per_second"] > 0
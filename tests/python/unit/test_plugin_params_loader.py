@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import json
+from io import BytesIO
+
+import boto3
+import dataiku
+import dataiku.customrecipe
+import pandas as pd
+from PIL import Image
+
+from plugin_io_utils import IMAGE_PATH_COLUMN, ErrorHandlingEnum
+from plugin_image_utils import OrientationEstimationEnum
+from plugin_image_preprocessing import ImagePreprocessor
+from plugin_metrics import PipelineMetrics, METRICS_FILE_PATH
+from api_rate_limiter import TokenBucketRateLimiter
+from dku_io_utils import write_chunks_with_schema
+from plugin_params_loader import PluginParams, PluginParamsLoader
+from amazon_rekognition_api_formatting import (
+    RenderingEngineEnum,
+    ObjectDetectionLabelingAPIFormatter,
+    ImageRenderingPipeline,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+IMAGE_PATHS = ["/image_{}.jpg".format(i) for i in range(4)]
+PRESET = {
+    "aws_access_key_id": "fake",
+    "aws_secret_access_key": "fake",
+    "aws_region_name": "us-east-1",
+    "parallel_workers": 4,
+    "api_quota_rate_limit": 10,
+}
+RECIPE_PARAMS = {"num_objects": 10, "minimum_score": 50, "orientation_correction": False, "error_handling": "LOG"}
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def generate_image_bytes(size=(64, 48)) -> bytes:
+    image_bytes = BytesIO()
+    Image.new("RGB", size, color=(200, 120, 40)).save(image_bytes, format="JPEG")
+    return image_bytes.getvalue()
+
+
+def load_checkpoint(
+    input_folder: dataiku.Folder,
+    checkpoint_folder: dataiku.Folder,
+    output_folder: dataiku.Folder = None,
+    recipe_params: dict = RECIPE_PARAMS,
+    preset_params: dict = {},
+    incremental: bool = True,
+):
+    input_params_dict = {
+        "input_folder": input_folder,
+        "input_df": pd.DataFrame({IMAGE_PATH_COLUMN: sorted(input_folder.files.keys())}),
+        "shard_index": 0,
+        "num_shards": 1,
+    }
+    output_params_dict = {
+        "checkpoint_folder": checkpoint_folder,
+        "output_folder": output_folder,
+        "clear_output_folder": True,
+    }
+    recipe_params_dict = {**recipe_params, "incremental": incremental}
+    PluginParamsLoader().load_checkpoint(input_params_dict, output_params_dict, recipe_params_dict, preset_params)
+    return (input_params_dict, output_params_dict)
+
+
+def complete_run(checkpoint, input_df: pd.DataFrame, output_folder: dataiku.Folder) -> None:
+    """Save a successful response for all input images to the journal and render them, as a recipe run does"""
+    api_column_names = ObjectDetectionLabelingAPIFormatter(input_df=input_df, num_objects=1).api_column_names
+    df = input_df.assign(**{api_column_names.response: json.dumps({"Labels": []})})
+    for _ in checkpoint.checkpoint_stream(iter([df]), input_df=input_df, api_column_names=api_column_names):
+        pass
+    for image_path in input_df[IMAGE_PATH_COLUMN]:
+        output_folder.upload_stream(image_path, b"rendered")
+    checkpoint.finalize()
+
+
+def test_incremental_run_keeps_unchanged_images():
+    input_folder = dataiku.Folder("input", {p: generate_image_bytes() for p in IMAGE_PATHS[:3]})
+    (checkpoint_folder, output_folder) = (dataiku.Folder("checkpoint"), dataiku.Folder("output"))
+    (input_params_dict, output_params_dict) = load_checkpoint(input_folder, checkpoint_folder, output_folder)
+    assert len(input_params_dict["input_df"].index) == 3
+    complete_run(output_params_dict["checkpoint"], input_params_dict["input_df"], output_folder)
+    input_folder.files[IMAGE_PATHS[0]] = generate_image_bytes(size=(128, 96))  # modified image
+    input_folder.files[IMAGE_PATHS[3]] = generate_image_bytes()  # new image
+    (input_params_dict, output_params_dict) = load_checkpoint(input_folder, checkpoint_folder, output_folder)
+    assert input_params_dict["input_df"][IMAGE_PATH_COLUMN].tolist() == [IMAGE_PATHS[0], IMAGE_PATHS[3]]
+    assert output_params_dict["rendered_paths"] == {IMAGE_PATHS[1], IMAGE_PATHS[2]}
+    assert not output_params_dict["clear_output_folder"]
+
+
+def test_checkpoint_params_include_preprocessing_and_orientation_estimation():
+    input_folder = dataiku.Folder("input", {p: generate_image_bytes() for p in IMAGE_PATHS})
+    checkpoint_folder = dataiku.Folder("checkpoint")
+    orientation_params = {**RECIPE_PARAMS, "orientation_correction": True}
+    params_keys = set()
+    for (recipe_params, preset_params) in [
+        (RECIPE_PARAMS, {}),
+        (RECIPE_PARAMS, {"image_preprocessor": ImagePreprocessor(max_dimension=1024, max_workers=1)}),
+        (RECIPE_PARAMS, {"image_preprocessor": ImagePreprocessor(max_dimension=2048, max_workers=1)}),
+        ({**orientation_params, "orientation_estimation": OrientationEstimationEnum.EXIF}, {}),
+        ({**orientation_params, "orientation_estimation": OrientationEstimationEnum.API}, {}),
+    ]:
+        (_, output_params_dict) = load_checkpoint(input_folder, checkpoint_folder, None, recipe_params, preset_params)
+        params_keys.add(output_params_dict["checkpoint"].params_key)
+        for image_preprocessor in preset_params.values():
+            image_preprocessor.close()
+    assert len(params_keys) == 5
+
+
+def test_rendering_pipeline_skips_rendered_images():
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: IMAGE_PATHS})
+    input_folder = dataiku.Folder("input", {p: generate_image_bytes() for p in IMAGE_PATHS})
+    output_folder = dataiku.Folder("output", {p: b"rendered" for p in IMAGE_PATHS[:2]})
+    api_formatter = ObjectDetectionLabelingAPIFormatter(input_df=input_df, num_objects=1, input_folder=input_folder)
+    image_pipeline = ImageRenderingPipeline(
+        api_formatter, output_folder, parallel_workers=2, clear_output=False, rendered_paths=set(IMAGE_PATHS[:2])
+    )
+    df = input_df.assign(**{api_formatter.api_column_names.response: json.dumps({"Labels": []})})
+    list(api_formatter.format_df_chunks(iter([df]), image_pipeline=image_pipeline))
+    image_pipeline.close()
+    assert image_pipeline.num_success == 2
+    assert [output_folder.files[p] for p in IMAGE_PATHS[:2]] == [b"rendered", b"rendered"]
+    assert all(output_folder.files[p] != b"rendered" for p in IMAGE_PATHS[2:])
+
+
+def test_adaptive_concurrency_uses_standard_retries(monkeypatch):
+    for (adaptive_concurrency, expected_retry_mode) in [(False, "adaptive"), (True, "standard")]:
+        api_configuration_preset = {**PRESET, "adaptive_concurrency": adaptive_concurrency, "retry_mode": "ADAPTIVE"}
+        recipe_config = {"api_configuration_preset": api_configuration_preset}
+        monkeypatch.setattr(dataiku.customrecipe, "recipe_config", recipe_config)
+        preset_params_dict = PluginParamsLoader().validate_preset_params()
+        assert preset_params_dict["api_client"].meta.config.retries["mode"] == expected_retry_mode
+
+
+def test_finalize_run():
+    input_df = pd.DataFrame({IMAGE_PATH_COLUMN: IMAGE_PATHS})
+    input_folder = dataiku.Folder("input", {p: generate_image_bytes() for p in IMAGE_PATHS})
+    (output_folder, checkpoint_folder) = (dataiku.Folder("output"), dataiku.Folder("checkpoint"))
+    (_, output_params_dict) = load_checkpoint(input_folder, checkpoint_folder, incremental=False)
+    api_formatter = ObjectDetectionLabelingAPIFormatter(input_df=input_df, num_objects=1, input_folder=input_folder)
+    image_pipeline = ImageRenderingPipeline(api_formatter, output_folder, parallel_workers=2)
+    api_client = boto3.client("rekognition", region_name="us-east-1", aws_access_key_id="a", aws_secret_access_key="b")
+    plugin_params = PluginParams(
+        api_client=api_client,
+        input_folder=input_folder,
+        input_df=input_df,
+        output_dataset=dataiku.Dataset("output"),
+        api_quota_rate_limit=10,
+        api_quota_period=1,
+        rate_limiter=TokenBucketRateLimiter(rate_limit=10),
+        parallel_workers=2,
+        adaptive_concurrency=False,
+        rendering_engine=RenderingEngineEnum.THREADS,
+        minimum_score=0,
+        error_handling=ErrorHandlingEnum.LOG,
+        output_folder=output_folder,
+        checkpoint=output_params_dict["checkpoint"],
+        metrics=PipelineMetrics(),
+        save_metrics=True,
+    )
+    df = input_df.assign(**{api_formatter.api_column_names.response: json.dumps({"Labels": []})})
+    df_iterator = plugin_params.checkpoint.checkpoint_stream(
+        iter([df]), input_df=input_df, api_column_names=api_formatter.api_column_names
+    )
+    output_df_iterator = api_formatter.format_df_chunks(df_iterator, image_pipeline=image_pipeline)
+    write_chunks_with_schema(plugin_params.output_dataset, output_df_iterator, schema=api_formatter.get_output_schema())
+    plugin_params.finalize_run(api_formatter, image_pipeline=image_pipeline)
+    assert image_pipeline.num_success == len(IMAGE_PATHS)
+    output_schema = plugin_params.output_dataset.read_schema()
+    assert output_schema[1]["comment"] == api_formatter.column_description_dict[output_schema[1]["name"]]
+    assert plugin_params.checkpoint.list_journal_paths() == []
+    assert json.loads(output_folder.files[METRICS_FILE_PATH])["num_rows"] == len(IMAGE_PATHS)
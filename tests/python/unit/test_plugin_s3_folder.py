@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from plugin_s3_folder import S3Folder
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+BUCKET = "bucket"
+LAST_MODIFIED = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+class FakeS3Client:
+    """In-memory S3 client implementing the few methods used by `S3Folder`, with pages of 2 keys"""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.num_head_calls = 0
+
+    def get_paginator(self, operation_name):
+        assert operation_name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))
+        for i in range(0, len(keys), 2):
+            yield {
+                "Contents": [
+                    {"Key": k, "Size": len(self.objects[k]), "ETag": '"{}"'.format(k), "LastModified": LAST_MODIFIED}
+                    for k in keys[i : i + 2]
+                ]
+            }
+
+    def head_object(self, Bucket, Key):
+        self.num_head_calls += 1
+        return {"ETag": '"{}"'.format(Key)}
+
+    def download_fileobj(self, Bucket, Key, Fileobj, Config=None):
+        Fileobj.write(self.objects[Key])
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, Config=None):
+        self.objects[Key] = Fileobj.read()
+
+
+class FakeFolder:
+    """Folder with the partitioning of `dataiku.Folder.get_info`, listing given paths for any partition"""
+
+    read_partitions = None
+
+    def __init__(self, file_path_pattern: str = "", dimensions: List[Dict] = None, partition_paths: List[str] = None):
+        self.partitioning = {"filePathPattern": file_path_pattern, "dimensions": dimensions or []}
+        self.partition_paths = partition_paths or []
+
+    def get_info(self):
+        return {"type": "S3", "partitioning": self.partitioning}
+
+    def list_paths_in_partition(self, partition):
+        return self.partition_paths
+
+
+def test_s3_folder_list_read_write():
+    s3_client = FakeS3Client(
+        {"root/a.jpg": b"a", "root/sub/b.png": b"bb", "root/sub/": b"", "root/c.jpg": b"ccc", "other/d.jpg": b"d"}
+    )
+    s3_folder = S3Folder(FakeFolder(), s3_client, BUCKET, root_path="/root")
+    assert sorted(s3_folder.list_paths_in_partition()) == ["/a.jpg", "/c.jpg", "/sub/b.png"]
+    assert s3_folder.read_partitions is None  # delegated to the wrapped folder
+    path_details = s3_folder.path_details_dict["/sub/b.png"]
+    assert path_details["size"] == 2
+    assert path_details["lastModified"] == int(LAST_MODIFIED.timestamp() * 1000)
+    assert s3_folder.get_etag("/a.jpg") == '"root/a.jpg"'
+    assert s3_client.num_head_calls == 0
+    with s3_folder.get_download_stream("/c.jpg") as stream:
+        assert stream.read() == b"ccc"
+    s3_folder.upload_stream("/sub/e.jpg", b"eeeee")
+    assert s3_client.objects["root/sub/e.jpg"] == b"eeeee"
+    assert s3_folder.get_etag("/sub/e.jpg") == '"root/sub/e.jpg"'
+    assert s3_client.num_head_calls == 1
+
+
+def test_s3_folder_list_partitions_by_directory():
+    s3_client = FakeS3Client(
+        {
+            "root/2020-01-01/FR/a.jpg": b"a",
+            "root/2020-01-01/US/b.jpg": b"b",
+            "root/2020-01-02/FR/c.jpg": b"c",
+            "root/2020-01-01-backup/FR/d.jpg": b"d",
+        }
+    )
+    folder = FakeFolder("/%{day}/%{country}/.*", [{"name": "day", "type": "value"}, {"name": "country"}])
+    s3_folder = S3Folder(folder, s3_client, BUCKET, root_path="root")
+    assert s3_folder.list_paths_in_partition("2020-01-01|FR") == ["/2020-01-01/FR/a.jpg"]
+    assert s3_folder.list_paths_in_partition("2020-01-01|US") == ["/2020-01-01/US/b.jpg"]
+    assert sorted(s3_folder.path_details_dict.keys()) == ["/2020-01-01/FR/a.jpg", "/2020-01-01/US/b.jpg"]
+    assert len(s3_folder.list_paths_in_partition()) == 4
+
+
+def test_s3_folder_list_partitions_by_time():
+    s3_client = FakeS3Client({"root/2020/01/01/FR/a.jpg": b"a", "root/2020/01/01/US/b.jpg": b"b", "root/c.jpg": b"c"})
+    dimensions = [{"name": "date", "type": "time", "params": {"period": "DAY"}}, {"name": "country", "type": "value"}]
+    s3_folder = S3Folder(FakeFolder("%Y/%M/%D/%{country}/.*", dimensions), s3_client, BUCKET, root_path="root")
+    assert s3_folder.get_partition_path_prefix("2020-01-01|FR") == ("/2020/01/01/FR/", True)
+    assert s3_folder.list_paths_in_partition("2020-01-01|FR") == ["/2020/01/01/FR/a.jpg"]
+
+
+def test_s3_folder_list_partitions_with_custom_pattern():
+    s3_client = FakeS3Client(
+        {"root/images/FR_1.jpg": b"a", "root/images/FR_1.png": b"b", "root/images/US_2.jpg": b"c", "root/d.jpg": b"d"}
+    )
+    folder = FakeFolder(
+        "/images/%{country}_[0-9]+\\.jpg", [{"name": "country", "type": "value"}], ["/images/FR_1.jpg", "/other.jpg"]
+    )
+    s3_folder = S3Folder(folder, s3_client, BUCKET, root_path="root")
+    assert s3_folder.get_partition_path_prefix("FR") == ("/images/", False)
+    assert s3_folder.list_paths_in_partition("FR") == ["/images/FR_1.jpg"]  # filtered by the wrapped folder
+    assert "/d.jpg" not in s3_folder.path_details_dict
+    s3_folder = S3Folder(FakeFolder(partition_paths=["/d.jpg"]), s3_client, BUCKET, root_path="root")
+    assert s3_folder.list_paths_in_partition("FR") == ["/d.jpg"]  # no partitioning pattern
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# This is a test file intended to be used with pytest
+# pytest automatically runs all the function starting with "test_"
+# see https://docs.pytest.org for more information
+
+import pytest
+
+from plugin_sharding import (  # noqa
+    get_shard_index,
+    is_in_shard,
+    parse_partition_shard_index,
+    get_shard_file_path,
+)
+
+
+# ==============================================================================
+# CONSTANT DEFINITION
+# ==============================================================================
+
+PATH_LIST = ["/folder_{}/image_{}.jpg".format(i % 7, i) for i in range(10000)]
+NUM_SHARDS = 4
+
+
+# ==============================================================================
+# CLASS AND FUNCTION DEFINITION
+# ==============================================================================
+
+
+def test_shards_are_disjoint_and_balanced():
+    shards = [[p for p in PATH_LIST if is_in_shard(p, i, NUM_SHARDS)] for i in range(NUM_SHARDS)]
+    assert sorted(p for shard in shards for p in shard) == sorted(PATH_LIST)
+    for shard in shards:
+        assert abs(len(shard) - len(PATH_LIST) / NUM_SHARDS) < 0.05 * len(PATH_LIST) / NUM_SHARDS
+    assert all(is_in_shard(p, 0, 1) for p in PATH_LIST)
+
+
+def test_shard_index_is_stable():
+    assert get_shard_index("/image.jpg", NUM_SHARDS) == get_shard_index("/image.jpg", NUM_SHARDS)
+    assert get_shard_index("/image.jpg", 1) == 0
+    assert get_shard_index("/image.jpg", 1000) == 356  # does not depend on the process hash seed
+
+
+def test_partition_shard_index():
+    assert parse_partition_shard_index("3", NUM_SHARDS) == 3
+    for partition in ["4", "-1", "shard_1"]:
+        with pytest.raises(ValueError):
+            parse_partition_shard_index(partition, NUM_SHARDS)
+
+
+def test_shard_file_path():
+    assert get_shard_file_path("/pipeline_metrics.json", 0, 1) == "/pipeline_metrics.json"
+    assert get_shard_file_path("/pipeline_metrics.json", 1, 4) == "/pipeline_metrics_shard_1_of_4.json"